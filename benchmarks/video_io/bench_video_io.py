@@ -0,0 +1,294 @@
+"""Benchmark the frame extraction of the video datasets on small synthetic videos.
+
+The videos are generated locally with OpenCV, and the datasets are set up on them without downloading any data, so
+the benchmark runs offline and on CPU only. Two groups of cases are timed, each case in a fresh process so that the
+reported peak RSS is its own:
+
+* decode: the decord backend alone, reading the sampled frames one by one (`vid[i]`), in batches
+  (`read_video_frames`), at a reduced resolution, and with different numbers of decoding threads;
+* dataset: the frame extraction (`save_video_frames` or the equivalent) of every `VideoBaseDataset` subclass, with
+  cold and warm frame directories, the packed frame cache (`FRAME_CACHE`) and in-memory frames (`array_frames`).
+
+Usage:
+    python benchmarks/video_io/bench_video_io.py --output results.json
+    python benchmarks/video_io/bench_video_io.py --baseline results.json --tolerance 0.3
+
+With `--baseline`, the frames/s of each case is compared with the baseline results, and the script exits with 1 if
+any case is slower by more than `--tolerance`.
+"""
+import argparse
+import json
+import os
+import os.path as osp
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing as mp
+
+sys.path.insert(0, osp.dirname(osp.dirname(osp.dirname(osp.abspath(__file__)))))
+
+
+def make_video(pth, seconds=10, fps=25, size=(640, 360), scene_len=2, seed=0):
+    """Write a synthetic mp4 video: flat colored scenes (changing every `scene_len` seconds) with a moving box."""
+    import cv2
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    width, height = size
+    writer = cv2.VideoWriter(pth, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    assert writer.isOpened(), f'Failed to open the video writer for {pth}'
+    n_frames = seconds * fps
+    for i in range(n_frames):
+        if i % (scene_len * fps) == 0:
+            background = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8) // 4
+            background += rng.integers(0, 192, size=3, dtype=np.uint8)
+        frame = background.copy()
+        x = int((i / n_frames) * (width - 64))
+        frame[height // 2 - 32: height // 2 + 32, x: x + 64] = 255
+        writer.write(frame)
+    writer.release()
+    return pth
+
+
+def make_videos(root, num_videos, seconds, fps, size):
+    os.makedirs(root, exist_ok=True)
+    names = [f'video_{i:03d}' for i in range(num_videos)]
+    for i, name in enumerate(names):
+        pth = osp.join(root, name + '.mp4')
+        if not osp.exists(pth):
+            make_video(pth, seconds=seconds, fps=fps, size=size, seed=i)
+    return names
+
+
+def video_paths(workspace, names):
+    return [osp.join(workspace, 'videos', name + '.mp4') for name in names]
+
+
+def sample_indices(n_frames, nframe):
+    step_size = n_frames / (nframe + 1)
+    return [int(i * step_size) for i in range(1, nframe + 1)]
+
+
+# The cases: func(paths, nframe, **kwargs) -> a callable, whose run (returning the number of frames) is timed
+def decode_per_index(paths, nframe, num_threads=0):
+    import decord
+
+    def run():
+        n = 0
+        for pth in paths:
+            vid = decord.VideoReader(pth, num_threads=num_threads)
+            n += len([vid[i].asnumpy() for i in sample_indices(len(vid), nframe)])
+        return n
+    return run
+
+
+def decode_batched(paths, nframe, num_threads=0, size=-1):
+    from vlmeval.smp import get_video_reader, read_video_frames
+
+    def run():
+        n = 0
+        for pth in paths:
+            vid = get_video_reader(pth, width=size, height=size, num_threads=num_threads)
+            n += len(read_video_frames(vid, sample_indices(len(vid), nframe)))
+        return n
+    return run
+
+
+def new_dataset(cls, data_root, frame_root, nframe):
+    """Create a dataset of `cls` on the synthetic videos, with the attributes set by `VideoBaseDataset.__init__`
+    (which would prepare the real dataset)."""
+    from vlmeval.dataset.video_base import VideoBaseDataset
+    dataset = object.__new__(cls)
+    dataset.dataset_name = cls.__name__
+    dataset.data_root = data_root
+    dataset.frame_root = frame_root
+    dataset.frame_size = (-1, -1)
+    dataset.frame_root_suffix = ''
+    dataset.sampling = 'uniform'
+    dataset.array_frames = False
+    dataset.share_frames = False
+    dataset.frame_tmpl = 'frame-{}-of-{}.jpg'
+    dataset.frame_tmpl_fps = 'frame-{}-of-{}-{}fps.jpg'
+    dataset.pack = False
+    dataset.nframe = nframe
+    dataset.fps = -1
+    if cls.__name__ in ['MVBench', 'MVBench_MP4']:
+        import torchvision.transforms as T
+        from vlmeval.dataset.utils.mvbench import Stack, ToTorchFormatTensor
+        dataset.transform = T.Compose([Stack(), ToTorchFormatTensor()])
+        if cls.__name__ == 'MVBench':
+            dataset.decord_method = {'video': dataset.read_video}
+    assert isinstance(dataset, VideoBaseDataset)
+    return dataset
+
+
+# How each dataset class extracts the frames of the video `name` (under `videos/`, or `videos/video/` for Video-MME)
+DATASET_EXTRACTORS = {
+    'MMBenchVideo': lambda ds, name: ds.save_video_frames(name),
+    'VideoMME': lambda ds, name: ds.save_video_frames(name)[0],
+    'LongVideoBench': lambda ds, name: ds.save_video_frames(name + '.mp4')[0],
+    'MLVU_MCQ': lambda ds, name: ds.save_video_frames(dict(prefix='', video=name + '.mp4')),
+    'MLVU_OpenEnded': lambda ds, name: ds.save_video_frames(dict(prefix='', video=name + '.mp4')),
+    'TempCompass_MCQ': lambda ds, name: ds.save_video_frames(dict(prefix='', video=name, suffix='.mp4')),
+    'TempCompass_Captioning': lambda ds, name: ds.save_video_frames(dict(prefix='', video=name, suffix='.mp4')),
+    'TempCompass_YorN': lambda ds, name: ds.save_video_frames(dict(prefix='', video=name, suffix='.mp4')),
+    'MVBench': lambda ds, name: ds.save_video_into_images(
+        dict(prefix='', video=name + '.mp4', data_type='video', bound=False)),
+    'MVBench_MP4': lambda ds, name: ds.save_video_into_images(dict(prefix='', video=name + '.mp4')),
+}
+for _name in ['CGBench_MCQ_Grounding_Mini', 'CGBench_OpenEnded_Mini', 'CGBench_MCQ_Grounding', 'CGBench_OpenEnded']:
+    DATASET_EXTRACTORS[_name] = lambda ds, name: ds.save_video_frames(name + '.mp4', name, num_frames=ds.nframe)[0]
+
+
+def video_dataset_classes():
+    import vlmeval.dataset as dataset_module
+    from vlmeval.dataset.video_base import VideoBaseDataset
+    from vlmeval.dataset.video_concat_dataset import ConcatVideoDataset
+    classes = {}
+    for obj in vars(dataset_module).values():
+        if isinstance(obj, type) and issubclass(obj, VideoBaseDataset) and not issubclass(obj, ConcatVideoDataset):
+            classes[obj.__name__] = obj
+    return classes
+
+
+def extract_dataset(paths, nframe, workspace, dataset, mode='cold'):
+    classes = video_dataset_classes()
+    cls = classes[dataset]
+    names = [osp.splitext(osp.basename(p))[0] for p in paths]
+    data_root = osp.join(workspace, 'videos')
+    if dataset == 'VideoMME':
+        data_root = osp.join(workspace, 'videos_mme')
+        if not osp.exists(osp.join(data_root, 'video')):
+            os.makedirs(data_root, exist_ok=True)
+            os.symlink(osp.join(workspace, 'videos'), osp.join(data_root, 'video'))
+    frame_root = tempfile.mkdtemp(prefix=f'{dataset}_', dir=osp.join(workspace, 'frames'))
+    if mode.startswith('frame_cache'):
+        os.environ['FRAME_CACHE'] = tempfile.mkdtemp(prefix='cache_', dir=osp.join(workspace, 'frames'))
+        os.environ['FRAME_CACHE_TMP'] = tempfile.mkdtemp(prefix='cache_tmp_', dir=osp.join(workspace, 'frames'))
+    ds = new_dataset(cls, data_root, frame_root, nframe)
+    ds.array_frames = mode == 'array'
+    extract = DATASET_EXTRACTORS[dataset]
+
+    def run():
+        return sum(len(extract(ds, name)) for name in names)
+
+    # Warm cases are timed after the frames (or the packs) of all videos are extracted once
+    if mode in ['warm', 'frame_cache_warm']:
+        run()
+    return run
+
+
+CASE_FUNCS = {
+    'decode_per_index': decode_per_index,
+    'decode_batched': decode_batched,
+    'extract_dataset': extract_dataset,
+}
+
+
+def _run_case(workspace, func, kwargs):
+    # Run in a fresh process: time the case and report the peak RSS of the process
+    import resource
+    os.environ['LMUData'] = workspace
+    os.makedirs(osp.join(workspace, 'frames'), exist_ok=True)
+    run = CASE_FUNCS[func](**kwargs)
+    tic = time.perf_counter()
+    n = run()
+    elapsed = time.perf_counter() - tic
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_mb = rss / 2 ** 20 if sys.platform == 'darwin' else rss / 2 ** 10
+    return dict(frames=n, seconds=elapsed, fps=n / max(elapsed, 1e-9), peak_rss_mb=rss_mb)
+
+
+def build_cases(args, paths, workspace):
+    cases = []
+    for num_threads in args.threads:
+        cases.append((f'decode/per_index/threads={num_threads}', 'decode_per_index',
+                      dict(paths=paths, nframe=args.nframe, num_threads=num_threads)))
+        cases.append((f'decode/batched/threads={num_threads}', 'decode_batched',
+                      dict(paths=paths, nframe=args.nframe, num_threads=num_threads)))
+    cases.append((f'decode/batched_{args.reduced_size}px', 'decode_batched',
+                  dict(paths=paths, nframe=args.nframe, size=args.reduced_size)))
+
+    classes = video_dataset_classes()
+    datasets = args.datasets or sorted(classes)
+    for dataset in datasets:
+        if dataset not in DATASET_EXTRACTORS:
+            print(f'Skip {dataset}: no frame extractor defined in DATASET_EXTRACTORS. ')
+            continue
+        for mode in args.modes:
+            cases.append((f'dataset/{dataset}/{mode}', 'extract_dataset',
+                          dict(paths=paths, nframe=args.nframe, workspace=workspace, dataset=dataset, mode=mode)))
+    return cases
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, res in results.items():
+        if name in baseline and 'fps' in baseline[name] and 'fps' in res:
+            ratio = res['fps'] / max(baseline[name]['fps'], 1e-9)
+            if ratio < 1 - tolerance:
+                regressions.append((name, baseline[name]['fps'], res['fps'], ratio))
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark the video frame extraction on synthetic videos. ')
+    parser.add_argument('--workspace', type=str, default=None, help='Default to a temporary directory. ')
+    parser.add_argument('--num-videos', type=int, default=4)
+    parser.add_argument('--seconds', type=int, default=10)
+    parser.add_argument('--video-fps', type=int, default=25)
+    parser.add_argument('--video-size', type=int, nargs=2, default=[640, 360])
+    parser.add_argument('--nframe', type=int, default=16)
+    parser.add_argument('--threads', type=int, nargs='+', default=[0, 1])
+    parser.add_argument('--reduced-size', type=int, default=224)
+    parser.add_argument('--datasets', type=str, nargs='+', default=None, help='Default to all video datasets. ')
+    parser.add_argument(
+        '--modes', type=str, nargs='+', default=['cold', 'warm', 'frame_cache', 'frame_cache_warm', 'array'],
+        choices=['cold', 'warm', 'frame_cache', 'frame_cache_warm', 'array'])
+    parser.add_argument('--output', type=str, default=None, help='Save the results to a json file. ')
+    parser.add_argument('--baseline', type=str, default=None, help='The results json to compare with. ')
+    parser.add_argument('--tolerance', type=float, default=0.3)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    workspace = args.workspace or tempfile.mkdtemp(prefix='vlmeval_video_io_')
+    names = make_videos(osp.join(workspace, 'videos'), args.num_videos, args.seconds, args.video_fps,
+                        tuple(args.video_size))
+    paths = video_paths(workspace, names)
+    ctx = mp.get_context('spawn')
+
+    results = {}
+    for name, func, kwargs in build_cases(args, paths, workspace):
+        with ProcessPoolExecutor(1, mp_context=ctx) as executor:
+            try:
+                results[name] = executor.submit(_run_case, workspace, func, kwargs).result()
+            except Exception as e:
+                results[name] = dict(error=f'{type(e)}: {e}')
+        res = results[name]
+        if 'error' in res:
+            print(f'{name:<56} ERROR {res["error"]}')
+        else:
+            print(f'{name:<56} {res["fps"]:>9.1f} frames/s {res["peak_rss_mb"]:>8.1f} MB peak RSS')
+
+    if args.workspace is None:
+        shutil.rmtree(workspace, ignore_errors=True)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+
+    failed = [k for k, v in results.items() if 'error' in v]
+    regressions = []
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for name, base, cur, ratio in regressions:
+            print(f'Regression: {name} {base:.1f} -> {cur:.1f} frames/s ({ratio:.0%} of the baseline)')
+    return 1 if failed or regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -139,6 +139,12 @@ You can launch the evaluation by setting either --data and --model or --config.
     parser.add_argument('--judge-args', type=str, default=None, help='Judge arguments in JSON format')
     # Explicitly Set the Judge Model
     parser.add_argument('--judge', type=str, default=None)
+    # Batch Size for Local VLMs, only models implementing `generate_batch_inner` will benefit from it
+    parser.add_argument('--batch-size', type=int, default=1, help='Batch size for local VLM inference')
+    # Number of Processes Extracting Video Frames Ahead of Inference, 0 to disable
+    parser.add_argument('--prefetch-frames', type=int, default=0, help='Processes for video frame prefetching')
+    # Run the Questions on the Same Video as a Group, Local VLMs implementing `generate_group_inner` reuse the video
+    parser.add_argument('--group-questions', action='store_true', help='Group video questions by video')
     # Logging Utils
     parser.add_argument('--verbose', action='store_true')
     # Configuration for Resume
@@ -302,7 +308,9 @@ def main():
                         dataset=dataset,
                         result_file_name=result_file_base,
                         verbose=args.verbose,
-                        api_nproc=args.api_nproc)
+                        api_nproc=args.api_nproc,
+                        prefetch_nproc=args.prefetch_frames,
+                        group_questions=args.group_questions)
                 elif dataset.TYPE == 'MT':
                     model = infer_data_job_mt(
                         model,
@@ -320,7 +328,8 @@ def main():
                         dataset=dataset,
                         verbose=args.verbose,
                         api_nproc=args.api_nproc,
-                        ignore_failed=args.ignore)
+                        ignore_failed=args.ignore,
+                        batch_size=args.batch_size)
 
                 # Set the judge kwargs first before evaluation or dumping
 
@@ -0,0 +1,45 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+transformers = pytest.importorskip('transformers')
+
+from vlmeval.vlm.base import BaseModel  # noqa: E402
+
+GEN_KWARGS = dict(max_new_tokens=8, do_sample=False, pad_token_id=0)
+
+
+def build_model():
+    torch.manual_seed(0)
+    config = transformers.LlamaConfig(
+        vocab_size=64, hidden_size=32, intermediate_size=64, num_hidden_layers=2, num_attention_heads=4,
+        num_key_value_heads=4, max_position_embeddings=128)
+    return transformers.LlamaForCausalLM(config).eval()
+
+
+def prefill(model, prefix_ids):
+    out = model.generate(
+        input_ids=prefix_ids, attention_mask=torch.ones_like(prefix_ids), max_new_tokens=1,
+        do_sample=False, pad_token_id=0, return_dict_in_generate=True)
+    return out.past_key_values
+
+
+def test_group_equals_per_question():
+    model = build_model()
+    prefix_ids = torch.randint(1, 64, (1, 12))
+    suffixes = [torch.randint(1, 64, (1, n)) for n in [3, 5, 1, 4]]
+
+    with torch.no_grad():
+        grouped = BaseModel.generate_on_prefix_cache(
+            model, prefill(model, prefix_ids), prefix_ids, suffixes, **GEN_KWARGS)
+        for suffix_ids, output in zip(suffixes, grouped):
+            input_ids = torch.cat([prefix_ids, suffix_ids], dim=1)
+            expected = model.generate(input_ids=input_ids, attention_mask=torch.ones_like(input_ids), **GEN_KWARGS)
+            assert torch.equal(output, expected[0, input_ids.shape[1]:])
+
+
+def test_uncroppable_cache():
+    model = build_model()
+    prefix_ids = torch.randint(1, 64, (1, 12))
+    # A cache without `crop` (e.g., the legacy tuple cache) is rejected before generating anything
+    cache = tuple((torch.zeros(1), torch.zeros(1)) for _ in range(2))
+    assert BaseModel.generate_on_prefix_cache(model, cache, prefix_ids, [prefix_ids], **GEN_KWARGS) is None
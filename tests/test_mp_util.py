@@ -0,0 +1,72 @@
+import multiprocessing as mp
+import os
+import os.path as osp
+import signal
+
+from vlmeval.smp import dump, load, load_checkpoint
+from vlmeval.utils import track_progress_rich
+from vlmeval.utils.matching_util import FAIL_MSG
+
+N_TASKS = 20
+KILL_AT = 8
+
+
+def record(log_file, key, kill=False):
+    # Log the call, and kill the process (like a crash of the evaluation) at the `KILL_AT`-th call
+    with open(log_file, 'a') as fout:
+        fout.write(f'{key}\n')
+    with open(log_file) as fin:
+        n_calls = len(fin.read().split())
+    if kill and n_calls == KILL_AT:
+        os.kill(os.getpid(), signal.SIGKILL)
+    return key * 2
+
+
+def run(save, log_file, kill):
+    keys = list(range(N_TASKS))
+    tasks = [dict(log_file=log_file, key=k, kill=kill) for k in keys]
+    return track_progress_rich(record, tasks, nproc=1, save=save, keys=keys, checkpoint_every=1)
+
+
+def read_calls(log_file):
+    with open(log_file) as fin:
+        return [int(x) for x in fin.read().split()]
+
+
+def test_resume_after_crash(tmp_path):
+    save, log_first, log_second = [str(tmp_path / x) for x in ['result.pkl', 'first.log', 'second.log']]
+    proc = mp.get_context('spawn').Process(target=run, args=(save, log_first, True))
+    proc.start()
+    proc.join()
+    assert proc.exitcode == -signal.SIGKILL
+
+    # The results journaled before the crash are resumed from, the other tasks are run again
+    assert len(read_calls(log_first)) == KILL_AT
+    finished = set(load_checkpoint(save))
+    assert 0 < len(finished) < KILL_AT
+
+    results = run(save, log_second, False)
+    assert results == [k * 2 for k in range(N_TASKS)]
+    second = read_calls(log_second)
+    assert finished.isdisjoint(second)
+    assert sorted(second) == sorted(set(range(N_TASKS)) - finished)
+    assert load(save) == {k: k * 2 for k in range(N_TASKS)}
+    assert not osp.exists(f'{save}.journal')
+
+
+def test_retry_failed(tmp_path):
+    save, log_file = str(tmp_path / 'result.pkl'), str(tmp_path / 'calls.log')
+    # The failed API responses in the checkpoint are passed back by the callers to be retried
+    failed = {k for k in range(N_TASKS) if k % 3 == 0}
+    dump({k: (f'{FAIL_MSG}: timeout' if k in failed else k * 2) for k in range(N_TASKS)}, save)
+
+    results = run(save, log_file, False)
+    assert results == [k * 2 for k in range(N_TASKS)]
+    assert sorted(read_calls(log_file)) == sorted(failed)
+    assert load(save) == {k: k * 2 for k in range(N_TASKS)}
+
+    # With `skip=None`, all tasks passed by the caller are run
+    keys = list(range(N_TASKS))
+    tasks = [dict(log_file=log_file, key=k) for k in keys]
+    track_progress_rich(record, tasks, nproc=2, save=save, keys=keys, skip=None)
+    assert len(read_calls(log_file)) == len(failed) + N_TASKS
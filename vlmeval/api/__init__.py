@@ -1,5 +1,6 @@
 from .gpt import OpenAIWrapper, GPT4V
 from .hf_chat_model import HFChatModel
+from .local_judge import LocalJudge
 from .gemini import GeminiWrapper, GeminiProVision
 from .qwen_vl_api import QwenVLWrapper, QwenVLAPI, Qwen2VLAPI
 from .qwen_api import QwenAPI
@@ -26,5 +27,5 @@ __all__ = [
     'CWWrapper', 'SenseChatVisionAPI', 'HunyuanVision', 'Qwen2VLAPI',
     'BlueLMWrapper', 'BlueLM_V_API', 'JTVLChatAPI', 'bailingMMAPI',
     'TaiyiAPI', 'TeleMMAPI', 'SiliconFlowAPI', 'LMDeployAPI',
-    'TaichuVLAPI', 'DoubaoVL'
+    'TaichuVLAPI', 'DoubaoVL', 'LocalJudge'
 ]
@@ -1,9 +1,13 @@
 import time
+import asyncio
 import random as rd
 from abc import abstractmethod
 import os.path as osp
+import json
 import copy as cp
 from ..smp import get_logger, parse_file, concat_images_vlmeval, LMUDataRoot, md5, decode_base64_to_image_file
+from .rate_limit import get_rate_limiter
+from .cache import get_response_cache
 
 
 class BaseAPI:
@@ -11,6 +15,8 @@ class BaseAPI:
     allowed_types = ['text', 'image']
     INTERLEAVE = True
     INSTALL_REQ = False
+    # Whether the API model implements a native (non-blocking) `agenerate_inner`
+    ASYNC = False
 
     def __init__(self,
                  retry=10,
@@ -18,6 +24,10 @@ class BaseAPI:
                  system_prompt=None,
                  verbose=True,
                  fail_msg='Failed to obtain answer via API.',
+                 rpm=None,
+                 tpm=None,
+                 max_concurrency=None,
+                 cache=None,
                  **kwargs):
         """Base Class for all APIs.
 
@@ -28,6 +38,12 @@ class BaseAPI:
             verbose (bool, optional): Defaults to True.
             fail_msg (str, optional): The message to return when failed to obtain answer.
                 Defaults to 'Failed to obtain answer via API.'.
+            rpm (int, optional): The requests-per-minute budget of the endpoint. Defaults to None (unlimited).
+            tpm (int, optional): The tokens-per-minute budget of the endpoint. Defaults to None (unlimited).
+            max_concurrency (int, optional): The upper bound of concurrent requests to the endpoint, the actual
+                concurrency is adapted to the throttled responses. Defaults to None (256).
+            cache (bool | str, optional): Whether to cache the successful responses on disk, or the path of the
+                cache file. Defaults to None (controlled by the environment variable `API_CACHE`).
             **kwargs: Other kwargs for `generate_inner`.
         """
 
@@ -42,6 +58,115 @@ class BaseAPI:
             self.logger.info(f'BaseAPI received the following kwargs: {kwargs}')
             self.logger.info('Will try to use them as kwargs for `generate`. ')
         self.default_kwargs = kwargs
+        self.rate_limit_kwargs = dict(rpm=rpm, tpm=tpm, max_concurrency=max_concurrency)
+        self.response_cache = get_response_cache(cache)
+        self._session = None
+        self._async_client = None
+        self._rate_limiter = None
+
+    @property
+    def session(self):
+        """A `requests.Session` shared by all calls of this API model, so that the HTTP connections are pooled and
+        reused across requests (no fresh TCP + TLS handshake for each call)."""
+        if getattr(self, '_session', None) is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=16, pool_maxsize=256)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._session = session
+        return self._session
+
+    def get_async_client(self):
+        """The pooled async HTTP client used by `agenerate_inner`. HTTP/2 is enabled if `h2` is installed.
+
+        The client is bound to the running event loop, call `aclose` before the loop is closed.
+        """
+        if getattr(self, '_async_client', None) is None:
+            try:
+                import httpx
+            except ImportError as err:
+                self.logger.critical('httpx is not installed, please install it via `pip install httpx[http2]`. ')
+                raise err
+            try:
+                import h2  # noqa: F401
+                http2 = True
+            except ImportError:
+                http2 = False
+            limits = httpx.Limits(max_connections=None, max_keepalive_connections=256)
+            self._async_client = httpx.AsyncClient(http2=http2, limits=limits, timeout=getattr(self, 'timeout', 60))
+        return self._async_client
+
+    async def aclose(self):
+        if getattr(self, '_async_client', None) is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+    @property
+    def rate_limiter(self):
+        """The rate limiter shared by all API models (including judges) calling the same endpoint, configured once
+        on first use (`api_base` is set by the subclasses after `BaseAPI.__init__`)."""
+        if getattr(self, '_rate_limiter', None) is None:
+            key = getattr(self, 'api_base', None) or self.__class__.__name__
+            self._rate_limiter = get_rate_limiter(key, **getattr(self, 'rate_limit_kwargs', {}))
+        return self._rate_limiter
+
+    def cache_id(self):
+        """The identity of the model in the response cache, including the attributes that affect the response."""
+        attrs = ['model', 'api_base', 'temperature', 'max_tokens', 'system_prompt', 'img_size', 'img_detail']
+        record = {k: getattr(self, k) for k in attrs if hasattr(self, k)}
+        record['class'] = self.__class__.__name__
+        return json.dumps(record, sort_keys=True, default=str)
+
+    def cache_key(self, message, **kwargs):
+        """The key of the request in the response cache, None if the cache is disabled."""
+        if getattr(self, 'response_cache', None) is None:
+            return None
+        return self.response_cache.make_key(self.cache_id(), message, **kwargs)
+
+    def estimate_tokens(self, inputs, **kwargs):
+        """A rough estimation of the tokens consumed by a request, used by the tokens-per-minute budget."""
+        def prompt_tokens(items):
+            tot = 0
+            for item in items:
+                if 'role' in item and isinstance(item.get('content'), list):
+                    tot += prompt_tokens(item['content'])
+                elif item.get('type') == 'text':
+                    tot += len(str(item['value'])) // 4
+                elif item.get('type') == 'image':
+                    tot += 85
+            return tot
+
+        return prompt_tokens(inputs) + (kwargs.get('max_tokens', getattr(self, 'max_tokens', 0)) or 0)
+
+    def limited_call(self, inner, inputs, **kwargs):
+        """Call `inner` (`generate_inner` or `chat_inner`) under the shared rate limiter.
+
+        Returns:
+            tuple(int, str, str, bool): ret_code, response, log, and whether the request is throttled.
+        """
+        limiter = self.rate_limiter
+        limiter.acquire(self.estimate_tokens(inputs, **kwargs) if limiter.token_bucket is not None else 0)
+        try:
+            ret_code, answer, log = inner(inputs, **kwargs)
+        except Exception:
+            limiter.release()
+            raise
+        throttled = limiter.release(ret_code, getattr(log, 'headers', None), backoff=self.wait)
+        return ret_code, answer, log, throttled
+
+    async def alimited_call(self, inner, inputs, **kwargs):
+        """The async version of `limited_call`, `inner` should be a coroutine function."""
+        limiter = self.rate_limiter
+        await limiter.aacquire(self.estimate_tokens(inputs, **kwargs) if limiter.token_bucket is not None else 0)
+        try:
+            ret_code, answer, log = await inner(inputs, **kwargs)
+        except Exception:
+            limiter.release()
+            raise
+        throttled = limiter.release(ret_code, getattr(log, 'headers', None), backoff=self.wait)
+        return ret_code, answer, log, throttled
 
     @abstractmethod
     def generate_inner(self, inputs, **kwargs):
@@ -163,34 +288,34 @@ class BaseAPI:
         kwargs = cp.deepcopy(self.default_kwargs)
         kwargs.update(kwargs1)
 
+        assert messages[-1]['role'] == 'user'
+        cache_key = self.cache_key(messages, **kwargs)
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
         answer = None
         # a very small random delay [0s - 0.5s]
         T = rd.random() * 0.5
         time.sleep(T)
 
-        assert messages[-1]['role'] == 'user'
-
         for i in range(self.retry):
+            throttled = False
             try:
-                ret_code, answer, log = self.chat_inner(messages, **kwargs)
-                if ret_code == 0 and self.fail_msg not in answer and answer != '':
-                    if self.verbose:
-                        print(answer)
+                ret_code, answer, log, throttled = self.limited_call(self.chat_inner, messages, **kwargs)
+                if self.check_response(ret_code, answer, log):
+                    if cache_key is not None:
+                        self.response_cache.put(cache_key, self.cache_id(), answer)
                     return answer
-                elif self.verbose:
-                    if not isinstance(log, str):
-                        try:
-                            log = log.text
-                        except Exception as e:
-                            self.logger.warning(f'Failed to parse {log} as an http response: {str(e)}. ')
-                    self.logger.info(f'RetCode: {ret_code}\nAnswer: {answer}\nLog: {log}')
             except Exception as err:
                 if self.verbose:
                     self.logger.error(f'An error occured during try {i}: ')
                     self.logger.error(f'{type(err)}: {err}')
-            # delay before each retry
-            T = rd.random() * self.wait * 2
-            time.sleep(T)
+            # delay before each retry, throttled requests are delayed by the shared rate limiter instead
+            if not throttled:
+                T = rd.random() * self.wait * 2
+                time.sleep(T)
 
         return self.fail_msg if answer in ['', None] else answer
 
@@ -213,15 +338,8 @@ class BaseAPI:
                 self.system_prompt += '\n' + system_prompt
         return new_message
 
-    def generate(self, message, **kwargs1):
-        """The main function to generate the answer. Will call `generate_inner` with the preprocessed input messages.
-
-        Args:
-            message: raw input messages.
-
-        Returns:
-            str: The generated answer of the Failed Message if failed to obtain answer.
-        """
+    def preproc_generate(self, message, **kwargs1):
+        """Preprocess the raw input messages and merge the kwargs for `generate_inner`."""
         if self.check_content(message) == 'listdict':
             message = self.preprocess_message_with_role(message)
 
@@ -234,6 +352,38 @@ class BaseAPI:
         # merge kwargs
         kwargs = cp.deepcopy(self.default_kwargs)
         kwargs.update(kwargs1)
+        return message, kwargs
+
+    def check_response(self, ret_code, answer, log):
+        """Return True if the response is valid, otherwise log the failure (if verbose) and return False."""
+        if ret_code == 0 and self.fail_msg not in answer and answer != '':
+            if self.verbose:
+                print(answer)
+            return True
+        elif self.verbose:
+            if not isinstance(log, str):
+                try:
+                    log = log.text
+                except Exception as e:
+                    self.logger.warning(f'Failed to parse {log} as an http response: {str(e)}. ')
+            self.logger.info(f'RetCode: {ret_code}\nAnswer: {answer}\nLog: {log}')
+        return False
+
+    def generate(self, message, **kwargs1):
+        """The main function to generate the answer. Will call `generate_inner` with the preprocessed input messages.
+
+        Args:
+            message: raw input messages.
+
+        Returns:
+            str: The generated answer of the Failed Message if failed to obtain answer.
+        """
+        message, kwargs = self.preproc_generate(message, **kwargs1)
+        cache_key = self.cache_key(message, **kwargs)
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
 
         answer = None
         # a very small random delay [0s - 0.5s]
@@ -241,26 +391,66 @@ class BaseAPI:
         time.sleep(T)
 
         for i in range(self.retry):
+            throttled = False
+            try:
+                ret_code, answer, log, throttled = self.limited_call(self.generate_inner, message, **kwargs)
+                if self.check_response(ret_code, answer, log):
+                    if cache_key is not None:
+                        self.response_cache.put(cache_key, self.cache_id(), answer)
+                    return answer
+            except Exception as err:
+                if self.verbose:
+                    self.logger.error(f'An error occured during try {i}: ')
+                    self.logger.error(f'{type(err)}: {err}')
+            # delay before each retry, throttled requests are delayed by the shared rate limiter instead
+            if not throttled:
+                T = rd.random() * self.wait * 2
+                time.sleep(T)
+
+        return self.fail_msg if answer in ['', None] else answer
+
+    async def agenerate_inner(self, inputs, **kwargs):
+        """The async version of `generate_inner`. API models that talk to an HTTP endpoint should override it with
+        a native implementation based on `get_async_client`. By default, will run `generate_inner` in a thread.
+
+        Returns:
+            tuple(int, str, str): ret_code, response, log
+        """
+        return await asyncio.to_thread(self.generate_inner, inputs, **kwargs)
+
+    async def agenerate(self, message, **kwargs1):
+        """The async version of `generate`, will call `agenerate_inner` with the preprocessed input messages.
+
+        Args:
+            message: raw input messages.
+
+        Returns:
+            str: The generated answer of the Failed Message if failed to obtain answer.
+        """
+        message, kwargs = self.preproc_generate(message, **kwargs1)
+        cache_key = self.cache_key(message, **kwargs)
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        answer = None
+        for i in range(self.retry):
+            throttled = False
             try:
-                ret_code, answer, log = self.generate_inner(message, **kwargs)
-                if ret_code == 0 and self.fail_msg not in answer and answer != '':
-                    if self.verbose:
-                        print(answer)
+                ret_code, answer, log, throttled = await self.alimited_call(self.agenerate_inner, message, **kwargs)
+                if self.check_response(ret_code, answer, log):
+                    if cache_key is not None:
+                        self.response_cache.put(cache_key, self.cache_id(), answer)
                     return answer
-                elif self.verbose:
-                    if not isinstance(log, str):
-                        try:
-                            log = log.text
-                        except Exception as e:
-                            self.logger.warning(f'Failed to parse {log} as an http response: {str(e)}. ')
-                    self.logger.info(f'RetCode: {ret_code}\nAnswer: {answer}\nLog: {log}')
             except Exception as err:
                 if self.verbose:
                     self.logger.error(f'An error occured during try {i}: ')
                     self.logger.error(f'{type(err)}: {err}')
-            # delay before each retry
-            T = rd.random() * self.wait * 2
-            time.sleep(T)
+            # delay before each retry, throttled requests are delayed by the shared rate limiter instead
+            if not throttled:
+                T = rd.random() * self.wait * 2
+                await asyncio.sleep(T)
 
         return self.fail_msg if answer in ['', None] else answer
 
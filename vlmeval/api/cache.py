@@ -0,0 +1,144 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import os.path as osp
+from ..smp import LMUDataRoot, md5
+
+
+class ResponseCache:
+    """A persistent, content-addressed cache of API responses backed by SQLite.
+
+    The key of a request is the sha256 of the model id, the generation kwargs and the normalized message (images are
+    represented by their content hashes, so the same image under different paths shares the cache entry). Only
+    successful responses are cached. The database is in WAL mode, and can be shared by multiple processes.
+
+    Args:
+        pth (str): The path of the SQLite database.
+        ttl (float, optional): The time-to-live (in seconds) of the entries. Default to None (never expire).
+        max_entries (int, optional): Evict the least recently used entries if the cache grows beyond `max_entries`.
+            Default to None (unbounded).
+    """
+
+    def __init__(self, pth, ttl=None, max_entries=None):
+        os.makedirs(osp.dirname(osp.abspath(pth)), exist_ok=True)
+        self.pth = pth
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(pth, timeout=60, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'key TEXT PRIMARY KEY, model TEXT, response TEXT, created REAL, accessed REAL)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+        self.hits, self.misses, self.puts = 0, 0, 0
+        # (path, size, mtime) -> md5 of the file content
+        self.file_hashes = {}
+
+    def file_hash(self, pth):
+        st = os.stat(pth)
+        stamp = (pth, st.st_size, st.st_mtime)
+        if stamp not in self.file_hashes:
+            self.file_hashes[stamp] = md5(pth)
+        return self.file_hashes[stamp]
+
+    def normalize(self, message):
+        """Normalize the message to a json-serializable structure, images are replaced by their content hashes."""
+        if isinstance(message, list):
+            return [self.normalize(x) for x in message]
+        if isinstance(message, dict):
+            if 'role' in message and 'content' in message:
+                return dict(role=message['role'], content=self.normalize(message['content']))
+            item = {k: v for k, v in message.items() if k != 'value'}
+            value = message.get('value')
+            if message.get('type') != 'text' and isinstance(value, str) and osp.isfile(value):
+                item['hash'] = self.file_hash(value)
+            else:
+                item['value'] = value
+            return item
+        return message
+
+    def make_key(self, model, message, **kwargs):
+        record = dict(model=model, kwargs=kwargs, message=self.normalize(message))
+        record = json.dumps(record, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(record.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute('SELECT response, created FROM responses WHERE key = ?', (key, )).fetchone()
+            if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+                self.conn.execute('DELETE FROM responses WHERE key = ?', (key, ))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.conn.execute('UPDATE responses SET accessed = ? WHERE key = ?', (now, key))
+            self.hits += 1
+            return json.loads(row[0])
+
+    def put(self, key, model, response):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)',
+                (key, model, json.dumps(response, ensure_ascii=False), now, now))
+            self.puts += 1
+            # Check the size bound once in a while, evict the least recently used entries
+            if self.max_entries is not None and self.puts % 100 == 0:
+                self.evict()
+
+    def evict(self):
+        num = self.conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+        if num > self.max_entries:
+            self.conn.execute(
+                'DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed LIMIT ?)',
+                (num - self.max_entries, ))
+
+    def stats(self):
+        with self.lock:
+            num = self.conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+        tot = self.hits + self.misses
+        return dict(
+            hits=self.hits, misses=self.misses, hit_rate=self.hits / tot if tot else 0,
+            entries=num, path=self.pth)
+
+
+RESPONSE_CACHES = {}
+RESPONSE_CACHES_LOCK = threading.Lock()
+
+
+def get_response_cache(cache=None):
+    """Get the shared response cache.
+
+    Args:
+        cache (bool | str, optional): True to use the default cache file (`$LMUData/api_cache.db`), a str to use a
+            specific cache file, False to disable. If None, will read the environment variable `API_CACHE`
+            (same semantics, '1' means the default cache file). The TTL (seconds) and the max number of entries are
+            set by the environment variables `API_CACHE_TTL` and `API_CACHE_MAX_ENTRIES`.
+
+    Returns:
+        ResponseCache: The cache, or None if disabled.
+    """
+    if cache is None:
+        cache = os.environ.get('API_CACHE', None)
+        if cache in [None, '', '0', 'False']:
+            return None
+        if cache in ['1', 'True']:
+            cache = True
+    if cache is False:
+        return None
+    pth = osp.join(LMUDataRoot(), 'api_cache.db') if cache is True else cache
+    ttl = os.environ.get('API_CACHE_TTL', None)
+    max_entries = os.environ.get('API_CACHE_MAX_ENTRIES', None)
+    with RESPONSE_CACHES_LOCK:
+        if pth not in RESPONSE_CACHES:
+            RESPONSE_CACHES[pth] = ResponseCache(
+                pth,
+                ttl=float(ttl) if ttl else None,
+                max_entries=int(max_entries) if max_entries else None)
+        return RESPONSE_CACHES[pth]
@@ -1,6 +1,7 @@
 from ..smp import *
 import os
 import sys
+import asyncio
 from .base import BaseAPI
 
 APIBASES = {
@@ -32,6 +33,8 @@ def GPT_context_window(model):
 class OpenAIWrapper(BaseAPI):
 
     is_api: bool = True
+    # Has a native `agenerate_inner`, will be driven by the asyncio engine in `infer_data_api`
+    ASYNC: bool = True
 
     def __init__(self,
                  model: str = 'gpt-3.5-turbo-0613',
@@ -172,7 +175,7 @@ class OpenAIWrapper(BaseAPI):
             input_msgs.append(dict(role='user', content=self.prepare_itlist(inputs)))
         return input_msgs
 
-    def generate_inner(self, inputs, **kwargs) -> str:
+    def build_request(self, inputs, **kwargs):
         input_msgs = self.prepare_inputs(inputs)
         temperature = kwargs.pop('temperature', self.temperature)
         max_tokens = kwargs.pop('max_tokens', self.max_tokens)
@@ -202,9 +205,9 @@ class OpenAIWrapper(BaseAPI):
             n=1,
             temperature=temperature,
             **kwargs)
-        response = requests.post(
-            self.api_base,
-            headers=headers, data=json.dumps(payload), timeout=self.timeout * 1.1)
+        return headers, payload
+
+    def parse_response(self, response):
         ret_code = response.status_code
         ret_code = 0 if (200 <= int(ret_code) < 300) else ret_code
         answer = self.fail_msg
@@ -218,6 +221,21 @@ class OpenAIWrapper(BaseAPI):
 
         return ret_code, answer, response
 
+    def generate_inner(self, inputs, **kwargs) -> str:
+        headers, payload = self.build_request(inputs, **kwargs)
+        response = self.session.post(
+            self.api_base,
+            headers=headers, data=json.dumps(payload), timeout=self.timeout * 1.1)
+        return self.parse_response(response)
+
+    async def agenerate_inner(self, inputs, **kwargs) -> str:
+        # Encoding images is CPU-bound, do not block the event loop with it
+        headers, payload = await asyncio.to_thread(self.build_request, inputs, **kwargs)
+        response = await self.get_async_client().post(
+            self.api_base,
+            headers=headers, content=json.dumps(payload), timeout=self.timeout * 1.1)
+        return self.parse_response(response)
+
     def get_image_token_len(self, img_path, detail='low'):
         import math
         if detail == 'low':
@@ -265,3 +283,6 @@ class GPT4V(OpenAIWrapper):
 
     def generate(self, message, dataset=None):
         return super(GPT4V, self).generate(message)
+
+    async def agenerate(self, message, dataset=None):
+        return await super(GPT4V, self).agenerate(message)
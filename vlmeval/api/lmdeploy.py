@@ -1,5 +1,6 @@
 # from http import HTTPStatus
 import os
+import asyncio
 import requests
 from ..dataset import DATASET_TYPE, DATASET_MODALITY
 from vlmeval.api.base import BaseAPI
@@ -149,6 +150,8 @@ class CogVLM2_PromptUtil:
 class LMDeployWrapper(BaseAPI):
 
     is_api: bool = True
+    # Has a native `agenerate_inner`, will be driven by the asyncio engine in `infer_data_api`
+    ASYNC: bool = True
 
     custom_prompt: str = None
     prompt_map = {
@@ -271,7 +274,7 @@ class LMDeployWrapper(BaseAPI):
             input_msgs.append(dict(role='user', content=self.prepare_itlist(inputs)))
         return input_msgs
 
-    def generate_inner(self, inputs, **kwargs) -> str:
+    def build_request(self, inputs, **kwargs):
         input_msgs = self.prepare_inputs(inputs)
 
         temperature = kwargs.pop('temperature', self.temperature)
@@ -286,9 +289,9 @@ class LMDeployWrapper(BaseAPI):
             n=1,
             temperature=temperature,
             **kwargs)
-        response = requests.post(
-            self.api_base,
-            headers=headers, data=json.dumps(payload), timeout=self.timeout * 1.1)
+        return headers, payload
+
+    def parse_response(self, response, dataset=None):
         ret_code = response.status_code
         ret_code = 0 if (200 <= int(ret_code) < 300) else ret_code
         answer = self.fail_msg
@@ -299,11 +302,26 @@ class LMDeployWrapper(BaseAPI):
             # for internvl2-8b-mpo-cot
             if getattr(self, 'use_mpo_prompt', False):
                 from ..vlm.internvl.utils import mpo_post_processing
-                answer = mpo_post_processing(answer, kwargs.get('dataset'))
+                answer = mpo_post_processing(answer, dataset)
         except:
             pass
         return ret_code, answer, response
 
+    def generate_inner(self, inputs, **kwargs) -> str:
+        headers, payload = self.build_request(inputs, **kwargs)
+        response = self.session.post(
+            self.api_base,
+            headers=headers, data=json.dumps(payload), timeout=self.timeout * 1.1)
+        return self.parse_response(response, dataset=kwargs.get('dataset'))
+
+    async def agenerate_inner(self, inputs, **kwargs) -> str:
+        # Encoding images is CPU-bound, do not block the event loop with it
+        headers, payload = await asyncio.to_thread(self.build_request, inputs, **kwargs)
+        response = await self.get_async_client().post(
+            self.api_base,
+            headers=headers, content=json.dumps(payload), timeout=self.timeout * 1.1)
+        return self.parse_response(response, dataset=kwargs.get('dataset'))
+
 
 class LMDeployAPI(LMDeployWrapper):
 
@@ -312,3 +330,6 @@ class LMDeployAPI(LMDeployWrapper):
 
     def generate(self, message, dataset=None):
         return super(LMDeployAPI, self).generate(message, dataset=dataset)
+
+    async def agenerate(self, message, dataset=None):
+        return await super(LMDeployAPI, self).agenerate(message, dataset=dataset)
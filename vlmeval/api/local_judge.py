@@ -0,0 +1,158 @@
+import json
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+from ..smp import *
+from .base import BaseAPI
+
+
+class LocalLLM:
+    """A text LLM loaded in the current process, serving the prompts of many threads with batched generation.
+
+    Prompts are queued by `submit`, and a background thread gathers up to `batch_size` queued prompts (waiting at
+    most `max_wait` seconds) and generates the prompts with the same generation kwargs in one batch. Models with a
+    chat template are run with `transformers` (`AutoModelForCausalLM.generate` with left padding). Models without one
+    (e.g., the legacy `model.chat` LLMs) are served by `HFChatModel`, one prompt at a time.
+
+    Args:
+        model_path (str): The HuggingFace repo id or the local path of the LLM.
+        batch_size (int): The max number of prompts generated in one batch. Default to 16.
+        max_wait (float): The max time in seconds to wait for a batch to be filled. Default to 0.05.
+    """
+
+    def __init__(self, model_path, batch_size=16, max_wait=0.05):
+        from transformers import AutoTokenizer
+        self.model_path = model_path
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.logger = get_logger('LocalLLM')
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path, trust_remote_code=True, padding_side='left')
+        if getattr(self.tokenizer, 'chat_template', None) is None:
+            from .hf_chat_model import HFChatModel
+            self.logger.info(f'{model_path} has no chat template, will be served by HFChatModel without batching. ')
+            self.chat_model = HFChatModel(model_path)
+            self.model = None
+        else:
+            from transformers import AutoModelForCausalLM
+            self.chat_model = None
+            self.model = AutoModelForCausalLM.from_pretrained(
+                model_path, torch_dtype='auto', device_map='auto', trust_remote_code=True).eval()
+            if self.tokenizer.pad_token is None:
+                self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.queue = queue.Queue()
+        self.worker = threading.Thread(target=self.serve, daemon=True)
+        self.worker.start()
+
+    def submit(self, messages, max_tokens=1024, temperature=0):
+        """Queue a chat (a list of `{'role', 'content'}` dicts) for generation.
+
+        Returns:
+            Future: The future of the generated text.
+        """
+        future = Future()
+        self.queue.put((messages, dict(max_tokens=max_tokens, temperature=temperature), future))
+        return future
+
+    def serve(self):
+        while True:
+            items = [self.queue.get()]
+            deadline = time.time() + self.max_wait
+            while len(items) < self.batch_size:
+                try:
+                    items.append(self.queue.get(timeout=max(deadline - time.time(), 0)))
+                except queue.Empty:
+                    break
+            groups = defaultdict(list)
+            for item in items:
+                groups[json.dumps(item[1], sort_keys=True)].append(item)
+            for group in groups.values():
+                try:
+                    outputs = self.generate_batch([x[0] for x in group], **group[0][1])
+                    for (_, _, future), output in zip(group, outputs):
+                        future.set_result(output)
+                except Exception as err:
+                    for _, _, future in group:
+                        future.set_exception(err)
+
+    def generate_batch(self, chats, max_tokens=1024, temperature=0):
+        if self.chat_model is not None:
+            return [self.chat_model.generate('\n'.join(x['content'] for x in chat)) for chat in chats]
+
+        import torch
+        texts = [self.tokenizer.apply_chat_template(chat, tokenize=False, add_generation_prompt=True) for chat in chats]
+        inputs = self.tokenizer(texts, return_tensors='pt', padding=True, add_special_tokens=False)
+        inputs = inputs.to(self.model.device)
+        params = dict(max_new_tokens=max_tokens, do_sample=temperature > 0, pad_token_id=self.tokenizer.pad_token_id)
+        if temperature > 0:
+            params['temperature'] = temperature
+        with torch.inference_mode():
+            outputs = self.model.generate(**inputs, **params)
+        outputs = outputs[:, inputs['input_ids'].shape[1]:]
+        return [x.strip() for x in self.tokenizer.batch_decode(outputs, skip_special_tokens=True)]
+
+
+LOCAL_LLMS = {}
+LOCAL_LLMS_LOCK = threading.Lock()
+
+
+def get_local_llm(model_path, **kwargs):
+    """Get the `LocalLLM` of `model_path`, loaded once and shared by all local judges in the process."""
+    with LOCAL_LLMS_LOCK:
+        if model_path not in LOCAL_LLMS:
+            LOCAL_LLMS[model_path] = LocalLLM(model_path, **kwargs)
+        return LOCAL_LLMS[model_path]
+
+
+class LocalJudge(BaseAPI):
+    """A judge LLM running in the current process, with the same interface as the API judges.
+
+    The concurrent `generate` calls of the evaluators (from the threads of `track_progress_rich`) are generated in
+    batches by the shared `LocalLLM`. The judge results are cached on disk by the response cache (enabled by default,
+    see `get_response_cache`), so re-running an evaluation does not generate them again.
+
+    Args:
+        model_path (str): The HuggingFace repo id or the local path of the judge LLM.
+        batch_size (int): The max number of prompts generated in one batch. Default to 16.
+        max_tokens (int): The max number of generated tokens. Default to 1024.
+        temperature (float): The sampling temperature, 0 for greedy decoding. Default to 0.
+        cache (bool | str): Cache the judge results on disk, see `BaseAPI`. Default to True.
+        **kwargs: Other kwargs of `BaseAPI`.
+    """
+
+    is_api = True
+    allowed_types = ['text']
+
+    def __init__(self,
+                 model_path,
+                 batch_size=16,
+                 max_tokens=1024,
+                 temperature=0,
+                 retry=2,
+                 wait=0,
+                 cache=True,
+                 **kwargs):
+        self.model = model_path
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        super().__init__(retry=retry, wait=wait, cache=cache, **kwargs)
+        self.llm = get_local_llm(model_path, batch_size=batch_size)
+
+    def generate_inner(self, inputs, **kwargs):
+        messages = []
+        if self.system_prompt is not None:
+            messages.append(dict(role='system', content=self.system_prompt))
+        messages.append(dict(role='user', content='\n'.join(x['value'] for x in inputs if x['type'] == 'text')))
+        max_tokens = kwargs.pop('max_tokens', self.max_tokens)
+        temperature = kwargs.pop('temperature', self.temperature)
+        answer = self.llm.submit(messages, max_tokens=max_tokens, temperature=temperature).result()
+        return 0, answer, 'Succeeded! '
+
+
+def local_server_model(api_base, key=None):
+    """The name of the (first) model served by an OpenAI-compatible server, e.g., `lmdeploy serve api_server`."""
+    import requests
+    url = api_base.split('/chat/completions')[0].rstrip('/') + '/models'
+    headers = {'Authorization': f'Bearer {key}'} if key else {}
+    return requests.get(url, headers=headers, timeout=10).json()['data'][0]['id']
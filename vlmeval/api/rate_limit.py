@@ -0,0 +1,207 @@
+import re
+import time
+import asyncio
+import threading
+from email.utils import parsedate_to_datetime
+
+
+def parse_duration(s):
+    """Parse durations in rate-limit headers to seconds, e.g., '1.5', '20ms', '6m0s', '1h2m3.5s'."""
+    if s is None:
+        return None
+    s = str(s).strip()
+    try:
+        return float(s)
+    except ValueError:
+        pass
+    units = {'h': 3600, 'm': 60, 's': 1, 'ms': 1e-3}
+    parts = re.findall(r'([\d.]+)(ms|h|m|s)', s)
+    if len(parts) == 0:
+        return None
+    return sum(float(v) * units[u] for v, u in parts)
+
+
+def parse_retry_after(headers):
+    """Get the seconds to wait from the `Retry-After` (or `retry-after-ms`) header, None if absent."""
+    if headers is None:
+        return None
+    if headers.get('retry-after-ms') is not None:
+        try:
+            return float(headers['retry-after-ms']) / 1000
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+    except Exception:
+        return None
+
+
+class TokenBucket:
+    """A token bucket with `rate` tokens per minute and a burst capacity of one minute of tokens."""
+
+    def __init__(self, rate):
+        self.capacity = float(rate)
+        self.fill_rate = float(rate) / 60
+        self.tokens = float(rate)
+        self.stamp = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.fill_rate)
+        self.stamp = now
+
+    def delay(self, amount, now):
+        """The seconds to wait before `amount` tokens are available."""
+        self.refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0
+        return (amount - self.tokens) / self.fill_rate
+
+    def consume(self, amount, now):
+        self.refill(now)
+        self.tokens -= min(amount, self.capacity)
+
+    def drain(self, until, now):
+        # The server says the budget is exhausted until `until`
+        self.refill(now)
+        self.tokens = min(self.tokens, -(until - now) * self.fill_rate)
+
+
+class RateLimiter:
+    """A rate limiter shared by all callers of the same API endpoint.
+
+    It enforces the requests-per-minute (RPM) and tokens-per-minute (TPM) budgets with token buckets, honors the
+    `Retry-After` and `x-ratelimit-*` headers of the responses, and adapts the number of concurrent requests with
+    AIMD: the limit increases by 1 per `limit` successful requests, and halves on each throttled (429) response.
+    Thread workers use `acquire` / `release`, coroutines use `aacquire` / `release`.
+
+    Args:
+        rpm (int, optional): The requests-per-minute budget. Default to None (unlimited).
+        tpm (int, optional): The tokens-per-minute budget. Default to None (unlimited).
+        max_concurrency (int): The upper bound of concurrent requests. Default to 256.
+        min_concurrency (int): The lower bound of concurrent requests. Default to 1.
+    """
+
+    def __init__(self, rpm=None, tpm=None, max_concurrency=256, min_concurrency=1):
+        self.lock = threading.Lock()
+        self.request_bucket = TokenBucket(rpm) if rpm else None
+        self.token_bucket = TokenBucket(tpm) if tpm else None
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self.blocked_until = 0
+        self.stats = dict(requests=0, throttled=0)
+
+    def configure(self, rpm=None, tpm=None, max_concurrency=None):
+        # Only rebuild a bucket if its rate changes, so the budget already consumed is kept
+        with self.lock:
+            if rpm and (self.request_bucket is None or self.request_bucket.capacity != float(rpm)):
+                self.request_bucket = TokenBucket(rpm)
+            if tpm and (self.token_bucket is None or self.token_bucket.capacity != float(tpm)):
+                self.token_bucket = TokenBucket(tpm)
+            if max_concurrency:
+                self.max_concurrency = max_concurrency
+                self.limit = min(self.limit, float(max_concurrency))
+
+    def try_acquire(self, tokens=0):
+        """Acquire a slot for a request if possible.
+
+        Returns:
+            float: 0 if acquired, otherwise the seconds to wait before trying again.
+        """
+        with self.lock:
+            now = time.monotonic()
+            delay = max(self.blocked_until - now, 0)
+            if self.request_bucket is not None:
+                delay = max(delay, self.request_bucket.delay(1, now))
+            if self.token_bucket is not None:
+                delay = max(delay, self.token_bucket.delay(tokens, now))
+            if delay > 0:
+                return delay
+            if self.in_flight >= int(self.limit):
+                # Woken up by `release`, or by a short timeout
+                return 0.05
+            if self.request_bucket is not None:
+                self.request_bucket.consume(1, now)
+            if self.token_bucket is not None:
+                self.token_bucket.consume(tokens, now)
+            self.in_flight += 1
+            self.stats['requests'] += 1
+            return 0
+
+    def acquire(self, tokens=0):
+        while True:
+            delay = self.try_acquire(tokens)
+            if delay == 0:
+                return
+            time.sleep(delay)
+
+    async def aacquire(self, tokens=0):
+        while True:
+            delay = self.try_acquire(tokens)
+            if delay == 0:
+                return
+            await asyncio.sleep(delay)
+
+    def release(self, ret_code=None, headers=None, backoff=1):
+        """Release the slot of a finished request and adapt the limits to the response.
+
+        Args:
+            ret_code: The return code of `generate_inner`, 0 means success and 429 means throttled.
+            headers: The headers of the HTTP response, if available.
+            backoff (float): The seconds to pause all requests on a throttled response without `Retry-After`.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.in_flight = max(self.in_flight - 1, 0)
+            throttled = str(ret_code) == '429'
+            if throttled:
+                self.stats['throttled'] += 1
+                self.limit = max(self.min_concurrency, self.limit / 2)
+                retry_after = parse_retry_after(headers)
+                pause = retry_after if retry_after is not None else backoff
+                self.blocked_until = max(self.blocked_until, now + pause)
+            elif ret_code == 0:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            if headers is not None:
+                self.update_from_headers(headers, now)
+            return throttled
+
+    def update_from_headers(self, headers, now):
+        # OpenAI-style headers, e.g., x-ratelimit-remaining-requests: 0, x-ratelimit-reset-requests: 1s
+        for kind, bucket in [('requests', self.request_bucket), ('tokens', self.token_bucket)]:
+            remaining = headers.get(f'x-ratelimit-remaining-{kind}')
+            reset = parse_duration(headers.get(f'x-ratelimit-reset-{kind}'))
+            if remaining is None or reset is None:
+                continue
+            try:
+                remaining = float(remaining)
+            except ValueError:
+                continue
+            if remaining <= 0:
+                if bucket is not None:
+                    bucket.drain(now + reset, now)
+                else:
+                    self.blocked_until = max(self.blocked_until, now + reset)
+
+
+RATE_LIMITERS = {}
+RATE_LIMITERS_LOCK = threading.Lock()
+
+
+def get_rate_limiter(key, rpm=None, tpm=None, max_concurrency=None):
+    """Get the rate limiter shared by all API models calling the endpoint `key` (created if not exists)."""
+    with RATE_LIMITERS_LOCK:
+        if key not in RATE_LIMITERS:
+            RATE_LIMITERS[key] = RateLimiter(rpm=rpm, tpm=tpm, max_concurrency=max_concurrency or 256)
+        else:
+            RATE_LIMITERS[key].configure(rpm=rpm, tpm=tpm, max_concurrency=max_concurrency)
+        return RATE_LIMITERS[key]
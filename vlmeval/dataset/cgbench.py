@@ -3,6 +3,7 @@ from ..smp import *
 from .video_base import VideoBaseDataset
 from .utils import build_judge, DEBUG_MESSAGE
 from .utils.cgbench import *
+from .utils.subtitle import load_subtitle_index, frame_time
 from ..utils import track_progress_rich
 
 
@@ -84,7 +85,7 @@ class CGBench_MCQ_Grounding_Mini(VideoBaseDataset):
         self.use_frame_time = use_frame_time
         self.dataset_name = dataset
         lmu_root = LMUDataRoot()
-        self.clue_frame_root = osp.join(lmu_root, "clue_images", dataset)
+        self.clue_frame_root = osp.join(lmu_root, "clue_images", dataset + self.frame_root_suffix)
 
     @classmethod
     def supported_datasets(cls):
@@ -102,34 +103,12 @@ class CGBench_MCQ_Grounding_Mini(VideoBaseDataset):
 
     def get_subtitles(self, subtitle_path, frame_indices=None, fps=None, sub_time=False):
 
-        subtitles = []
-
         srt_path = osp.join(self.data_root, subtitle_path)
         assert osp.exists(srt_path)
-        import pysubs2
-
-        subs = pysubs2.load(srt_path, encoding="utf-8")
-        if not frame_indices:
-            for sub in subs:
-                sub_text = sub.text.replace("\\N", " ")
-                if sub_time:
-                    start_time = milliseconds_to_seconds(sub.start)
-                    end_time = milliseconds_to_seconds(sub.end)
-                    sub_text = f"[{start_time}, {end_time}] {sub_text}"
-                if sub_text.strip() and sub_text not in subtitles:
-                    subtitles.append(sub_text)
-        else:
-            for selected_frame_id in frame_indices:
-                cur_time = pysubs2.make_time(fps=fps, frames=selected_frame_id)
-                for sub in subs:
-                    if sub.start < cur_time and sub.end > cur_time:
-                        sub_text = sub.text.replace("\\N", " ")
-                        if sub_time:
-                            start_time = milliseconds_to_seconds(sub.start)
-                            end_time = milliseconds_to_seconds(sub.end)
-                            sub_text = f"[{start_time}, {end_time}] {sub_text}"
-                        if sub_text.strip() and sub_text not in subtitles:
-                            subtitles.append(sub_text)
+
+        index = load_subtitle_index(srt_path)
+        timestamps = [frame_time(x, fps) for x in frame_indices] if frame_indices else None
+        subtitles = index.lookup(timestamps, sub_time=sub_time)
 
         if subtitles:
             subtitles_str = '\n'.join(subtitles)
@@ -148,15 +127,14 @@ class CGBench_MCQ_Grounding_Mini(VideoBaseDataset):
             if md5(data_file) != self.MD5:
                 return False
             data = load(data_file)
-            for video_pth in data["video"]:
-                if not osp.exists(osp.join(pth, video_pth)):
-                    return False
+            if missing_files([osp.join(pth, x) for x in data["video"]]):
+                return False
 
             return True
 
         cache_path = get_cache_path(repo_id)
 
-        if cache_path is not None and check_integrity(cache_path):
+        if cache_path is not None and verify_once(cache_path, dataset_name, check_integrity, key=self.MD5):
             dataset_path = cache_path
         else:
 
@@ -352,9 +330,8 @@ class CGBench_MCQ_Grounding_Mini(VideoBaseDataset):
             uid = str(uid)
 
         vid_path = osp.join(self.data_root, video)
-        vid = decord.VideoReader(vid_path)
+        vid = self.video_reader(vid_path)
         vid_fps = vid.get_avg_fps()
-        n_frames = len(vid)
 
         if clue_intervals is not None:
             merged_intervals = merge_intervals(clue_intervals)
@@ -382,15 +359,11 @@ class CGBench_MCQ_Grounding_Mini(VideoBaseDataset):
 
         else:
             if num_frames > 0 and fps < 0:
-                step_size = len(vid) / (num_frames + 1)
-                indices = [int(i * step_size) for i in range(1, num_frames + 1)]
+                indices = self.frame_indices(vid, vid_path, nframe=num_frames, fps=-1)
 
                 frame_paths = self.frame_paths(uid)
             elif fps > 0:
-                total_duration = n_frames / vid_fps
-                required_frames = int(total_duration * fps)
-                step_size = vid_fps / fps
-                indices = [int(i * step_size) for i in range(required_frames)]
+                indices = self.frame_indices(vid, vid_path, fps=fps)
                 frame_paths = self.frame_paths_fps(uid, len(indices))
 
         # Save and validate frames
@@ -398,7 +371,7 @@ class CGBench_MCQ_Grounding_Mini(VideoBaseDataset):
         valid_indices = []
 
         if not np.all([osp.exists(p) for p in frame_paths]):
-            images = [vid[i].asnumpy() for i in indices]
+            images = read_video_frames(vid, indices)
             for i, (img_array, path) in enumerate(zip(images, frame_paths)):
                 if osp.exists(path):
                     try:
@@ -510,7 +483,7 @@ class CGBench_OpenEnded_Mini(VideoBaseDataset):
         self.use_frame_time = use_frame_time
         self.dataset_name = dataset
         lmu_root = LMUDataRoot()
-        self.clue_frame_root = osp.join(lmu_root, "clue_images", dataset)
+        self.clue_frame_root = osp.join(lmu_root, "clue_images", dataset + self.frame_root_suffix)
 
     @classmethod
     def supported_datasets(cls):
@@ -518,34 +491,12 @@ class CGBench_OpenEnded_Mini(VideoBaseDataset):
 
     def get_subtitles(self, subtitle_path, frame_indices=None, fps=None, sub_time=False):
 
-        subtitles = []
-
         srt_path = osp.join(self.data_root, subtitle_path)
         assert osp.exists(srt_path)
-        import pysubs2
-
-        subs = pysubs2.load(srt_path, encoding="utf-8")
-        if not frame_indices:
-            for sub in subs:
-                sub_text = sub.text.replace("\\N", " ")
-                if sub_time:
-                    start_time = milliseconds_to_seconds(sub.start)
-                    end_time = milliseconds_to_seconds(sub.end)
-                    sub_text = f"[{start_time}, {end_time}] {sub_text}"
-                if sub_text.strip() and sub_text not in subtitles:
-                    subtitles.append(sub_text)
-        else:
-            for selected_frame_id in frame_indices:
-                cur_time = pysubs2.make_time(fps=fps, frames=selected_frame_id)
-                for sub in subs:
-                    if sub.start < cur_time and sub.end > cur_time:
-                        sub_text = sub.text.replace("\\N", " ")
-                        if sub_time:
-                            start_time = milliseconds_to_seconds(sub.start)
-                            end_time = milliseconds_to_seconds(sub.end)
-                            sub_text = f"[{start_time}, {end_time}] {sub_text}"
-                            if sub_text.strip() and sub_text not in subtitles:
-                                subtitles.append(sub_text)
+
+        index = load_subtitle_index(srt_path)
+        timestamps = [frame_time(x, fps) for x in frame_indices] if frame_indices else None
+        subtitles = index.lookup(timestamps, sub_time=sub_time)
 
         if subtitles:
             subtitles_str = '\n'.join(subtitles)
@@ -564,15 +515,14 @@ class CGBench_OpenEnded_Mini(VideoBaseDataset):
             if md5(data_file) != self.MD5:
                 return False
             data = load(data_file)
-            for video_pth in data["video"]:
-                if not osp.exists(osp.join(pth, video_pth)):
-                    return False
+            if missing_files([osp.join(pth, x) for x in data["video"]]):
+                return False
 
             return True
 
         cache_path = get_cache_path(repo_id)
 
-        if cache_path is not None and check_integrity(cache_path):
+        if cache_path is not None and verify_once(cache_path, dataset_name, check_integrity, key=self.MD5):
             dataset_path = cache_path
         else:
 
@@ -679,9 +629,8 @@ class CGBench_OpenEnded_Mini(VideoBaseDataset):
             uid = str(uid)
 
         vid_path = osp.join(self.data_root, video)
-        vid = decord.VideoReader(vid_path)
+        vid = self.video_reader(vid_path)
         vid_fps = vid.get_avg_fps()
-        n_frames = len(vid)
 
         if clue_intervals is not None:
             merged_intervals = merge_intervals(clue_intervals)
@@ -709,21 +658,17 @@ class CGBench_OpenEnded_Mini(VideoBaseDataset):
 
         else:
             if num_frames > 0 and fps < 0:
-                step_size = len(vid) / (num_frames + 1)
-                indices = [int(i * step_size) for i in range(1, num_frames + 1)]
+                indices = self.frame_indices(vid, vid_path, nframe=num_frames, fps=-1)
                 frame_paths = self.frame_paths(uid)
             elif fps > 0:
-                total_duration = n_frames / vid_fps
-                required_frames = int(total_duration * fps)
-                step_size = vid_fps / fps
-                indices = [int(i * step_size) for i in range(required_frames)]
+                indices = self.frame_indices(vid, vid_path, fps=fps)
                 frame_paths = self.frame_paths_fps(uid, len(indices))
 
         valid_paths = []
         valid_indices = []
 
         if not np.all([osp.exists(p) for p in frame_paths]):
-            images = [vid[i].asnumpy() for i in indices]
+            images = read_video_frames(vid, indices)
             for i, (img_array, path) in enumerate(zip(images, frame_paths)):
                 if osp.exists(path):
                     try:
@@ -959,7 +904,7 @@ class CGBench_MCQ_Grounding(VideoBaseDataset):
         self.use_frame_time = use_frame_time
         self.dataset_name = dataset
         lmu_root = LMUDataRoot()
-        self.clue_frame_root = osp.join(lmu_root, "clue_images", dataset)
+        self.clue_frame_root = osp.join(lmu_root, "clue_images", dataset + self.frame_root_suffix)
 
     @classmethod
     def supported_datasets(cls):
@@ -977,34 +922,12 @@ class CGBench_MCQ_Grounding(VideoBaseDataset):
 
     def get_subtitles(self, subtitle_path, frame_indices=None, fps=None, sub_time=False):
 
-        subtitles = []
-
         srt_path = osp.join(self.data_root, subtitle_path)
         assert osp.exists(srt_path)
-        import pysubs2
-
-        subs = pysubs2.load(srt_path, encoding="utf-8")
-        if not frame_indices:
-            for sub in subs:
-                sub_text = sub.text.replace("\\N", " ")
-                if sub_time:
-                    start_time = milliseconds_to_seconds(sub.start)
-                    end_time = milliseconds_to_seconds(sub.end)
-                    sub_text = f"[{start_time}, {end_time}] {sub_text}"
-                if sub_text.strip() and sub_text not in subtitles:
-                    subtitles.append(sub_text)
-        else:
-            for selected_frame_id in frame_indices:
-                cur_time = pysubs2.make_time(fps=fps, frames=selected_frame_id)
-                for sub in subs:
-                    if sub.start < cur_time and sub.end > cur_time:
-                        sub_text = sub.text.replace("\\N", " ")
-                        if sub_time:
-                            start_time = milliseconds_to_seconds(sub.start)
-                            end_time = milliseconds_to_seconds(sub.end)
-                            sub_text = f"[{start_time}, {end_time}] {sub_text}"
-                        if sub_text.strip() and sub_text not in subtitles:
-                            subtitles.append(sub_text)
+
+        index = load_subtitle_index(srt_path)
+        timestamps = [frame_time(x, fps) for x in frame_indices] if frame_indices else None
+        subtitles = index.lookup(timestamps, sub_time=sub_time)
 
         if subtitles:
             subtitles_str = '\n'.join(subtitles)
@@ -1023,20 +946,20 @@ class CGBench_MCQ_Grounding(VideoBaseDataset):
             if md5(data_file) != self.MD5:
                 return False
             data = load(data_file)
-            for video_pth in data["video"]:
-                if not osp.exists(osp.join(pth, video_pth)):
-                    return False
+            if missing_files([osp.join(pth, x) for x in data["video"]]):
+                return False
 
-            for clue_video_pth in data["clue_video_path"]:
-                if clue_video_pth and not (isinstance(clue_video_pth, float) and np.isnan(clue_video_pth)):
-                    if not osp.exists(osp.join(pth, clue_video_pth)):
-                        return False
+            clue_videos = [
+                x for x in data["clue_video_path"] if x and not (isinstance(x, float) and np.isnan(x))
+            ]
+            if missing_files([osp.join(pth, x) for x in clue_videos]):
+                return False
 
             return True
 
         cache_path = get_cache_path(repo_id)
 
-        if cache_path is not None and check_integrity(cache_path):
+        if cache_path is not None and verify_once(cache_path, dataset_name, check_integrity, key=self.MD5):
             dataset_path = cache_path
         else:
 
@@ -1232,9 +1155,8 @@ class CGBench_MCQ_Grounding(VideoBaseDataset):
             uid = str(uid)
 
         vid_path = osp.join(self.data_root, video)
-        vid = decord.VideoReader(vid_path)
+        vid = self.video_reader(vid_path)
         vid_fps = vid.get_avg_fps()
-        n_frames = len(vid)
 
         if clue_intervals is not None:
             merged_intervals = merge_intervals(clue_intervals)
@@ -1262,15 +1184,11 @@ class CGBench_MCQ_Grounding(VideoBaseDataset):
 
         else:
             if num_frames > 0 and fps < 0:
-                step_size = len(vid) / (num_frames + 1)
-                indices = [int(i * step_size) for i in range(1, num_frames + 1)]
+                indices = self.frame_indices(vid, vid_path, nframe=num_frames, fps=-1)
 
                 frame_paths = self.frame_paths(uid)
             elif fps > 0:
-                total_duration = n_frames / vid_fps
-                required_frames = int(total_duration * fps)
-                step_size = vid_fps / fps
-                indices = [int(i * step_size) for i in range(required_frames)]
+                indices = self.frame_indices(vid, vid_path, fps=fps)
                 frame_paths = self.frame_paths_fps(uid, len(indices))
 
         # Save and validate frames
@@ -1278,7 +1196,7 @@ class CGBench_MCQ_Grounding(VideoBaseDataset):
         valid_indices = []
 
         if not np.all([osp.exists(p) for p in frame_paths]):
-            images = [vid[i].asnumpy() for i in indices]
+            images = read_video_frames(vid, indices)
             for i, (img_array, path) in enumerate(zip(images, frame_paths)):
                 if osp.exists(path):
                     try:
@@ -1390,7 +1308,7 @@ class CGBench_OpenEnded(VideoBaseDataset):
         self.use_frame_time = use_frame_time
         self.dataset_name = dataset
         lmu_root = LMUDataRoot()
-        self.clue_frame_root = osp.join(lmu_root, "clue_images", dataset)
+        self.clue_frame_root = osp.join(lmu_root, "clue_images", dataset + self.frame_root_suffix)
 
     @classmethod
     def supported_datasets(cls):
@@ -1398,34 +1316,12 @@ class CGBench_OpenEnded(VideoBaseDataset):
 
     def get_subtitles(self, subtitle_path, frame_indices=None, fps=None, sub_time=False):
 
-        subtitles = []
-
         srt_path = osp.join(self.data_root, subtitle_path)
         assert osp.exists(srt_path)
-        import pysubs2
-
-        subs = pysubs2.load(srt_path, encoding="utf-8")
-        if not frame_indices:
-            for sub in subs:
-                sub_text = sub.text.replace("\\N", " ")
-                if sub_time:
-                    start_time = milliseconds_to_seconds(sub.start)
-                    end_time = milliseconds_to_seconds(sub.end)
-                    sub_text = f"[{start_time}, {end_time}] {sub_text}"
-                if sub_text.strip() and sub_text not in subtitles:
-                    subtitles.append(sub_text)
-        else:
-            for selected_frame_id in frame_indices:
-                cur_time = pysubs2.make_time(fps=fps, frames=selected_frame_id)
-                for sub in subs:
-                    if sub.start < cur_time and sub.end > cur_time:
-                        sub_text = sub.text.replace("\\N", " ")
-                        if sub_time:
-                            start_time = milliseconds_to_seconds(sub.start)
-                            end_time = milliseconds_to_seconds(sub.end)
-                            sub_text = f"[{start_time}, {end_time}] {sub_text}"
-                            if sub_text.strip() and sub_text not in subtitles:
-                                subtitles.append(sub_text)
+
+        index = load_subtitle_index(srt_path)
+        timestamps = [frame_time(x, fps) for x in frame_indices] if frame_indices else None
+        subtitles = index.lookup(timestamps, sub_time=sub_time)
 
         if subtitles:
             subtitles_str = '\n'.join(subtitles)
@@ -1444,15 +1340,14 @@ class CGBench_OpenEnded(VideoBaseDataset):
             if md5(data_file) != self.MD5:
                 return False
             data = load(data_file)
-            for video_pth in data["video"]:
-                if not osp.exists(osp.join(pth, video_pth)):
-                    return False
+            if missing_files([osp.join(pth, x) for x in data["video"]]):
+                return False
 
             return True
 
         cache_path = get_cache_path(repo_id)
 
-        if cache_path is not None and check_integrity(cache_path):
+        if cache_path is not None and verify_once(cache_path, dataset_name, check_integrity, key=self.MD5):
             dataset_path = cache_path
         else:
 
@@ -1558,9 +1453,8 @@ class CGBench_OpenEnded(VideoBaseDataset):
             uid = str(uid)
 
         vid_path = osp.join(self.data_root, video)
-        vid = decord.VideoReader(vid_path)
+        vid = self.video_reader(vid_path)
         vid_fps = vid.get_avg_fps()
-        n_frames = len(vid)
 
         if clue_intervals is not None:
             merged_intervals = merge_intervals(clue_intervals)
@@ -1588,21 +1482,17 @@ class CGBench_OpenEnded(VideoBaseDataset):
 
         else:
             if num_frames > 0 and fps < 0:
-                step_size = len(vid) / (num_frames + 1)
-                indices = [int(i * step_size) for i in range(1, num_frames + 1)]
+                indices = self.frame_indices(vid, vid_path, nframe=num_frames, fps=-1)
                 frame_paths = self.frame_paths(uid)
             elif fps > 0:
-                total_duration = n_frames / vid_fps
-                required_frames = int(total_duration * fps)
-                step_size = vid_fps / fps
-                indices = [int(i * step_size) for i in range(required_frames)]
+                indices = self.frame_indices(vid, vid_path, fps=fps)
                 frame_paths = self.frame_paths_fps(uid, len(indices))
 
         valid_paths = []
         valid_indices = []
 
         if not np.all([osp.exists(p) for p in frame_paths]):
-            images = [vid[i].asnumpy() for i in indices]
+            images = read_video_frames(vid, indices)
             for i, (img_array, path) in enumerate(zip(images, frame_paths)):
                 if osp.exists(path):
                     try:
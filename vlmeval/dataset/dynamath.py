@@ -10,6 +10,7 @@ import argparse
 
 from .image_base import ImageBaseDataset
 from .utils import build_judge
+from .utils.verdict_store import prefill_verdicts, store_verdicts
 from ..utils import track_progress_rich
 from ..smp import load, dump, d2df, toliststr
 
@@ -187,11 +188,14 @@ You are a helpful assistant that helps me to format free-form answers into a sho
             lt = len(data)
             payloads = [dict(model=model, line=data.iloc[i]) for i in range(lt) if data.iloc[i]['index'] not in res]
             keys = [idx for idx in data['index'] if idx not in res]
+            payloads, keys, vkeys = prefill_verdicts(
+                model, 'DynaMath-v1', ['prediction', 'answer_type', 'answer'], payloads, keys, res, save=tmp_file)
 
             if len(keys):
                 results = track_progress_rich(DynaMath_auxeval, payloads, nproc=nproc, save=tmp_file, keys=keys)
                 for k, r in zip(keys, results):
                     res[k] = r
+                store_verdicts(model, vkeys, results, lambda r: r is not None and r['parse'])
 
             data['parse'] = [res[idx]['parse'] for idx in data['index']]
             data['extracted'] = [res[idx]['extracted'] for idx in data['index']]
@@ -41,15 +41,19 @@ class ImageBaseDataset:
         # You can override this variable to save image files to a different directory
         self.dataset_name = dataset
         self.img_root = osp.join(ROOT, 'images', img_root_map(dataset))
+        # Set by `prepare_tsv` if the images are read from the memory-mapped Arrow file
+        self.image_store = None
 
         data = self.load_data(dataset)
         self.skip_noimg = skip_noimg
         if skip_noimg and 'image' in data:
             data = data[~pd.isna(data['image'])]
+        if skip_noimg and self.image_store is not None:
+            data = data[self.image_store.has_image()]
 
         data['index'] = [str(x) for x in data['index']]
 
-        self.meta_only = True
+        self.meta_only = self.image_store is None
 
         # The image field can store the base64 encoded image or another question index (for saving space)
         if 'image' in data:
@@ -94,6 +98,13 @@ class ImageBaseDataset:
             download_file(url, data_path)
             update_flag = True
 
+        if self.use_arrow_store():
+            arrow_path = data_path.replace('.tsv', '.arrow')
+            if not osp.exists(arrow_path) or update_flag or osp.getmtime(arrow_path) < osp.getmtime(data_path):
+                tsv_to_arrow(data_path, arrow_path)
+            self.image_store = ArrowImageStore(arrow_path)
+            return self.image_store.meta()
+
         if file_size(data_path, 'GB') > 1:
             local_path = data_path.replace('.tsv', '_local.tsv')
             if not osp.exists(local_path) or os.environ.get('FORCE_LOCAL', None) or update_flag:
@@ -102,8 +113,25 @@ class ImageBaseDataset:
             data_path = local_path
         return load(data_path)
 
+    def use_arrow_store(self):
+        # The Arrow store is enabled by the environment variable `ARROW_DATASET`, for datasets that load the TSV and
+        # dump the images in the default way
+        if os.environ.get('ARROW_DATASET', '0') in ['0', '', 'False']:
+            return False
+        cls = type(self)
+        return cls.load_data is ImageBaseDataset.load_data and cls.dump_image is ImageBaseDataset.dump_image
+
+    @property
+    def image_manifest(self):
+        # Subclasses may change `img_root` after `__init__`, the manifest follows it
+        manifest = getattr(self, '_image_manifest', None)
+        if manifest is None or manifest.root != self.img_root:
+            os.makedirs(self.img_root, exist_ok=True)
+            manifest = self._image_manifest = ImageManifest(self.img_root)
+        return manifest
+
     def dump_image(self, line):
-        os.makedirs(self.img_root, exist_ok=True)
+        manifest = self.image_manifest
 
         if 'image' in line:
             if isinstance(line['image'], list):
@@ -111,14 +139,30 @@ class ImageBaseDataset:
                 assert 'image_path' in line
                 for img, im_name in zip(line['image'], line['image_path']):
                     path = osp.join(self.img_root, im_name)
-                    if not read_ok(path):
-                        decode_base64_to_image_file(img, path)
+                    if not manifest.check(path):
+                        save_image_bytes(base64.b64decode(img), path)
+                        manifest.add(path)
                     tgt_path.append(path)
             else:
                 tgt_path = osp.join(self.img_root, f"{line['index']}.jpg")
-                if not read_ok(tgt_path):
-                    decode_base64_to_image_file(line['image'], tgt_path)
+                if not manifest.check(tgt_path):
+                    save_image_bytes(base64.b64decode(line['image']), tgt_path)
+                    manifest.add(tgt_path)
                 tgt_path = [tgt_path]
+        elif self.image_store is not None:
+            images = self.image_store.get(line['index'])
+            if len(images) > 1:
+                assert 'image_path' in line
+                names = toliststr(line['image_path'])
+            else:
+                names = [f"{line['index']}.jpg"]
+            tgt_path = []
+            for img, im_name in zip(images, names):
+                path = osp.join(self.img_root, im_name)
+                if not manifest.check(path):
+                    save_image_bytes(img, path)
+                    manifest.add(path)
+                tgt_path.append(path)
         else:
             assert 'image_path' in line
             tgt_path = toliststr(line['image_path'])
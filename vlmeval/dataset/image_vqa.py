@@ -7,6 +7,7 @@ import pandas as pd
 
 from .image_base import ImageBaseDataset
 from .utils import build_judge, DEBUG_MESSAGE
+from .utils.verdict_store import prefill_verdicts, store_verdicts
 from ..smp import *
 from ..utils import track_progress_rich
 
@@ -236,6 +237,9 @@ class MathVista(ImageBaseDataset):
             tups = [x for x, i in zip(tups, indices) if i not in ans]
             indices = [i for i in indices if i not in ans]
 
+            tups, indices, vkeys = prefill_verdicts(
+                model, 'MathVista-v1', ['question', 'prediction'], tups, indices, ans, save=tmp_file)
+
             if len(indices):
                 new_results = track_progress_rich(
                     MathVista_auxeval,
@@ -249,6 +253,7 @@ class MathVista(ImageBaseDataset):
                 for k, v in zip(indices, new_results):
                     assert k in ans
                     assert ans[k]['log'] == v['log'] and ans[k]['res'] == v['res']
+                store_verdicts(model, vkeys, new_results, lambda v: v['log'].endswith('Succeed'))
 
             data['res'] = [ans[idx]['res'] for idx in data['index']]
             data['log'] = [ans[idx]['log'] for idx in data['index']]
@@ -331,6 +336,9 @@ class MathVerse(ImageBaseDataset):
             tups = [x for x, i in zip(tups, indices) if i not in ans]
             indices = [i for i in indices if i not in ans]
 
+            tups, indices, vkeys = prefill_verdicts(
+                model, 'MathVerse-extract-v1', ['prediction'], tups, indices, ans, save=tmp_file_extract)
+
             if len(indices):
                 new_results = track_progress_rich(
                     MathVerse_auxeval_extract,
@@ -344,6 +352,7 @@ class MathVerse(ImageBaseDataset):
                 for k, v in zip(indices, new_results):
                     assert k in ans
                     assert ans[k]['log_extract'] == v['log_extract'] and ans[k]['extract'] == v['extract']
+                store_verdicts(model, vkeys, new_results, lambda v: v['log_extract'].endswith('Succeed'))
 
             data['extract'] = [ans[idx]['extract'] for idx in data['index']]
             data['log_extract'] = [ans[idx]['log_extract'] for idx in data['index']]
@@ -365,6 +374,10 @@ class MathVerse(ImageBaseDataset):
             tups = [x for x, i in zip(tups, indices) if i not in ans]
             indices = [i for i in indices if i not in ans]
 
+            fields = ['question_for_eval', 'answer', 'extract']
+            tups, indices, vkeys = prefill_verdicts(
+                model, 'MathVerse-score-v1', fields, tups, indices, ans, save=tmp_file_score)
+
             if len(indices):
                 new_results = track_progress_rich(
                     MathVerse_auxeval_score,
@@ -378,6 +391,7 @@ class MathVerse(ImageBaseDataset):
                 for k, v in zip(indices, new_results):
                     assert k in ans
                     assert ans[k]['log_score'] == v['log_score'] and ans[k]['score'] == v['score']
+                store_verdicts(model, vkeys, new_results, lambda v: v['log_score'].endswith('Succeed'))
 
             data['score'] = [ans[idx]['score'] for idx in data['index']]
             data['log_score'] = [ans[idx]['log_score'] for idx in data['index']]
@@ -715,6 +729,9 @@ class LogicVista(ImageBaseDataset):
             tups = [x for x, i in zip(tups, indices) if i not in ans]
             indices = [i for i in indices if i not in ans]
 
+            tups, indices, vkeys = prefill_verdicts(
+                model, 'LogicVista-v1', ['question', 'answer', 'prediction'], tups, indices, ans, save=tmp_file)
+
             if len(indices):
                 new_results = track_progress_rich(
                     LogicVista_auxeval,
@@ -728,6 +745,7 @@ class LogicVista(ImageBaseDataset):
                 for k, v in zip(indices, new_results):
                     assert k in ans
                     assert ans[k]['log'] == v['log'] and ans[k]['res'] == v['res'] and ans[k]['hit'] == v['hit']
+                store_verdicts(model, vkeys, new_results, lambda v: v['log'].endswith('Succeed'))
 
             data['res'] = [ans[idx]['res'] for idx in data['index']]
             data['log'] = [ans[idx]['log'] for idx in data['index']]
@@ -812,6 +830,9 @@ class MMVet(ImageBaseDataset):
             tups = [x for x, i in zip(tups, indices) if i not in ans]
             indices = [i for i in indices if i not in ans]
 
+            tups, indices, vkeys = prefill_verdicts(
+                model, 'MMVet-v1', ['question', 'answer', 'prediction'], tups, indices, ans, save=tmp_file)
+
             if len(indices):
                 new_results = track_progress_rich(
                     MMVet_auxeval,
@@ -825,6 +846,7 @@ class MMVet(ImageBaseDataset):
                 for k, v in zip(indices, new_results):
                     assert k in ans
                     assert ans[k]['log'] == v['log'] and ans[k]['score'] == v['score']
+                store_verdicts(model, vkeys, new_results, lambda v: v['log'].endswith('Succeed'))
             data['score'] = [ans[idx]['score'] for idx in data['index']]
             data['log'] = [ans[idx]['log'] for idx in data['index']]
             dump(data, storage)
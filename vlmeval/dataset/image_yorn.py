@@ -2,6 +2,7 @@ from ..smp import *
 from ..utils import *
 from .image_base import ImageBaseDataset
 from .utils import build_judge, DEBUG_MESSAGE
+from .utils.verdict_store import prefill_verdicts, store_verdicts
 
 
 class ImageYORNDataset(ImageBaseDataset):
@@ -63,11 +64,14 @@ class ImageYORNDataset(ImageBaseDataset):
                 lines = [unknown.iloc[i] for i in range(lt)]
                 tups = [(model, line) for line in lines]
                 indices = list(unknown['index'])
+                tups, indices, vkeys = prefill_verdicts(
+                    model, 'YOrN-v1', ['question', 'prediction'], tups, indices, ans_map)
                 if len(tups):
                     res = track_progress_rich(
                         YOrN_auxeval, tups, nproc=nproc, chunksize=nproc, keys=indices, save=tmp_file)
                     for k, v in zip(indices, res):
                         ans_map[k] = v
+                    store_verdicts(model, vkeys, res, lambda v: v != 'Unknown')
 
             data['extracted'] = [ans_map[x] for x in data['index']]
             dump(data, storage)
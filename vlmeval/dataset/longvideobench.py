@@ -2,19 +2,13 @@ from huggingface_hub import snapshot_download
 from ..smp import *
 from .video_base import VideoBaseDataset
 from .utils import build_judge, DEBUG_MESSAGE
+from .utils.subtitle import load_subtitle_index
 from glob import glob
+import bisect
 
 FAIL_MSG = 'Failed to obtain answer via API.'
 
 
-def timestamp_to_seconds(timestamp):
-    # Split the timestamp into hours, minutes, and seconds
-    h, m, s = timestamp.split(":")
-    # Convert hours, minutes, and total seconds (including fractions) to float and compute total seconds
-    total_seconds = int(h) * 3600 + int(m) * 60 + float(s)
-    return total_seconds
-
-
 def uniformly_subsample(lst, K):
     n = len(lst)
     if K >= n:
@@ -23,67 +17,30 @@ def uniformly_subsample(lst, K):
     return [lst[int(i * step)] for i in range(K)]
 
 
-def insert_subtitles_into_frames(
-    frames,
-    frame_timestamps,
-    subtitles,
-    starting_timestamp_for_subtitles,
-    duration,
-):
+def insert_subtitles_into_frames(frames, frame_timestamps, subtitles):
+    # `subtitles` is the `SubtitleIndex` of the video, `frame_timestamps` are in ascending order
     interleaved_list = []
     cur_i = 0
+    n = min(len(frames), len(frame_timestamps))
 
-    for subtitle in subtitles:
-        if "timestamp" in subtitle:
-            start, end = subtitle["timestamp"]
-
-            if not isinstance(end, float):
-                end = duration
+    for start, end, subtitle_text in subtitles.cues:
+        subtitle_timestamp = (start + end) / 2
 
-            start -= starting_timestamp_for_subtitles
-            end -= starting_timestamp_for_subtitles
-
-            subtitle_timestamp = (start + end) / 2
-            subtitle_text = subtitle["text"]
-        else:
-            start, end = subtitle["start"], subtitle["end"]
-            start = timestamp_to_seconds(start)
-            end = timestamp_to_seconds(end)
-            start -= starting_timestamp_for_subtitles
-            end -= starting_timestamp_for_subtitles
-
-            subtitle_timestamp = (start + end) / 2
-            subtitle_text = subtitle["line"]
-
-        for i, (frame, frame_timestamp) in enumerate(
-            zip(frames[cur_i:], frame_timestamps[cur_i:])
-        ):
-            if frame_timestamp <= subtitle_timestamp:
-                # print("frame:", frame_timestamp)
-                interleaved_list.append({"type": "image", "value": frame})
-                cur_i += 1
-            else:
-                break
+        while cur_i < n and frame_timestamps[cur_i] <= subtitle_timestamp:
+            interleaved_list.append(VideoBaseDataset.frame_message(frames[cur_i]))
+            cur_i += 1
 
         if end - start < 1:
             end = subtitle_timestamp + 0.5
             start = subtitle_timestamp - 0.5
 
-        covering_frames = False
-        for frame, frame_timestamp in zip(frames, frame_timestamps):
-            if frame_timestamp < end and frame_timestamp > start:
-                covering_frames = True
-                break
-
-        if covering_frames:
+        # The subtitle is kept if any frame falls in (start, end), i.e., the first frame after `start`
+        i = bisect.bisect_right(frame_timestamps, start, 0, n)
+        if i < n and frame_timestamps[i] < end:
             interleaved_list.append({"type": "text", "value": subtitle_text + "\n"})
-        else:
-            pass
 
-    for i, (frame, frame_timestamp) in enumerate(
-        zip(frames[cur_i:], frame_timestamps[cur_i:])
-    ):
-        interleaved_list.append({"type": "image", "value": frame})
+    for frame in frames[cur_i:n]:
+        interleaved_list.append(VideoBaseDataset.frame_message(frame))
     return interleaved_list
 
 
@@ -115,17 +72,17 @@ class LongVideoBench(VideoBaseDataset):
                 print("md5 mismatch", md5(data_file), self.MD5)
                 return False
             data = load(data_file)
-            for video_pth in data['video_path']:
-                if not osp.exists(osp.join(pth, video_pth)):
-                    print(video_pth, "is not found")
-                    return False
+            missing = missing_files([osp.join(pth, x) for x in data['video_path']])
+            if missing:
+                print(missing[0], "is not found")
+                return False
             return True
 
         if modelscope_flag_set():
             repo_id = "AI-ModelScope/LongVideoBench"
 
         cache_path = get_cache_path(repo_id)
-        if cache_path is not None and check_integrity(cache_path):
+        if cache_path is not None and verify_once(cache_path, dataset_name, check_integrity, key=self.MD5):
             dataset_path = cache_path
         else:
             def generate_tsv(pth):
@@ -157,11 +114,7 @@ class LongVideoBench(VideoBaseDataset):
                         print(f"Extracted all files from {tar_file} to {cache_dir}")
 
                 def concat_tar_parts(tar_parts, output_tar):
-                    with open(output_tar, "wb") as out_tar:
-                        from tqdm import tqdm
-                        for part in tqdm(sorted(tar_parts)):
-                            with open(part, "rb") as part_file:
-                                out_tar.write(part_file.read())
+                    concat_files(sorted(tar_parts), output_tar)
                     print(f"Concatenated parts {tar_parts} into {output_tar}")
 
                 tar_parts_dict = {}
@@ -198,31 +151,20 @@ class LongVideoBench(VideoBaseDataset):
     def save_video_frames(self, video_path, video_llm=False):
 
         vid_path = osp.join(self.data_root, video_path)
-        vid = decord.VideoReader(vid_path)
+        vid = self.video_reader(vid_path)
         video_info = {
             'fps': vid.get_avg_fps(),
             'n_frames': len(vid),
         }
         if self.nframe > 0 and self.fps < 0:
-            step_size = len(vid) / (self.nframe + 1)
-            indices = [int(i * step_size) for i in range(1, self.nframe + 1)]
+            indices = self.frame_indices(vid, vid_path)
             frame_paths = self.frame_paths(video_path[:-4])
         elif self.fps > 0:
             # not constrained by num_frames, get frames by fps
-            total_duration = video_info['n_frames'] / video_info['fps']
-            required_frames = int(total_duration * self.fps)
-            step_size = video_info['fps'] / self.fps
-            indices = [int(i * step_size) for i in range(required_frames)]
+            indices = self.frame_indices(vid, vid_path)
             frame_paths = self.frame_paths_fps(video_path[:-4], len(indices))
 
-        flag = np.all([osp.exists(p) for p in frame_paths])
-
-        if not flag:
-            images = [vid[i].asnumpy() for i in indices]
-            images = [Image.fromarray(arr) for arr in images]
-            for im, pth in zip(images, frame_paths):
-                if not osp.exists(pth) and not video_llm:
-                    im.save(pth)
+        frame_paths = self.save_frames(vid, vid_path, indices, frame_paths, save=not video_llm)
 
         return frame_paths, indices, video_info
 
@@ -243,21 +185,18 @@ class LongVideoBench(VideoBaseDataset):
             message.append(dict(type='video', value=osp.join(self.data_root, line['video_path'])))
         else:
             if not self.use_subtitle:
-                with open(osp.join(self.data_root, "subtitles", line["subtitle_path"])) as f:
-                    subtitles = json.load(f)
-
-                frame_message = insert_subtitles_into_frames(
-                    frames,
-                    [ind_ / fps for ind_ in indices],
-                    subtitles,
-                    line["starting_timestamp_for_subtitles"],
-                    line["duration"]
+                subtitles = load_subtitle_index(
+                    osp.join(self.data_root, "subtitles", line["subtitle_path"]),
+                    offset=line["starting_timestamp_for_subtitles"],
+                    duration=line["duration"]
                 )
 
+                frame_message = insert_subtitles_into_frames(frames, [ind_ / fps for ind_ in indices], subtitles)
+
                 message += frame_message
             else:
                 for im in frames:
-                    message.append(dict(type='image', value=im))
+                    message.append(self.frame_message(im))
 
         line['question'] += '\n' + '\n'.join(
             ["{}. {}".format(chr(ord("A") + i), cand) for i, cand in enumerate(eval(line['candidates']))]
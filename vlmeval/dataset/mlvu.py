@@ -90,16 +90,15 @@ class MLVU_MCQ(VideoBaseDataset):
                 return False
 
             data = load(data_file)
-            for idx, item in data.iterrows():
-                if not osp.exists(osp.join(pth, item['prefix'], item['video'])):
-                    return False
+            if missing_files([osp.join(pth, p, v) for p, v in zip(data['prefix'], data['video'])]):
+                return False
             return True
 
         if modelscope_flag_set():
             repo_id = "AI-ModelScope/MLVU"
 
         cache_path = get_cache_path(repo_id)
-        if cache_path is not None and check_integrity(cache_path):
+        if cache_path is not None and verify_once(cache_path, dataset_name, check_integrity, key=self.MD5):
             dataset_path = cache_path
         else:
             def generate_tsv(pth):
@@ -156,31 +155,16 @@ class MLVU_MCQ(VideoBaseDataset):
         suffix = line['video'].split('.')[-1]
         video = line['video'].replace(f'.{suffix}','')
         vid_path = osp.join(self.data_root, line['prefix'], line['video'])
-        vid = decord.VideoReader(vid_path)
-        video_info = {
-            'fps': vid.get_avg_fps(),
-            'n_frames': len(vid),
-        }
+        vid = self.video_reader(vid_path)
         if self.nframe > 0 and self.fps < 0:
-            step_size = len(vid) / (self.nframe + 1)
-            indices = [int(i * step_size) for i in range(1, self.nframe + 1)]
+            indices = self.frame_indices(vid, vid_path)
             frame_paths = self.frame_paths(video)
         elif self.fps > 0:
             # not constrained by num_frames, get frames by fps
-            total_duration = video_info['n_frames'] / video_info['fps']
-            required_frames = int(total_duration * self.fps)
-            step_size = video_info['fps'] / self.fps
-            indices = [int(i * step_size) for i in range(required_frames)]
+            indices = self.frame_indices(vid, vid_path)
             frame_paths = self.frame_paths_fps(video, len(indices))
 
-        flag = np.all([osp.exists(p) for p in frame_paths])
-
-        if not flag:
-            images = [vid[i].asnumpy() for i in indices]
-            images = [Image.fromarray(arr) for arr in images]
-            for im, pth in zip(images, frame_paths):
-                if not osp.exists(pth):
-                    im.save(pth)
+        frame_paths = self.save_frames(vid, vid_path, indices, frame_paths)
 
         return frame_paths
 
@@ -202,7 +186,7 @@ class MLVU_MCQ(VideoBaseDataset):
         else:
             img_frame_paths = self.save_video_into_images(line)
             for im in img_frame_paths:
-                message.append(dict(type='image', value=im))
+                message.append(self.frame_message(im))
         message.append(dict(type='text', value='\nOnly give the best option.'))
         return message
 
@@ -301,16 +285,15 @@ class MLVU_OpenEnded(VideoBaseDataset):
                 return False
 
             data = load(data_file)
-            for idx, item in data.iterrows():
-                if not osp.exists(osp.join(pth, item['prefix'], item['video'])):
-                    return False
+            if missing_files([osp.join(pth, p, v) for p, v in zip(data['prefix'], data['video'])]):
+                return False
             return True
 
         if modelscope_flag_set():
             repo_id = "AI-ModelScope/MLVU"
 
         cache_path = get_cache_path(repo_id)
-        if cache_path is not None and check_integrity(cache_path):
+        if cache_path is not None and verify_once(cache_path, dataset_name, check_integrity, key=self.MD5):
             dataset_path = cache_path
         else:
             def generate_tsv(pth):
@@ -359,31 +342,16 @@ class MLVU_OpenEnded(VideoBaseDataset):
         suffix = line['video'].split('.')[-1]
         video = line['video'].replace(f'.{suffix}','')
         vid_path = osp.join(self.data_root, line['prefix'], line['video'])
-        vid = decord.VideoReader(vid_path)
-        video_info = {
-            'fps': vid.get_avg_fps(),
-            'n_frames': len(vid),
-        }
+        vid = self.video_reader(vid_path)
         if self.nframe > 0 and self.fps < 0:
-            step_size = len(vid) / (self.nframe + 1)
-            indices = [int(i * step_size) for i in range(1, self.nframe + 1)]
+            indices = self.frame_indices(vid, vid_path)
             frame_paths = self.frame_paths(video)
         elif self.fps > 0:
             # not constrained by num_frames, get frames by fps
-            total_duration = video_info['n_frames'] / video_info['fps']
-            required_frames = int(total_duration * self.fps)
-            step_size = video_info['fps'] / self.fps
-            indices = [int(i * step_size) for i in range(required_frames)]
+            indices = self.frame_indices(vid, vid_path)
             frame_paths = self.frame_paths_fps(video, len(indices))
 
-        flag = np.all([osp.exists(p) for p in frame_paths])
-
-        if not flag:
-            images = [vid[i].asnumpy() for i in indices]
-            images = [Image.fromarray(arr) for arr in images]
-            for im, pth in zip(images, frame_paths):
-                if not osp.exists(pth):
-                    im.save(pth)
+        frame_paths = self.save_frames(vid, vid_path, indices, frame_paths)
 
         return frame_paths
 
@@ -405,7 +373,7 @@ class MLVU_OpenEnded(VideoBaseDataset):
         else:
             img_frame_paths = self.save_video_into_images(line)
             for im in img_frame_paths:
-                message.append(dict(type='image', value=im))
+                message.append(self.frame_message(im))
         return message
 
     @classmethod
@@ -3,30 +3,40 @@ from ..smp import *
 from .video_base import VideoBaseDataset
 from .utils import build_judge, DEBUG_MESSAGE
 from ..utils import track_progress_rich
+from functools import partial
 
 
 FAIL_MSG = 'Failed to obtain answer via API.'
 
 
-def unwrap_hf_pkl(pth, suffix='.mp4'):
+def _unwrap_pkl(pickle_file, target_dir, suffix='.mp4'):
+    # A pickle can only be loaded as a whole, so one worker holds one pickle of videos in memory at a time
+    with open(pickle_file, 'rb') as file:
+        video_data = pickle.load(file)
+    # For each video file in the pickle file, write its contents to a new mp4 file
+    for video_name, video_content in video_data.items():
+        output_path = os.path.join(target_dir, f'{video_name}{suffix}')
+        if os.path.exists(output_path) and os.path.getsize(output_path) == len(video_content):
+            continue
+        tmp_path = f'{output_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as output_file:
+            output_file.write(video_content)
+        os.replace(tmp_path, output_path)
+    return len(video_data)
+
+
+def unwrap_hf_pkl(pth, suffix='.mp4', nproc=4):
     base_dir = os.path.join(pth, 'video_pkl/')
     target_dir = os.path.join(pth, 'video/')
     pickle_files = [os.path.join(base_dir, file) for file in os.listdir(base_dir)]
     pickle_files.sort()
 
-    if not os.path.exists(target_dir):
-        os.makedirs(target_dir, exist_ok=True)
-        for pickle_file in pickle_files:
-            with open(pickle_file, 'rb') as file:
-                video_data = pickle.load(file)
-            # For each video file in the pickle file, write its contents to a new mp4 file
-            for video_name, video_content in video_data.items():
-                output_path = os.path.join(target_dir, f'{video_name}{suffix}')
-                with open(output_path, 'wb') as output_file:
-                    output_file.write(video_content)
-        print('The video file has been restored and stored from the pickle file.')
-    else:
-        print('The video file already exists.')
+    # Videos already restored (e.g., by an interrupted run) are skipped, pickles are restored in parallel
+    os.makedirs(target_dir, exist_ok=True)
+    func = partial(_unwrap_pkl, target_dir=target_dir, suffix=suffix)
+    with mp.Pool(max(min(nproc, len(pickle_files)), 1)) as pool:
+        pool.map(func, pickle_files, chunksize=1)
+    print('The video file has been restored and stored from the pickle file.')
 
 
 class MMBenchVideo(VideoBaseDataset):
@@ -72,13 +82,12 @@ Please directly reply with your response to the only question.
             if md5(data_file) != self.MD5:
                 return False
             data = load(data_file)
-            for video_pth in data['video_path']:
-                if not osp.exists(osp.join(pth, video_pth)):
-                    return False
+            if missing_files([osp.join(pth, x) for x in data['video_path']]):
+                return False
             return True
 
         cache_path = get_cache_path(repo_id)
-        if cache_path is not None and check_integrity(cache_path):
+        if cache_path is not None and verify_once(cache_path, dataset_name, check_integrity, key=self.MD5):
             dataset_path = cache_path
         else:
             if modelscope_flag_set():
@@ -106,7 +115,7 @@ Please directly reply with your response to the only question.
         sys_prompt = self.SYS + self.FRAMES_TMPL_PACK.format(len(frames))
         message = [dict(type='text', value=sys_prompt)]
         for im in frames:
-            message.append(dict(type='image', value=im))
+            message.append(self.frame_message(im))
         nq = len(sub)
         prompt = 'Questions: \n{}\nAnswers: \n'
         qs = {int(sub.iloc[i]['index']): sub.iloc[i]['question'] for i in range(nq)}
@@ -129,7 +138,7 @@ Please directly reply with your response to the only question.
             sys_prompt = self.FRAMES_TMPL_NOPACK.format(len(frames))
             message = [dict(type='text', value=sys_prompt)]
             for im in frames:
-                message.append(dict(type='image', value=im))
+                message.append(self.frame_message(im))
             prompt = 'Question: {}\nAnswer: '.format(line['question'])
             message.append(dict(type='text', value=prompt))
         return message
@@ -10,7 +10,6 @@ from torchvision.transforms.functional import InterpolationMode
 from decord import VideoReader, cpu
 import imageio
 import cv2
-import zipfile
 import os
 import glob
 from .utils.mvbench import *
@@ -88,28 +87,22 @@ Based on your observations, select the best option that accurately addresses the
                 return False
 
             data = load(data_file)
-            for idx, item in data.iterrows():
-                if not osp.exists(osp.join(pth, item['prefix'], item['video'])):
-                    return False
+            if missing_files([osp.join(pth, p, v) for p, v in zip(data['prefix'], data['video'])]):
+                return False
             return True
 
         if modelscope_flag_set():
             repo_id = 'modelscope/MVBench'
 
         cache_path = get_cache_path(repo_id, branch='main')
-        if cache_path is not None and check_integrity(cache_path):
+        if cache_path is not None and verify_once(cache_path, dataset_name, check_integrity, key=self.MD5):
             dataset_path = cache_path
         else:
             def unzip_hf_zip(pth):
                 pth = os.path.join(pth, 'video/')
-                for filename in os.listdir(pth):
-                    if filename.endswith('.zip'):
-                        # 构建完整的文件路径
-                        zip_path = os.path.join(pth, filename)
-
-                        # 解压 ZIP 文件
-                        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                            zip_ref.extractall(pth)
+                zip_files = [os.path.join(pth, filename) for filename in os.listdir(pth) if filename.endswith('.zip')]
+                # 并行解压 ZIP 文件 (已解压的文件会被跳过)
+                extract_zips(sorted(zip_files), pth)
 
             def generate_tsv(pth):
                 data_file = osp.join(pth, f'{dataset_name}.tsv')
@@ -213,15 +206,14 @@ Based on your observations, select the best option that accurately addresses the
         return frame_indices
 
     def read_video(self, video_path, bound=None):
-        vr = VideoReader(video_path, ctx=cpu(0), num_threads=1)
+        vr = get_video_reader(video_path, num_threads=1)
         max_frame = len(vr) - 1
         fps = float(vr.get_avg_fps())
 
         images_group = list()
         frame_indices = self.get_index(bound, fps, max_frame, first_idx=0)
-        for frame_index in frame_indices:
-            img = Image.fromarray(vr[frame_index].asnumpy())
-            images_group.append(img)
+        for arr in read_video_frames(vr, frame_indices):
+            images_group.append(Image.fromarray(arr))
         torch_imgs = self.transform(images_group)
         return torch_imgs
 
@@ -450,16 +442,15 @@ Based on your observations, select the best option that accurately addresses the
                 return False
 
             data = load(data_file)
-            for idx, item in data.iterrows():
-                if not osp.exists(osp.join(pth, item['prefix'], item['video'])):
-                    return False
+            if missing_files([osp.join(pth, p, v) for p, v in zip(data['prefix'], data['video'])]):
+                return False
             return True
 
         if modelscope_flag_set():
             repo_id = 'modelscope/MVBench'
 
         cache_path = get_cache_path(repo_id, branch='video')
-        if cache_path is not None and check_integrity(cache_path):
+        if cache_path is not None and verify_once(cache_path, dataset_name, check_integrity, key=self.MP4_MD5):
             dataset_path = cache_path
         else:
             def generate_tsv(pth):
@@ -535,7 +526,7 @@ Based on your observations, select the best option that accurately addresses the
         return frame_indices
 
     def read_video(self, video_path):
-        vr = VideoReader(video_path, ctx=cpu(0), num_threads=1)
+        vr = get_video_reader(video_path, num_threads=1)
         max_frame = len(vr) - 1
 
         images_group = list()
@@ -544,9 +535,8 @@ Based on your observations, select the best option that accurately addresses the
         else:
             frame_indices = self.get_index_by_fps(vr, self.fps)
 
-        for frame_index in frame_indices:
-            img = Image.fromarray(vr[frame_index].asnumpy())
-            images_group.append(img)
+        for arr in read_video_frames(vr, frame_indices):
+            images_group.append(Image.fromarray(arr))
         torch_imgs = self.transform(images_group)
         return torch_imgs
 
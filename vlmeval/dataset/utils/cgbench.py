@@ -550,7 +550,7 @@ def save_clue_video_frames(data_root, clue_frame_root, video, uid, clue_interval
         uid = str(uid)
 
     vid_path = osp.join(data_root, video)
-    vid = decord.VideoReader(vid_path)
+    vid = get_video_reader(vid_path)
     vid_fps = vid.get_avg_fps()
 
     if clue_intervals is not None:
@@ -565,7 +565,7 @@ def save_clue_video_frames(data_root, clue_frame_root, video, uid, clue_interval
     # 保存帧
     flag = np.all([osp.exists(p) for p in frame_paths])
     if not flag:
-        images = [vid[i].asnumpy() for i in indices]
+        images = read_video_frames(vid, indices)
         images = [Image.fromarray(arr) for arr in images]
         for im, pth in zip(images, frame_paths):
             if not osp.exists(pth):
@@ -605,10 +605,7 @@ def unzip_hf_zip(pth):
 
     print("Merging video files ...")
 
-    with open(videos_temp_zip, "wb") as outfile:
-        for video_zip_file in tqdm(video_zip_files, desc="Merging videos"):
-            with open(video_zip_file, "rb") as infile:
-                outfile.write(infile.read())
+    concat_files(video_zip_files, videos_temp_zip)
 
     print("Extracting video files...")
 
@@ -641,10 +638,7 @@ def unzip_hf_zip(pth):
 
     print("Merging clue video files ...")
 
-    with open(clue_videos_temp_zip, "wb") as outfile:
-        for clue_video_zip_file in tqdm(clue_video_zip_files, desc="Merging clue_videos"):
-            with open(clue_video_zip_file, "rb") as infile:
-                outfile.write(infile.read())
+    concat_files(clue_video_zip_files, clue_videos_temp_zip)
 
     print("Extracting clue video files...")
 
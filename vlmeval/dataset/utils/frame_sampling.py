@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import os.path as osp
+
+import numpy as np
+
+from ...smp import LMUDataRoot, get_video_reader, read_video_frames, video_fingerprint
+
+# Sampling policies: name -> func(vid, vid_path, nframe) -> sorted frame indices
+SAMPLING_POLICIES = {}
+# The decoded resolution and the max number of candidate frames of the content-based policies
+ANALYSIS_SIZE = 64
+MAX_CANDIDATES = 512
+
+
+def register_sampling_policy(name):
+    def wrapper(func):
+        SAMPLING_POLICIES[name] = func
+        return func
+    return wrapper
+
+
+def uniform_indices(n_frames, nframe):
+    step_size = n_frames / (nframe + 1)
+    return [int(i * step_size) for i in range(1, nframe + 1)]
+
+
+def fps_indices(n_frames, video_fps, fps):
+    total_duration = n_frames / video_fps
+    required_frames = int(total_duration * fps)
+    step_size = video_fps / fps
+    return [int(i * step_size) for i in range(required_frames)]
+
+
+def fill_indices(indices, n_frames, nframe):
+    # Complete the selected indices to `nframe` distinct frames with uniformly sampled ones
+    indices = set(int(x) for x in indices)
+    for x in uniform_indices(n_frames, nframe * 2):
+        if len(indices) >= min(nframe, n_frames):
+            break
+        indices.add(x)
+    indices = sorted(indices)[:nframe]
+    # Videos with less than `nframe` frames repeat some frames (as the uniform sampling does), since the callers
+    # expect exactly `nframe` frames
+    if len(indices) < nframe:
+        indices = sorted(indices + uniform_indices(n_frames, nframe - len(indices)))
+    return indices
+
+
+@register_sampling_policy('uniform')
+def sample_uniform(vid, vid_path, nframe):
+    return uniform_indices(len(vid), nframe)
+
+
+@register_sampling_policy('keyframe')
+def sample_keyframe(vid, vid_path, nframe):
+    # Key frames are decoded without their preceding frames, uniformly pick `nframe` of them
+    keys = list(vid.get_key_indices())
+    if len(keys) > nframe:
+        keys = [keys[int((i + 0.5) * len(keys) / nframe)] for i in range(nframe)]
+    return fill_indices(keys, len(vid), nframe)
+
+
+def color_histograms(frames, bits=3):
+    # Joint RGB histograms with 2 ** bits bins per channel, normalized to sum 1
+    q = (frames >> (8 - bits)).astype(np.int64)
+    codes = (q[..., 0] << (2 * bits)) | (q[..., 1] << bits) | q[..., 2]
+    codes = codes.reshape(len(frames), -1)
+    nbins = 1 << (3 * bits)
+    hists = np.stack([np.bincount(x, minlength=nbins) for x in codes]).astype(np.float32)
+    return hists / codes.shape[1]
+
+
+@register_sampling_policy('scene')
+def sample_scene(vid, vid_path, nframe):
+    """Spend the frame budget where the content changes.
+
+    Candidate frames (key frames if there are enough of them, otherwise uniform ones) are decoded at a low resolution,
+    each one is scored by the color histogram distance to the previous candidate, and the frames are picked at the
+    uniform quantiles of the cumulative score, plus a floor so that static segments are still covered.
+    """
+    n_frames = len(vid)
+    keys = list(vid.get_key_indices())
+    if len(keys) >= 2 * nframe:
+        candidates = keys
+    else:
+        candidates = uniform_indices(n_frames, min(n_frames, max(8 * nframe, 64)))
+    if len(candidates) > MAX_CANDIDATES:
+        candidates = [candidates[int(i * len(candidates) / MAX_CANDIDATES)] for i in range(MAX_CANDIDATES)]
+    candidates = sorted(set(candidates))
+    if len(candidates) <= nframe:
+        return fill_indices(candidates, n_frames, nframe)
+
+    small = get_video_reader(vid_path, width=ANALYSIS_SIZE, height=ANALYSIS_SIZE)
+    hists = color_histograms(np.stack(read_video_frames(small, candidates)))
+    change = np.zeros(len(candidates), dtype=np.float32)
+    change[1:] = 0.5 * np.abs(hists[1:] - hists[:-1]).sum(axis=1)
+    weights = change + max(float(change.mean()) * 0.5, 1e-3)
+    cum = np.cumsum(weights)
+    targets = (np.arange(nframe) + 0.5) / nframe * cum[-1]
+    picked = np.minimum(np.searchsorted(cum, targets), len(candidates) - 1)
+    return fill_indices([candidates[i] for i in picked], n_frames, nframe)
+
+
+def sampling_cache_path(vid_path, policy, nframe):
+    key = json.dumps([video_fingerprint(vid_path), policy, nframe])
+    return osp.join(LMUDataRoot(), 'images', '.sampling', hashlib.md5(key.encode()).hexdigest() + '.json')
+
+
+def sample_frame_indices(vid, vid_path, nframe, policy='uniform'):
+    """Select `nframe` frames of a video with the sampling policy.
+
+    The decisions of the content-based policies are cached per (video content, policy, nframe) under
+    `$LMUData/images/.sampling`.
+
+    Args:
+        vid (decord.VideoReader): The video reader.
+        vid_path (str): The path of the video.
+        nframe (int): The number of frames.
+        policy (str): The name of the sampling policy, one of `SAMPLING_POLICIES`. Default to 'uniform'.
+
+    Returns:
+        list[int]: The sorted frame indices.
+    """
+    assert policy in SAMPLING_POLICIES, f'Unknown frame sampling policy {policy}, supported: {list(SAMPLING_POLICIES)}'
+    if policy == 'uniform':
+        return sample_uniform(vid, vid_path, nframe)
+    cache_path = sampling_cache_path(vid_path, policy, nframe)
+    if osp.exists(cache_path):
+        with open(cache_path) as f:
+            indices = json.load(f)
+        if len(indices) == nframe:
+            return indices
+    indices = [int(x) for x in SAMPLING_POLICIES[policy](vid, vid_path, nframe)]
+    os.makedirs(osp.dirname(cache_path), exist_ok=True)
+    tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(indices, f)
+    os.replace(tmp_path, cache_path)
+    return indices
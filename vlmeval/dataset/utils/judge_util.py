@@ -1,38 +1,212 @@
+import json
 import os
+import os.path as osp
+import threading
 from ...smp import load_env
 
 INTERNAL = os.environ.get('INTERNAL', 0)
 
 
+BATCH_PROMPT = """You are given {n} independent tasks. \
+Handle each task separately, exactly as if it were the only one, and give the complete reply the task asks for.
+{shared}
+The inputs of the tasks, as a JSON object mapping the task id to the input of the task:
+{items}
+
+Reply with a single JSON object mapping every task id ({keys}) to your reply to that task (as a string), \
+and nothing else."""
+
+BATCH_SHARED = """
+Each task consists of the following shared instruction, followed by the input of the task:
+<shared_instruction>
+{prefix}
+</shared_instruction>
+"""
+
+
+class BatchedJudge:
+    """Pack the text prompts of concurrent `generate` calls into a single judge request.
+
+    The evaluators call the judge once per item, from the worker threads of `track_progress_rich`. The calls with the
+    same kwargs are gathered into batches of at most `batch_size` prompts (waiting at most `max_wait` seconds for a
+    batch to be filled). The common prefix of the prompts in a batch (e.g., the task description and the in-context
+    examples) is sent only once, and the judge replies with a JSON object of the answers of all items. The items with
+    a missing or invalid answer (or all items, if the reply can not be parsed) are sent again one by one with the
+    original prompts. Non-text messages are always sent one by one. Other attributes are those of the judge model.
+
+    The packed reply is budgeted `max_tokens_per_item` tokens per item (or the `max_tokens` of the single-item calls,
+    if smaller), and at most `max_batch_tokens` tokens in total, which should be within the output limit of the judge.
+    The batch size is reduced to fit the items in that budget.
+
+    Args:
+        model (BaseAPI): The judge model.
+        batch_size (int): The max number of items packed into one request.
+        max_wait (float): The max time in seconds to wait for a batch to be filled. Default to 1.
+        max_tokens_per_item (int): The max tokens of each item in the packed reply. Default to 128.
+        max_batch_tokens (int): The max tokens of the packed reply. Default to 4096.
+    """
+
+    def __init__(self, model, batch_size, max_wait=1, max_tokens_per_item=128, max_batch_tokens=4096):
+        self.model = model
+        self.max_wait = max_wait
+        self.max_tokens_per_item = max_tokens_per_item
+        self.max_batch_tokens = max_batch_tokens
+        # 16 more tokens per item for the JSON keys and quotes
+        self.batch_size = min(batch_size, max(max_batch_tokens // (max_tokens_per_item + 16), 1))
+        self.lock = threading.Lock()
+        self.pending = {}
+
+    def __getattr__(self, name):
+        return getattr(self.__dict__['model'], name)
+
+    @staticmethod
+    def pack(prompts):
+        # Send the common prefix (up to the last line break) of the prompts only once
+        prefix = osp.commonprefix(prompts)
+        prefix = prefix[:prefix.rfind('\n') + 1]
+        items = {str(i + 1): p[len(prefix):] for i, p in enumerate(prompts)}
+        shared = BATCH_SHARED.format(prefix=prefix.strip('\n')) if prefix.strip() else ''
+        return BATCH_PROMPT.format(
+            n=len(prompts), shared=shared, items=json.dumps(items, ensure_ascii=False, indent=1),
+            keys=', '.join(f'"{k}"' for k in items))
+
+    @staticmethod
+    def unpack(response, n):
+        # The answers of the n items, None for the missing or invalid ones
+        response = response.strip()
+        st, ed = response.find('{'), response.rfind('}')
+        try:
+            answers = json.loads(response[st: ed + 1])
+            assert isinstance(answers, dict)
+        except Exception:
+            return [None] * n
+        ret = []
+        for i in range(n):
+            ans = answers.get(str(i + 1), None)
+            if isinstance(ans, (int, float)) and not isinstance(ans, bool):
+                ans = str(ans)
+            ret.append(ans if isinstance(ans, str) and ans.strip() else None)
+        return ret
+
+    def generate_batch(self, prompts, **kwargs):
+        if len(prompts) == 1:
+            return [None]
+        max_tokens = kwargs.get('max_tokens', getattr(self.model, 'max_tokens', None))
+        if max_tokens is not None:
+            per_item = min(max_tokens, self.max_tokens_per_item)
+            kwargs['max_tokens'] = min((per_item + 16) * len(prompts), self.max_batch_tokens)
+        response = self.model.generate(self.pack(prompts), **kwargs)
+        if self.model.fail_msg in response:
+            return [None] * len(prompts)
+        return self.unpack(response, len(prompts))
+
+    def generate(self, message, **kwargs):
+        if not isinstance(message, str) or self.batch_size <= 1:
+            return self.model.generate(message, **kwargs)
+        key = json.dumps(kwargs, sort_keys=True, default=str)
+        with self.lock:
+            batch = self.pending.get(key, None)
+            leader = batch is None
+            if leader:
+                batch = dict(prompts=[], answers=None, full=threading.Event(), done=threading.Event())
+                self.pending[key] = batch
+            pos = len(batch['prompts'])
+            batch['prompts'].append(message)
+            if len(batch['prompts']) >= self.batch_size:
+                self.pending.pop(key)
+                batch['full'].set()
+
+        if leader:
+            # The first caller of a batch waits for it to be filled and sends it
+            batch['full'].wait(self.max_wait)
+            with self.lock:
+                if self.pending.get(key, None) is batch:
+                    self.pending.pop(key)
+            try:
+                batch['answers'] = self.generate_batch(batch['prompts'], **kwargs)
+            except Exception as err:
+                self.model.logger.warning(f'Batched judge request failed, fall back to single items: {err}')
+            finally:
+                batch['done'].set()
+        else:
+            batch['done'].wait()
+
+        answer = batch['answers'][pos] if batch['answers'] is not None else None
+        return self.model.generate(message, **kwargs) if answer is None else answer
+
+
+def build_local_judge(target, **kwargs):
+    """Build the judge served locally, set by the environment variable `LOCAL_JUDGE`.
+
+    Args:
+        target (str): The HuggingFace repo id or local path of an LLM to run in the current process (`LocalJudge`),
+            or the chat completions URL of an OpenAI-compatible server on the local network (e.g.,
+            `http://0.0.0.0:23333/v1/chat/completions`), the model name is `LOCAL_LLM` or queried from the server.
+        **kwargs: Other kwargs of the judge model.
+
+    Returns:
+        BaseAPI: The judge model, with the judge results cached on disk unless `cache=False`.
+    """
+    from ...api import LocalJudge, OpenAIWrapper
+    from ...api.local_judge import local_server_model
+    kwargs.setdefault('cache', True)
+    if target.startswith('http://') or target.startswith('https://'):
+        key = kwargs.pop('key', None) or os.environ.get('OPENAI_API_KEY', '')
+        key = key if key.startswith('sk-') else 'sk-local'
+        model_name = os.environ.get('LOCAL_LLM', None) or local_server_model(target, key)
+        kwargs.pop('api_base', None)
+        return OpenAIWrapper(model_name, key=key, api_base=target, **kwargs)
+    return LocalJudge(target, **kwargs)
+
+
 def build_judge(**kwargs):
+    """Build the judge LLM.
+
+    Args:
+        model (str): The judge model, a key of the model map (e.g., 'gpt-4o-mini'). Ignored if `LOCAL_JUDGE` is set,
+            and can be any name if `LOCAL_LLM` is set.
+        batch_size (int, optional): If > 1, pack the text prompts of up to `batch_size` concurrent calls into one
+            request (see `BatchedJudge`). Default to None (one request per call).
+        **kwargs: Other kwargs of the judge model (e.g., `max_tokens`, `retry`).
+
+    Returns:
+        BaseAPI | BatchedJudge: The judge model.
+    """
     from ...api import OpenAIWrapper, SiliconFlowAPI
     model = kwargs.pop('model', None)
     kwargs.pop('nproc', None)
+    batch_size = kwargs.pop('batch_size', None)
     load_env()
+    LOCAL_JUDGE = os.environ.get('LOCAL_JUDGE', None)
     LOCAL_LLM = os.environ.get('LOCAL_LLM', None)
-    if LOCAL_LLM is None:
-        model_map = {
-            'gpt-4-turbo': 'gpt-4-1106-preview',
-            'gpt-4-0613': 'gpt-4-0613',
-            'gpt-4-0125': 'gpt-4-0125-preview',
-            'gpt-4-0409': 'gpt-4-turbo-2024-04-09',
-            'chatgpt-1106': 'gpt-3.5-turbo-1106',
-            'chatgpt-0125': 'gpt-3.5-turbo-0125',
-            'gpt-4o': 'gpt-4o-2024-05-13',
-            'gpt-4o-0806': 'gpt-4o-2024-08-06',
-            'gpt-4o-mini': 'gpt-4o-mini-2024-07-18',
-            'qwen-7b': 'Qwen/Qwen2.5-7B-Instruct',
-            'qwen-72b': 'Qwen/Qwen2.5-72B-Instruct',
-            'deepseek': 'deepseek-ai/DeepSeek-V2.5',
-        }
-        model_version = model_map[model]
+    if LOCAL_JUDGE:
+        model = build_local_judge(LOCAL_JUDGE, **kwargs)
     else:
-        model_version = LOCAL_LLM
+        if LOCAL_LLM is None:
+            model_map = {
+                'gpt-4-turbo': 'gpt-4-1106-preview',
+                'gpt-4-0613': 'gpt-4-0613',
+                'gpt-4-0125': 'gpt-4-0125-preview',
+                'gpt-4-0409': 'gpt-4-turbo-2024-04-09',
+                'chatgpt-1106': 'gpt-3.5-turbo-1106',
+                'chatgpt-0125': 'gpt-3.5-turbo-0125',
+                'gpt-4o': 'gpt-4o-2024-05-13',
+                'gpt-4o-0806': 'gpt-4o-2024-08-06',
+                'gpt-4o-mini': 'gpt-4o-mini-2024-07-18',
+                'qwen-7b': 'Qwen/Qwen2.5-7B-Instruct',
+                'qwen-72b': 'Qwen/Qwen2.5-72B-Instruct',
+                'deepseek': 'deepseek-ai/DeepSeek-V2.5',
+            }
+            model_version = model_map[model]
+        else:
+            model_version = LOCAL_LLM
 
-    if model in ['qwen-7b', 'qwen-72b', 'deepseek']:
-        model = SiliconFlowAPI(model_version, **kwargs)
-    else:
-        model = OpenAIWrapper(model_version, **kwargs)
+        if model in ['qwen-7b', 'qwen-72b', 'deepseek']:
+            model = SiliconFlowAPI(model_version, **kwargs)
+        else:
+            model = OpenAIWrapper(model_version, **kwargs)
+    if batch_size is not None and int(batch_size) > 1:
+        model = BatchedJudge(model, int(batch_size))
     return model
 
 
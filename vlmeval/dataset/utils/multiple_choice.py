@@ -1,6 +1,7 @@
 import pandas as pd
-from ...utils import can_infer, track_progress_rich
+from ...utils import can_infer, can_infer_batch, track_progress_rich
 from ...smp import *
+from .verdict_store import get_verdict_store, judge_version
 import numpy as np
 import re
 
@@ -259,6 +260,28 @@ def prefetch_answer(item):
     return can_infer(item['prediction'], choices)
 
 
+RANDOM_GUESS_LOG = 'Failed to predict, thus randomly generate one. '
+# The version of the answer extraction prompts, bump it if the prompts change to invalidate the stored verdicts
+MCQ_VERDICT_TASK = 'MCQ-v1'
+
+
+def mcq_verdict_key(store, judge, item, dataset_name=None):
+    # The extracted option only depends on the prompt template, question, options and prediction
+    template = dataset_name if dataset_name in ['BLINK', 'WeMath'] else ''
+    return store.verdict_key(
+        MCQ_VERDICT_TASK, judge, template, item['question'], build_choices(item), item['prediction'])
+
+
+def store_mcq_verdicts(store, judge, vkeys, verdicts):
+    # Store the judged options, except for the random guesses
+    new = {}
+    for keys, found in zip(vkeys, verdicts):
+        for i, res in found.items():
+            if i in keys and res['log'] != RANDOM_GUESS_LOG:
+                new[keys[i]] = res
+    store.put_many(new, judge)
+
+
 def extract_answer_from_item(model, item, dataset_name=None):
     logger = get_logger('Evaluation')
     # It will return: (pred, raw, llm_time)
@@ -295,21 +318,16 @@ def extract_answer_from_item(model, item, dataset_name=None):
 
         if retry == 0:
             options = list(choices) + ['Z'] if 'Z' not in choices else []
-            return dict(opt=rd.choice(options), log='Failed to predict, thus randomly generate one. ')
+            return dict(opt=rd.choice(options), log=RANDOM_GUESS_LOG)
 
 
-# For Circular Evaluation
-def prefetch_circular_group(sub_data, verbose=False):
-    lt = len(sub_data)
-    GT, PRED = [], []
-    for i in range(lt):
-        item = sub_data.iloc[i]
-        GT.append(item['GT'])
-        PRED.append(prefetch_answer(item))
-        if PRED[-1] and (GT[-1] != PRED[-1]):
+def prefetch_circular_preds(GT, PRED, predictions, verbose=False):
+    # The prefetch result of a circular group, given the prefetched answers `PRED` of its rotations
+    for i, (g, p) in enumerate(zip(GT, PRED)):
+        if p and (g != p):
             log = (
-                f'Failed in Prefetching Rolling {i}: Answer is {GT[-1]}, '
-                f"Prediction is {item['prediction']}, Pre-fetched is {PRED[-1]}. "
+                f'Failed in Prefetching Rolling {i}: Answer is {g}, '
+                f'Prediction is {predictions[i]}, Pre-fetched is {p}. '
             )
             return dict(hit=0, log=log)
     flag = True
@@ -321,8 +339,22 @@ def prefetch_circular_group(sub_data, verbose=False):
     return ret if len(ret) > 1 else ret[0]
 
 
-def eval_vanilla(model, item, dataset_name=None):
-    res = extract_answer_from_item(model, item, dataset_name=dataset_name)
+# For Circular Evaluation
+def prefetch_circular_group(sub_data, verbose=False):
+    GT = list(sub_data['GT'])
+    PRED = can_infer_batch(sub_data['prediction'], sub_data)
+    return prefetch_circular_preds(GT, PRED, list(sub_data['prediction']), verbose=verbose)
+
+
+def eval_vanilla(model, item, dataset_name=None, verdicts=None):
+    # `verdicts` ({0: extracted answer}, optional): the stored verdict of the item is used instead of the judge, or
+    # the new verdict is recorded in it
+    if verdicts is not None and 0 in verdicts:
+        res = verdicts[0]
+    else:
+        res = extract_answer_from_item(model, item, dataset_name=dataset_name)
+        if verdicts is not None:
+            verdicts[0] = res
     opt, match_log = res['opt'], res['log']
     if opt == item['GT']:
         return dict(hit=1, log=f'Match Log: {match_log}. ')
@@ -331,7 +363,9 @@ def eval_vanilla(model, item, dataset_name=None):
 
 
 # For Circular Evaluation
-def eval_circular_group(model, sub_data, dataset_name=None):
+def eval_circular_group(model, sub_data, dataset_name=None, verdicts=None):
+    # `verdicts` ({rotation: extracted answer}, optional): the stored verdicts are used instead of the judge, and the
+    # new verdicts are recorded in it
     res, GT, PRED = prefetch_circular_group(sub_data, verbose=True)
     if res is not None:
         return res
@@ -342,7 +376,12 @@ def eval_circular_group(model, sub_data, dataset_name=None):
         if PRED[i]:
             log += f'Rolling {i} Matched.\n'
         else:
-            res = extract_answer_from_item(model, sub_data.iloc[i], dataset_name=dataset_name)
+            if verdicts is not None and i in verdicts:
+                res = verdicts[i]
+            else:
+                res = extract_answer_from_item(model, sub_data.iloc[i], dataset_name=dataset_name)
+                if verdicts is not None:
+                    verdicts[i] = res
             opt, match_log = res['opt'], res['log']
             PRED[i] = opt
             if PRED[i] != GT[i]:
@@ -373,15 +412,36 @@ def mcq_vanilla_eval(model, data, meta, nproc, result_file, dataset_name=None):
 
     data = data[data['index'].isin(answer_map)]
     data['GT'] = [answer_map[idx] for idx in data['index']]
-    items = []
-
-    for i in range(len(data)):
-        # Dealing with the normal part
-        item = data.iloc[i]
-        if item['index'] not in result:
-            items.append(item)
+    # Match the options of all predictions in one pass, only the unmatched ones are sent to the judge
+    todo = data[~data['index'].isin(result)]
+    prefetched = can_infer_batch(todo['prediction'], todo)
+    remain = []
+    for i, (idx, gt, pred, pf) in enumerate(zip(todo['index'], todo['GT'], todo['prediction'], prefetched)):
+        if pf:
+            result[idx] = dict(hit=int(pf == gt), log=f'Match Log: {pred}. ')
+        elif model is None:
+            log = 'Failed in Prefetch, no GPT-based answer matching under `exact_matching` policy.'
+            result[idx] = dict(hit=int(gt == 'Z'), log=f'Match Log: {log}. ')
+        else:
+            remain.append(i)
+    items = [todo.iloc[i] for i in remain]
+
+    store = get_verdict_store() if len(items) else None
+    vkeys, verdicts = [], []
+    if store is not None:
+        judge = judge_version(model)
+        vkeys = [mcq_verdict_key(store, judge, x, dataset_name) for x in items]
+        found, rest = store.lookup(vkeys)
+        for i, v in found.items():
+            result[items[i]['index']] = eval_vanilla(model, items[i], dataset_name=dataset_name, verdicts={0: v})
+        items, vkeys = [items[i] for i in rest], [{0: vkeys[i]} for i in rest]
+        verdicts = [{} for _ in items]
+    if len(todo) > len(items):
+        dump(result, result_file)
 
     tups = [dict(model=model, item=x, dataset_name=dataset_name) for x in items]
+    if store is not None:
+        tups = [dict(verdicts=v, **x) for x, v in zip(tups, verdicts)]
     keys = [x['index'] for x in items]
     if len(tups):
         res = track_progress_rich(eval_vanilla, tups, nproc=nproc, chunksize=nproc, save=result_file, keys=keys)
@@ -389,6 +449,8 @@ def mcq_vanilla_eval(model, data, meta, nproc, result_file, dataset_name=None):
         for k, v in zip(keys, res):
             if k not in result:
                 result[k] = v
+        if store is not None:
+            store_mcq_verdicts(store, judge, vkeys, verdicts)
     data['hit'] = [result[i]['hit'] for i in data['index']]
     data['log'] = [result[i]['log'] for i in data['index']]
     if 'GT' in data:
@@ -412,31 +474,55 @@ def mcq_circular_eval(model, data, meta, nproc, result_file, dataset_name=None):
     # Only keep those lines in the meta data
     data = data[data['index'].isin(answer_map)]
     data['GT'] = [answer_map[idx] for idx in data['index']]
-    
-    data['tmp_flag'] = [x == y for x, y in zip(data['index'], data['g_index'])]
-    data_main = data[data['tmp_flag']]
-    data_main.pop('tmp_flag')
-    
-    data_groups = []
-    for i in range(len(data_main)):
-        # Dealing with the normal part
-        idx = data_main.iloc[i]['index']
-        if idx not in result:
-            sub_data = data[data['g_index'] == idx]
-            data_groups.append(sub_data)
-
-    if len(data_groups):
-        prefetched = [prefetch_circular_group(g, verbose=False) for g in data_groups]
+    data_main = data[data['index'] == data['g_index']].reset_index(drop=True)
+
+    # Prefetch all rotations of the groups to evaluate in one pass, and slice the groups by position
+    todo = [idx for idx in data_main['index'] if idx not in result]
+    data_todo = data[data['g_index'].isin(todo)]
+    if len(data_todo):
+        GT = data_todo['GT'].tolist()
+        PRED = can_infer_batch(data_todo['prediction'], data_todo)
+        predictions = data_todo['prediction'].tolist()
+        groups = data_todo.groupby('g_index', sort=False).indices
+
         remain = []
-        for dg, pf in zip(data_groups, prefetched):
+        for idx in todo:
+            pos = groups[idx]
+            pf = prefetch_circular_preds(
+                [GT[i] for i in pos], [PRED[i] for i in pos], [predictions[i] for i in pos])
             if pf is not None:
-                result[dg.iloc[0]['g_index']] = pf
+                result[idx] = pf
             else:
-                remain.append(dg)
+                remain.append(idx)
+
+        # The groups whose unmatched rotations all have stored verdicts are resolved without the judge
+        store = get_verdict_store() if model is not None and len(remain) else None
+        vkeys, verdicts = [], []
+        if store is not None:
+            judge = judge_version(model)
+            rotations = [(j, i, p) for j, idx in enumerate(remain) for i, p in enumerate(groups[idx]) if not PRED[p]]
+            flat = [mcq_verdict_key(store, judge, data_todo.iloc[p], dataset_name) for _, _, p in rotations]
+            found, _ = store.lookup(flat)
+            vkeys, verdicts = [{} for _ in remain], [{} for _ in remain]
+            for n, (j, i, _) in enumerate(rotations):
+                vkeys[j][i] = flat[n]
+                if n in found:
+                    verdicts[j][i] = found[n]
+            keep = []
+            for j, idx in enumerate(remain):
+                if len(verdicts[j]) == len(vkeys[j]):
+                    sub_data = data_todo.iloc[groups[idx]]
+                    result[idx] = eval_circular_group(model, sub_data, dataset_name=dataset_name, verdicts=verdicts[j])
+                else:
+                    keep.append(j)
+            remain = [remain[j] for j in keep]
+            vkeys, verdicts = [vkeys[j] for j in keep], [verdicts[j] for j in keep]
         dump(result, result_file)
 
-        tups = [dict(model=model, sub_data=x, dataset_name=dataset_name) for x in remain]
-        keys = [x.iloc[0]['g_index'] for x in remain]
+        tups = [dict(model=model, sub_data=data_todo.iloc[groups[idx]], dataset_name=dataset_name) for idx in remain]
+        if store is not None:
+            tups = [dict(verdicts=v, **x) for x, v in zip(tups, verdicts)]
+        keys = remain
 
         if len(tups) == 0:
             pass
@@ -458,10 +544,9 @@ def mcq_circular_eval(model, data, meta, nproc, result_file, dataset_name=None):
             for k, v in zip(keys, res):
                 if k not in result:
                     result[k] = v
+            if store is not None:
+                store_mcq_verdicts(store, judge, vkeys, verdicts)
 
-    tmp_pth = f'/tmp/{timestr()}.xlsx'
-    dump(data_main, tmp_pth)
-    data_main = load(tmp_pth)
     indices = data_main['index']
     data_main['hit'] = [result[i]['hit'] for i in indices]
     data_main['log'] = [result[i]['log'] for i in indices]
@@ -0,0 +1,121 @@
+import bisect
+import itertools
+import json
+import os.path as osp
+from functools import lru_cache
+
+
+def timestamp_to_seconds(timestamp):
+    # Split the timestamp into hours, minutes, and seconds
+    h, m, s = timestamp.split(":")
+    # Convert hours, minutes, and total seconds (including fractions) to float and compute total seconds
+    total_seconds = int(h) * 3600 + int(m) * 60 + float(s)
+    return total_seconds
+
+
+def frame_time(frame_id, fps):
+    # The timestamp (in seconds) of a frame, rounded to milliseconds as `pysubs2.make_time(fps=fps, frames=frame_id)`
+    return int(round(frame_id * (1000 / fps))) / 1000
+
+
+class SubtitleIndex:
+    """The cues of a subtitle file, indexed by start time for the lookup of the cues active at a timestamp.
+
+    Args:
+        cues (list[tuple]): The (start, end, text) of each cue, in seconds and in the order of the subtitle file.
+    """
+
+    def __init__(self, cues):
+        self.cues = list(cues)
+        self.order = sorted(range(len(self.cues)), key=lambda i: self.cues[i][0])
+        self.starts = [self.cues[i][0] for i in self.order]
+        # The max end time of the cues up to each position (in start order), so that the backward scan from the
+        # last cue starting before `t` can stop once no earlier cue can still be active
+        self.max_ends = list(itertools.accumulate((self.cues[i][1] for i in self.order), max))
+
+    def __len__(self):
+        return len(self.cues)
+
+    def active(self, t):
+        """Return the indices of the cues with start < t < end, in the order of the subtitle file."""
+        ret = []
+        k = bisect.bisect_left(self.starts, t) - 1
+        while k >= 0 and self.max_ends[k] > t:
+            i = self.order[k]
+            if self.cues[i][1] > t:
+                ret.append(i)
+            k -= 1
+        return sorted(ret)
+
+    def text(self, i, sub_time=False):
+        start, end, text = self.cues[i]
+        return f'[{start}, {end}] {text}' if sub_time else text
+
+    def lookup(self, timestamps=None, sub_time=False, first=False, unique=True):
+        """Get the texts of the cues active at the given timestamps.
+
+        Args:
+            timestamps (list[float], optional): The timestamps in seconds. If None, all cues are returned.
+            sub_time (bool): Prefix each text with the `[start, end]` of the cue. Default to False.
+            first (bool): Only take the first active cue at each timestamp. Default to False.
+            unique (bool): Drop repeated texts, keeping the first occurrence. Default to True.
+
+        Returns:
+            list[str]: The non-empty texts, in the order of the timestamps.
+        """
+        if timestamps is None:
+            ids = range(len(self.cues))
+        else:
+            ids = []
+            for t in timestamps:
+                act = self.active(t)
+                ids.extend(act[:1] if first else act)
+        texts = [x for x in (self.text(i, sub_time) for i in ids) if x.strip()]
+        return list(dict.fromkeys(texts)) if unique else texts
+
+
+def parse_srt(pth):
+    import pysubs2
+    subs = pysubs2.load(pth, encoding='utf-8')
+    return [(sub.start / 1000, sub.end / 1000, sub.text.replace('\\N', ' ')) for sub in subs]
+
+
+def parse_json_subtitles(pth, offset=0, duration=None):
+    # The subtitle format of LongVideoBench, either {'timestamp': [start, end], 'text'} (in seconds) or
+    # {'start', 'end', 'line'} (as `HH:MM:SS.ms`), the times are shifted by `-offset`
+    with open(pth) as f:
+        subtitles = json.load(f)
+    cues = []
+    for subtitle in subtitles:
+        if 'timestamp' in subtitle:
+            start, end = subtitle['timestamp']
+            if not isinstance(end, float):
+                end = duration
+            text = subtitle['text']
+        else:
+            start = timestamp_to_seconds(subtitle['start'])
+            end = timestamp_to_seconds(subtitle['end'])
+            text = subtitle['line']
+        cues.append((start - offset, end - offset, text))
+    return cues
+
+
+@lru_cache(maxsize=256)
+def _load_subtitle_index(pth, mtime, offset, duration):
+    if pth.endswith('.json'):
+        return SubtitleIndex(parse_json_subtitles(pth, offset=offset, duration=duration))
+    return SubtitleIndex(parse_srt(pth))
+
+
+def load_subtitle_index(pth, offset=0, duration=None):
+    """Load the subtitles of a video as a `SubtitleIndex`, parsed once and cached (until the file is modified).
+
+    Args:
+        pth (str): The subtitle file, `.srt` (or other formats supported by pysubs2) or LongVideoBench `.json`.
+        offset (float): For `.json` subtitles, the start time of the video in the subtitle timeline. Default to 0.
+        duration (float, optional): For `.json` subtitles, the end time of the cues without one.
+
+    Returns:
+        SubtitleIndex: The subtitle index, shared between calls and should not be modified.
+    """
+    return _load_subtitle_index(pth, osp.getmtime(pth), offset, duration)
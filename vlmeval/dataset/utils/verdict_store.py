@@ -0,0 +1,136 @@
+import os
+import json
+import os.path as osp
+import threading
+from ...smp import LMUDataRoot, dump
+from ...api.cache import ResponseCache
+
+
+class VerdictStore(ResponseCache):
+    """A persistent store of judge verdicts (e.g., the option extracted from a prediction), shared across the
+    evaluated models and runs.
+
+    A verdict only depends on the task (the judge prompt, versioned), the judge (`judge_version`) and the
+    normalized fields of the item, such as (question, options, prediction). Identical predictions of different
+    models (e.g., "The answer is B") are then judged only once. Evaluators look up the verdicts before dispatching
+    the items to the judge, and store the new verdicts afterwards. Only deterministic successes should be stored.
+
+    Args:
+        pth (str): The path of the SQLite database.
+    """
+
+    @staticmethod
+    def normalize_field(x):
+        if isinstance(x, dict):
+            return {str(k): VerdictStore.normalize_field(v) for k, v in sorted(x.items())}
+        if isinstance(x, (list, tuple)):
+            return [VerdictStore.normalize_field(v) for v in x]
+        if x is None or (isinstance(x, float) and x != x):
+            return ''
+        return ' '.join(str(x).split())
+
+    def verdict_key(self, task, judge, *fields):
+        """The key of the verdict of an item.
+
+        Args:
+            task (str): The judge task and the version of its prompt, e.g., 'MCQ-v1'.
+            judge (str): The judge version, see `judge_version`.
+            *fields: The fields of the item that the verdict depends on, normalized before hashing (whitespace is
+                collapsed, NaN is treated as empty).
+        """
+        fields = json.dumps([self.normalize_field(x) for x in fields], ensure_ascii=False)
+        return self.make_key(judge, fields, task=task)
+
+    def get_many(self, keys):
+        """Return the dict of the found verdicts, keyed by the keys."""
+        ret = {}
+        for k in keys:
+            v = self.get(k)
+            if v is not None:
+                ret[k] = v
+        return ret
+
+    def lookup(self, keys):
+        """Look up the verdicts of the items before dispatching them to the judge.
+
+        Args:
+            keys (list[str]): The verdict keys of the items, see `verdict_key`.
+
+        Returns:
+            dict: The found verdicts, keyed by the positions in `keys`.
+            list[int]: The positions of the items without a stored verdict, which should be judged.
+        """
+        found = self.get_many(keys)
+        hit = {i: found[k] for i, k in enumerate(keys) if k in found}
+        return hit, [i for i in range(len(keys)) if i not in hit]
+
+    def put_many(self, verdicts, judge):
+        for k, v in verdicts.items():
+            self.put(k, judge, v)
+
+
+def judge_version(model):
+    """The identity of a judge model in the verdict store: the model, its endpoint and generation settings."""
+    if hasattr(model, 'cache_id'):
+        return model.cache_id()
+    return model.__class__.__name__
+
+
+VERDICT_STORES = {}
+VERDICT_STORES_LOCK = threading.Lock()
+
+
+def get_verdict_store():
+    """Get the verdict store set by the environment variable `VERDICT_STORE` ('1' for `$LMUData/verdict_store.db`,
+    or a file path), None if not set."""
+    pth = os.environ.get('VERDICT_STORE', None)
+    if pth in [None, '', '0', 'False']:
+        return None
+    if pth in ['1', 'True']:
+        pth = osp.join(LMUDataRoot(), 'verdict_store.db')
+    with VERDICT_STORES_LOCK:
+        if pth not in VERDICT_STORES:
+            VERDICT_STORES[pth] = VerdictStore(pth)
+        return VERDICT_STORES[pth]
+
+
+def prefill_verdicts(model, task, fields, tups, indices, ans, save=None):
+    """Fill the stored verdicts of the judge tasks into `ans`, before dispatching the tasks to the judge.
+
+    Args:
+        model: The judge model.
+        task (str): The judge task and the version of its prompt, e.g., 'MathVista-v1'.
+        fields (list[str]): The fields of the line that the verdict depends on.
+        tups (list): The judge tasks, `(model, line)` tuples or `dict(model=..., line=...)`.
+        indices (list): The keys of the tasks in `ans`.
+        ans (dict): The results of the finished tasks, updated with the found verdicts.
+        save (str, optional): Dump `ans` to `save` (the checkpoint file of the tasks) if any verdict is found.
+
+    Returns:
+        list, list, list: The tasks without a stored verdict, their keys in `ans`, and their verdict keys (None if
+            the verdict store is not enabled) to be passed to `store_verdicts`.
+    """
+    store = get_verdict_store() if len(indices) else None
+    if store is None:
+        return tups, indices, None
+    judge = judge_version(model)
+    lines = [x['line'] if isinstance(x, dict) else x[1] for x in tups]
+    vkeys = [store.verdict_key(task, judge, *[line[f] for f in fields]) for line in lines]
+    found, rest = store.lookup(vkeys)
+    ans.update({indices[i]: v for i, v in found.items()})
+    if save is not None and len(found):
+        dump(ans, save)
+    return [tups[i] for i in rest], [indices[i] for i in rest], [vkeys[i] for i in rest]
+
+
+def store_verdicts(model, vkeys, results, valid):
+    """Store the new verdicts of the tasks returned by `prefill_verdicts`.
+
+    Args:
+        model: The judge model.
+        vkeys (list): The verdict keys returned by `prefill_verdicts`, nothing is stored if None.
+        results (list): The results of the tasks.
+        valid (Callable): Whether a result should be stored. Failed judge calls should not, so they are retried.
+    """
+    if vkeys is not None:
+        get_verdict_store().put_many({k: v for k, v in zip(vkeys, results) if valid(v)}, judge_version(model))
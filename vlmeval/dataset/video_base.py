@@ -1,5 +1,6 @@
 from abc import abstractmethod
 from ..smp import *
+from .utils.frame_sampling import SAMPLING_POLICIES, fps_indices, sample_frame_indices
 
 
 class VideoBaseDataset:
@@ -21,7 +22,27 @@ class VideoBaseDataset:
         ret = self.prepare_dataset(dataset)
         assert ret is not None
         lmu_root = LMUDataRoot()
-        self.frame_root = osp.join(lmu_root, 'images', dataset)
+        # Decode the frames at a reduced resolution (e.g., VIDEO_FRAME_SIZE=448x448) if the model will downscale
+        # them anyway, the frames are saved to a separate directory
+        self.frame_size = (-1, -1)
+        self.frame_root_suffix = ''
+        if os.environ.get('VIDEO_FRAME_SIZE', None):
+            self.frame_size = tuple(int(x) for x in os.environ['VIDEO_FRAME_SIZE'].lower().split('x'))
+            self.frame_root_suffix = '_{}x{}'.format(*self.frame_size)
+        # The policy to select `nframe` frames of a video (e.g., FRAME_SAMPLING=scene), one of `SAMPLING_POLICIES`,
+        # the frames of the non-uniform policies are saved to a separate directory
+        self.sampling = os.environ.get('FRAME_SAMPLING', 'uniform') or 'uniform'
+        assert self.sampling in SAMPLING_POLICIES, \
+            f'Unknown frame sampling policy {self.sampling}, supported: {list(SAMPLING_POLICIES)}'
+        if self.sampling != 'uniform':
+            self.frame_root_suffix += f'_{self.sampling}'
+        self.frame_root = osp.join(lmu_root, 'images', dataset + self.frame_root_suffix)
+        # If True, decoded frames are passed to the model as in-memory arrays (`type='image_array'`) rather than
+        # being saved as JPEG files first, set by the inference loop for models with `ARRAY_INPUT`
+        self.array_frames = False
+        # If True, the frames of the same video and sampling are extracted once for all datasets referencing them
+        # (see `save_shared_frames`), set by `ConcatVideoDataset` for its sub-datasets
+        self.share_frames = False
         os.makedirs(self.frame_root, exist_ok=True)
         self.frame_tmpl = 'frame-{}-of-{}.jpg'
         self.frame_tmpl_fps = 'frame-{}-of-{}-{}fps.jpg'
@@ -65,53 +86,106 @@ class VideoBaseDataset:
         return [osp.join(frame_root,
                          self.frame_tmpl_fps.format(i, num_frames, self.fps)) for i in range(1, num_frames + 1)]
 
+    def video_reader(self, vid_path):
+        return get_video_reader(vid_path, width=self.frame_size[0], height=self.frame_size[1])
+
     def save_video_frames(self, video):
         if self.fps > 0:
             vid_path = osp.join(self.data_root, video + '.mp4')
-            vid = decord.VideoReader(vid_path)
-
-            # 计算视频的总帧数和总时长
-            total_frames = len(vid)
-            video_fps = vid.get_avg_fps()
-            total_duration = total_frames / video_fps
-
-            # 计算需要提取的总帧数
-            required_frames = int(total_duration * self.fps)
+            vid = self.video_reader(vid_path)
 
-            # 计算提取帧的间隔
-            step_size = video_fps / self.fps
-
-            # 计算提取帧的索引
-            indices = [int(i * step_size) for i in range(required_frames)]
+            indices = self.frame_indices(vid, vid_path)
 
             # 提取帧并保存
             frame_paths = self.frame_paths_fps(video, len(indices))
-            flag = np.all([osp.exists(p) for p in frame_paths])
-            if flag:
-                return frame_paths
-
-            images = [vid[i].asnumpy() for i in indices]
-            images = [Image.fromarray(arr) for arr in images]
-            for im, pth in zip(images, frame_paths):
-                if not osp.exists(pth):
-                    im.save(pth)
-            return frame_paths
+            return self.save_frames(vid, vid_path, indices, frame_paths)
 
         else:
             frame_paths = self.frame_paths(video)
             flag = np.all([osp.exists(p) for p in frame_paths])
-            if flag:
+            if flag and get_frame_cache() is None:
                 return frame_paths
             vid_path = osp.join(self.data_root, video + '.mp4')
-            vid = decord.VideoReader(vid_path)
-            step_size = len(vid) / (self.nframe + 1)
-            indices = [int(i * step_size) for i in range(1, self.nframe + 1)]
-            images = [vid[i].asnumpy() for i in indices]
-            images = [Image.fromarray(arr) for arr in images]
-            for im, pth in zip(images, frame_paths):
-                if not osp.exists(pth):
-                    im.save(pth)
+            vid = self.video_reader(vid_path)
+            indices = self.frame_indices(vid, vid_path)
+            return self.save_frames(vid, vid_path, indices, frame_paths)
+
+    def frame_indices(self, vid, vid_path, nframe=None, fps=None):
+        """Select the frames to extract from a video.
+
+        Args:
+            vid (decord.VideoReader): The video reader.
+            vid_path (str): The path of the video.
+            nframe (int, optional): The number of frames. Default to `self.nframe`.
+            fps (float, optional): The sampling frame rate, takes precedence over `nframe` if > 0.
+                Default to `self.fps`.
+
+        Returns:
+            list[int]: The frame indices, sampled at `fps`, or `nframe` frames selected by the `sampling` policy.
+        """
+        nframe = self.nframe if nframe is None else nframe
+        fps = self.fps if fps is None else fps
+        if fps > 0:
+            return fps_indices(len(vid), vid.get_avg_fps(), fps)
+        return sample_frame_indices(vid, vid_path, nframe, policy=self.sampling)
+
+    def save_frames(self, vid, vid_path, indices, frame_paths, save=True):
+        # Save the frames at `indices` to `frame_paths` (if `save`). If the frame cache is enabled (`FRAME_CACHE`),
+        # the frames are packed into the cache instead, and the paths of the extracted frames are returned.
+        # If `array_frames`, the newly decoded frames are returned as arrays and not saved as individual files
+        cache = get_frame_cache()
+        if not save:
             return frame_paths
+        if cache is not None:
+            key = cache.key(vid_path, indices, self.frame_size)
+            if cache.exists(key):
+                return cache.extract(key, [osp.basename(p) for p in frame_paths])
+            frames = read_video_frames(vid, indices)
+            cache.put(key, frames)
+            return frames if self.array_frames else cache.extract(key, [osp.basename(p) for p in frame_paths])
+
+        if np.all([osp.exists(p) for p in frame_paths]):
+            return frame_paths
+        if self.share_frames and not self.array_frames:
+            return self.save_shared_frames(vid, vid_path, indices, frame_paths)
+        frames = read_video_frames(vid, indices)
+        if self.array_frames:
+            return frames
+        for arr, pth in zip(frames, frame_paths):
+            if not osp.exists(pth):
+                Image.fromarray(arr).save(pth)
+        return frame_paths
+
+    def save_shared_frames(self, vid, vid_path, indices, frame_paths):
+        # Save the frames once under `$LMUData/images/.frames/{key}` (keyed by the video content and the sampling),
+        # and link them to `frame_paths`, so that datasets referencing the same video do not extract it again
+        key = json.dumps([video_fingerprint(vid_path), [int(x) for x in indices], list(self.frame_size)])
+        root = osp.join(LMUDataRoot(), 'images', '.frames', hashlib.md5(key.encode()).hexdigest())
+        shared_paths = [osp.join(root, osp.basename(p)) for p in frame_paths]
+        if not np.all([osp.exists(p) for p in shared_paths]):
+            os.makedirs(root, exist_ok=True)
+            frames = read_video_frames(vid, indices)
+            for arr, pth in zip(frames, shared_paths):
+                if not osp.exists(pth):
+                    tmp_path = f'{pth}.{os.getpid()}.tmp.jpg'
+                    Image.fromarray(arr).save(tmp_path)
+                    os.replace(tmp_path, pth)
+        for src, dst in zip(shared_paths, frame_paths):
+            if not osp.exists(dst):
+                link_file(src, dst)
+        return frame_paths
+
+    @staticmethod
+    def frame_message(frame):
+        # A frame is either the path of the saved frame, or the decoded frame in memory
+        if isinstance(frame, np.ndarray):
+            return dict(type='image_array', value=frame)
+        return dict(type='image', value=frame)
+
+    # Extract the frames of a sample ahead of inference (called in the worker processes of `FramePrefetcher`),
+    # can override
+    def prefetch(self, line):
+        self.build_prompt(line, video_llm=False)
 
     # Return a list of dataset names that are supported by this class, can override
     @classmethod
@@ -133,3 +207,82 @@ class VideoBaseDataset:
         # `root` (directory that containing video files)
         # `data_file` (the TSV dataset file)
         pass
+
+
+PREFETCH_DATASET = None
+
+
+def _init_prefetch_worker(dataset):
+    global PREFETCH_DATASET
+    PREFETCH_DATASET = dataset
+
+
+def _prefetch_sample(sample):
+    try:
+        PREFETCH_DATASET.prefetch(sample)
+        return None
+    except Exception as e:
+        return f'{type(e)}: {e}'
+
+
+class FramePrefetcher:
+    """Extract the video frames of upcoming samples in a process pool, so that decoding overlaps with inference.
+
+    Samples are submitted in order, with at most `depth` samples extracted ahead of the one being consumed.
+    Samples of the same video are only submitted once. Call `wait(i)` before building the prompt of the i-th
+    sample, the frames are ready (or the extraction failed, and the prompt building will extract them) after it
+    returns.
+
+    Args:
+        dataset (VideoBaseDataset): The video dataset.
+        samples (list): The samples (as passed to `dataset.build_prompt`), e.g., the ones of the current rank.
+        nproc (int): The number of worker processes. Default to 4.
+        depth (int, optional): The number of samples extracted ahead. Default to 4 * nproc.
+    """
+
+    def __init__(self, dataset, samples, nproc=4, depth=None):
+        import multiprocessing as mp
+        self.samples = list(samples)
+        self.depth = 4 * nproc if depth is None else depth
+        # `spawn` as the main process may have initialized CUDA
+        self.pool = mp.get_context('spawn').Pool(nproc, initializer=_init_prefetch_worker, initargs=(dataset, ))
+        self.keys = [self.video_key(dataset, x) for x in self.samples]
+        self.results = {}
+        self.submitted = 0
+
+    @staticmethod
+    def video_key(dataset, sample):
+        if isinstance(sample, int) and 'video' in dataset.data:
+            return dataset.data.iloc[sample]['video']
+        return sample
+
+    def submit_until(self, end):
+        end = min(end, len(self.samples))
+        while self.submitted < end:
+            key = self.keys[self.submitted]
+            if key not in self.results:
+                self.results[key] = self.pool.apply_async(_prefetch_sample, (self.samples[self.submitted], ))
+            self.submitted += 1
+
+    def wait(self, i):
+        """Wait for the frames of the i-th sample, and keep `depth` samples after it in flight."""
+        self.submit_until(i + 1 + self.depth)
+        err = self.results[self.keys[i]].get()
+        if err is not None:
+            warnings.warn(f'Failed to prefetch the frames of sample {self.samples[i]}: {err}')
+
+    def run(self):
+        """Extract the frames of all samples."""
+        from tqdm import tqdm
+        for i in tqdm(range(len(self.samples)), desc='Prefetch Frames'):
+            self.wait(i)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.pool.terminate()
@@ -9,43 +9,90 @@ class ConcatVideoDataset(VideoBaseDataset):
     DATASET_SETS = {}
 
     def __init__(self, dataset, **kwargs):
-        from . import build_dataset
         datasets = self.DATASET_SETS[dataset]
         self.dataset_map = {}
         # The name of the compliation
         self.dataset_name = dataset
         self.datasets = datasets
+        self.kwargs = kwargs
         self.nframe = kwargs.get('nframe', 0)
         self.fps = kwargs.get('fps', -1)
-        for dname in datasets:
-            dataset = build_dataset(dname, **kwargs)
-            assert dataset is not None, dataset
-            self.dataset_map[dname] = dataset
-        TYPES = [x.TYPE for x in self.dataset_map.values()]
-        MODALITIES = [x.MODALITY for x in self.dataset_map.values()]
+        # The sub-datasets are built on first use, the types are resolved from their classes
+        classes = [self.sub_dataset_class(dname) for dname in datasets]
+        TYPES = [x.TYPE for x in classes]
+        MODALITIES = [x.MODALITY for x in classes]
         # assert np.all([x == TYPES[0] for x in TYPES]), (datasets, TYPES)
         assert np.all([x == MODALITIES[0] for x in MODALITIES]), (datasets, MODALITIES)
         self.TYPE = TYPES
         self.MODALITY = MODALITIES[0]
-        data_all = []
-        for dname in datasets:
-            data = self.dataset_map[dname].data
-            data['SUB_DATASET'] = [dname] * len(data)
-            data_all.append(data)
+        self._data = None
+        self._array_frames = False
+        # {sub-dataset name: {original index: row position in the sub-dataset}}
+        self.index_map = {}
+
+    @staticmethod
+    def sub_dataset_class(dname):
+        from . import DATASET_CLASSES
+        from .video_dataset_config import supported_video_datasets
+        if dname in supported_video_datasets:
+            return supported_video_datasets[dname].func
+        for cls in DATASET_CLASSES:
+            if dname in cls.supported_datasets():
+                return cls
+        raise ValueError(f'Unknown sub-dataset {dname}')
+
+    def sub_dataset(self, dname):
+        if dname not in self.dataset_map:
+            from . import build_dataset
+            dataset = build_dataset(dname, **self.kwargs)
+            assert dataset is not None, dname
+            # Sub-datasets referencing the same video share the extracted frames
+            dataset.share_frames = True
+            dataset.array_frames = self._array_frames
+            self.dataset_map[dname] = dataset
+        return self.dataset_map[dname]
+
+    @property
+    def data(self):
+        if self._data is None:
+            data_all = []
+            for dname in self.datasets:
+                data = self.sub_dataset(dname).data
+                data['SUB_DATASET'] = [dname] * len(data)
+                self.index_map[dname] = {x: i for i, x in enumerate(data['index'])}
+                data_all.append(data)
+
+            data = pd.concat(data_all)
+            data['original_index'] = data.pop('index')
+            data['index'] = np.arange(len(data))
+            self._data = data
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+
+    @property
+    def array_frames(self):
+        return self._array_frames
+
+    @array_frames.setter
+    def array_frames(self, value):
+        self._array_frames = value
+        for dataset in self.dataset_map.values():
+            dataset.array_frames = value
 
-        data = pd.concat(data_all)
-        data['original_index'] = data.pop('index')
-        data['index'] = np.arange(len(data))
-        self.data = data
+    def __len__(self):
+        return len(self.data)
 
     def build_prompt(self, line, video_llm):
         if isinstance(line, int):
             line = self.data.iloc[line]
         idx = line['original_index']
         dname = line['SUB_DATASET']
-        org_data = self.dataset_map[dname].data
-        org_line = cp.deepcopy(org_data[org_data['index'] == idx]).iloc[0]
-        return self.dataset_map[dname].build_prompt(org_line, video_llm)
+        dataset = self.sub_dataset(dname)
+        org_line = cp.deepcopy(dataset.data.iloc[self.index_map[dname][idx]])
+        return dataset.build_prompt(org_line, video_llm)
 
     def dump_image(self, line):
         # Assert all images are pre-dumped
@@ -73,7 +120,7 @@ class ConcatVideoDataset(VideoBaseDataset):
         results_all = {}
         for dname in self.datasets:
             tgt = eval_file.replace(self.dataset_name, dname)
-            res = self.dataset_map[dname].evaluate(tgt, **judge_kwargs)
+            res = self.sub_dataset(dname).evaluate(tgt, **judge_kwargs)
             results_all.update(res)
 
         result = pd.DataFrame(results_all, index=['success', 'overall'])
@@ -1,32 +1,13 @@
 from huggingface_hub import snapshot_download
 from ..smp import *
 from .video_base import VideoBaseDataset
+from .mmbench_video import unwrap_hf_pkl  # noqa: F401
 from .utils import build_judge, DEBUG_MESSAGE
+from .utils.subtitle import load_subtitle_index, frame_time
 
 FAIL_MSG = 'Failed to obtain answer via API.'
 
 
-def unwrap_hf_pkl(pth, suffix='.mp4'):
-    base_dir = os.path.join(pth, 'video_pkl/')
-    target_dir = os.path.join(pth, 'video/')
-    pickle_files = [os.path.join(base_dir, file) for file in os.listdir(base_dir)]
-    pickle_files.sort()
-
-    if not os.path.exists(target_dir):
-        os.makedirs(target_dir, exist_ok=True)
-        for pickle_file in pickle_files:
-            with open(pickle_file, 'rb') as file:
-                video_data = pickle.load(file)
-            # For each video file in the pickle file, write its contents to a new mp4 file
-            for video_name, video_content in video_data.items():
-                output_path = os.path.join(target_dir, f'{video_name}{suffix}')
-                with open(output_path, 'wb') as output_file:
-                    output_file.write(video_content)
-        print('The video file has been restored and stored from the pickle file.')
-    else:
-        print('The video file already exists.')
-
-
 class VideoMME(VideoBaseDataset):
 
     MD5 = '85bdd91f9b29a99354c23b97ab7c113c'
@@ -68,18 +49,16 @@ Respond with only the letter (A, B, C, or D) of the correct option.
             if md5(data_file) != self.MD5:
                 return False
             data = load(data_file)
-            for video_pth in data['video_path']:
-                if not osp.exists(osp.join(pth, video_pth)):
-                    return False
+            if missing_files([osp.join(pth, x) for x in data['video_path']]):
+                return False
             return True
 
         cache_path = get_cache_path(repo_id)
-        if cache_path is not None and check_integrity(cache_path):
+        if cache_path is not None and verify_once(cache_path, dataset_name, check_integrity, key=self.MD5):
             dataset_path = cache_path
         else:
 
             def unzip_hf_zip(pth):
-                import zipfile
                 base_dir = pth
                 target_dir = os.path.join(pth, 'video/')
                 zip_files = [
@@ -88,39 +67,15 @@ Respond with only the letter (A, B, C, or D) of the correct option.
                 ]
                 zip_files.sort()
 
-                if not os.path.exists(target_dir):
-                    os.makedirs(target_dir, exist_ok=True)
-                    for zip_file in zip_files:
-                        with zipfile.ZipFile(zip_file, 'r') as zip_ref:
-                            for member in zip_ref.namelist():
-                                # Check if the member is a file (not a directory)
-                                if not member.endswith('/'):
-                                    # Extract the file to the specified directory
-                                    source = zip_ref.open(member)
-                                    target = open(os.path.join(target_dir, os.path.basename(member)), 'wb')
-                                    with source, target:
-                                        target.write(source.read())
-                    print('The video file has been restored and stored from the zip file.')
-                else:
-                    print('The video file already exists.')
+                # Stream the members to disk, archives in parallel, already extracted videos are skipped
+                extract_zips(zip_files, target_dir, flatten=True)
+                print('The video file has been restored and stored from the zip file.')
 
                 subtitle_zip_file = os.path.join(base_dir, 'subtitle.zip')
                 subtitle_target_dir = os.path.join(base_dir, 'subtitle')
-
-                if not os.path.exists(subtitle_target_dir):
-                    os.makedirs(subtitle_target_dir, exist_ok=True)
-                    with zipfile.ZipFile(subtitle_zip_file, 'r') as zip_ref:
-                        for member in zip_ref.namelist():
-                            # Check if the member is a file (not a directory)
-                            if not member.endswith('/'):
-                                # Extract the file to the specified directory
-                                source = zip_ref.open(member)
-                                target = open(os.path.join(subtitle_target_dir, os.path.basename(member)), 'wb')
-                                with source, target:
-                                    target.write(source.read())
-                    print('The subtitle file has been restored and stored from the zip file.')
-                else:
-                    print('The subtitle file already exists.')
+                os.makedirs(subtitle_target_dir, exist_ok=True)
+                extract_zip(subtitle_zip_file, subtitle_target_dir, flatten=True)
+                print('The subtitle file has been restored and stored from the zip file.')
 
             def generate_tsv(pth):
 
@@ -155,31 +110,20 @@ Respond with only the letter (A, B, C, or D) of the correct option.
     def save_video_frames(self, video, video_llm=False):
 
         vid_path = osp.join(self.data_root, 'video', video + '.mp4')
-        vid = decord.VideoReader(vid_path)
+        vid = self.video_reader(vid_path)
         video_info = {
             'fps': vid.get_avg_fps(),
             'n_frames': len(vid),
         }
         if self.nframe > 0 and self.fps < 0:
-            step_size = len(vid) / (self.nframe + 1)
-            indices = [int(i * step_size) for i in range(1, self.nframe + 1)]
+            indices = self.frame_indices(vid, vid_path)
             frame_paths = self.frame_paths(video)
         elif self.fps > 0:
             # not constrained by num_frames, get frames by fps
-            total_duration = video_info['n_frames'] / video_info['fps']
-            required_frames = int(total_duration * self.fps)
-            step_size = video_info['fps'] / self.fps
-            indices = [int(i * step_size) for i in range(required_frames)]
+            indices = self.frame_indices(vid, vid_path)
             frame_paths = self.frame_paths_fps(video, len(indices))
 
-        flag = np.all([osp.exists(p) for p in frame_paths])
-
-        if not flag:
-            images = [vid[i].asnumpy() for i in indices]
-            images = [Image.fromarray(arr) for arr in images]
-            for im, pth in zip(images, frame_paths):
-                if not osp.exists(pth) and not video_llm:
-                    im.save(pth)
+        frame_paths = self.save_frames(vid, vid_path, indices, frame_paths, save=not video_llm)
 
         return frame_paths, indices, video_info
 
@@ -191,20 +135,9 @@ Respond with only the letter (A, B, C, or D) of the correct option.
         frames, indices, video_info = self.save_video_frames(line['video'], video_llm)
 
         if self.use_subtitle and os.path.exists(osp.join(self.data_root, line['subtitle_path'])):
-            import pysubs2
-            subs = pysubs2.load(osp.join(self.data_root, line['subtitle_path']), encoding='utf-8')
-            subtitles = []
-
-            for seleced_frame_id in indices:
-                sub_text = ''
-                cur_time = pysubs2.make_time(fps=video_info['fps'], frames=seleced_frame_id)
-                for sub in subs:
-                    if sub.start < cur_time and sub.end > cur_time:
-                        sub_text = sub.text.replace('\\N', ' ')
-                        break
-                if sub_text.strip():
-                    subtitles.append(sub_text)
-            subtitles = '\n'.join(subtitles)
+            index = load_subtitle_index(osp.join(self.data_root, line['subtitle_path']))
+            timestamps = [frame_time(x, video_info['fps']) for x in indices]
+            subtitles = '\n'.join(index.lookup(timestamps, first=True, unique=False))
         else:
             subtitles = ''
 
@@ -213,7 +146,7 @@ Respond with only the letter (A, B, C, or D) of the correct option.
             message.append(dict(type='video', value=osp.join(self.data_root, 'video', line['video'] + '.mp4')))
         else:
             for im in frames:
-                message.append(dict(type='image', value=im))
+                message.append(self.frame_message(im))
 
         text_prompt = self.FRAMES_TMPL_NOSUB if not self.use_subtitle else self.FRAMES_TMPL_SUB.format(subtitles)
         message.append(dict(type='text', value=text_prompt))
@@ -1,7 +1,7 @@
 import torch
 import torch.distributed as dist
 from vlmeval.config import supported_VLM
-from vlmeval.utils import track_progress_rich
+from vlmeval.utils import track_progress_rich, track_progress_async
 from vlmeval.smp import *
 
 FAIL_MSG = 'Failed to obtain answer via API.'
@@ -46,34 +46,39 @@ def infer_data_api(model, work_dir, model_name, dataset, index_set=None, api_npr
     # structs = [dataset.build_prompt(data.iloc[i]) for i in range(lt)]
 
     out_file = f'{work_dir}/{model_name}_{dataset_name}_supp.pkl'
-    res = {}
-    if osp.exists(out_file):
-        res = load(out_file)
-        if ignore_failed:
-            res = {k: v for k, v in res.items() if FAIL_MSG not in v}
+    res = load_checkpoint(out_file)
+    if ignore_failed:
+        res = {k: v for k, v in res.items() if FAIL_MSG not in v}
 
     structs = [s for i, s in zip(indices, structs) if i not in res]
     indices = [i for i in indices if i not in res]
 
-    gen_func = model.generate
     structs = [dict(message=struct, dataset=dataset_name) for struct in structs]
 
     if len(structs):
-        track_progress_rich(gen_func, structs, nproc=api_nproc, chunksize=api_nproc, save=out_file, keys=indices)
+        if getattr(model, 'ASYNC', False):
+            # All requests are driven by one event loop with a pooled HTTP client, `api_nproc` is the concurrency
+            track_progress_async(
+                model.agenerate, structs, nproc=api_nproc, save=out_file, keys=indices, cleanup=model.aclose)
+        else:
+            track_progress_rich(
+                model.generate, structs, nproc=api_nproc, chunksize=api_nproc, save=out_file, keys=indices)
+
+    if getattr(model, 'response_cache', None) is not None:
+        get_logger('Inference').info(f'Response cache stats: {model.response_cache.stats()}')
 
-    res = load(out_file)
+    res = load_checkpoint(out_file)
     if index_set is not None:
         res = {k: v for k, v in res.items() if k in index_set}
     os.remove(out_file)
     return res
 
 
-def infer_data(model, model_name, work_dir, dataset, out_file, verbose=False, api_nproc=4):
+def infer_data(model, model_name, work_dir, dataset, out_file, verbose=False, api_nproc=4, batch_size=1):
     dataset_name = dataset.dataset_name
     prev_file = f'{work_dir}/{model_name}_{dataset_name}_PREV.pkl'
     res = load(prev_file) if osp.exists(prev_file) else {}
-    if osp.exists(out_file):
-        res.update(load(out_file))
+    res.update(load_checkpoint(out_file))
 
     rank, world_size = get_rank_and_world_size()
     sheet_indices = list(range(rank, len(dataset), world_size))
@@ -89,11 +94,12 @@ def infer_data(model, model_name, work_dir, dataset, out_file, verbose=False, ap
             all_finished = False
     if all_finished:
         res = {k: res[k] for k in data_indices}
-        dump(res, out_file)
+        commit_checkpoint(res, out_file)
         return
 
-    # Data need to be inferred
+    # Data need to be inferred, each index is only inferred once
     data = data[~data['index'].isin(res)]
+    data = data[~data['index'].duplicated()]
     lt = len(data)
 
     model = supported_VLM[model_name]() if isinstance(model, str) else model
@@ -112,38 +118,66 @@ def infer_data(model, model_name, work_dir, dataset, out_file, verbose=False, ap
             assert idx in supp
         res.update(supp)
         res = {k: res[k] for k in data_indices}
-        dump(res, out_file)
+        commit_checkpoint(res, out_file)
         return model
     else:
         model.set_dump_image(dataset.dump_image)
 
-    for i in tqdm(range(lt)):
-        idx = data.iloc[i]['index']
-        if idx in res:
-            continue
+    # New responses are appended to the journal of `out_file`, so the cost of each checkpoint is constant
+    journal = JournalWriter(journal_path(out_file))
+
+    if batch_size > 1 and hasattr(model, 'generate_batch'):
+        # `data` only keeps the pending rows, so that every batch is full except the last one
+        for start in tqdm(range(0, lt, batch_size)):
+            batch = data.iloc[start: start + batch_size]
+            batch_indices, structs = list(batch['index']), []
+            for i in range(len(batch)):
+                if hasattr(model, 'use_custom_prompt') and model.use_custom_prompt(dataset_name):
+                    struct = model.build_prompt(batch.iloc[i], dataset=dataset_name)
+                else:
+                    struct = dataset.build_prompt(batch.iloc[i])
+                structs.append(struct)
+
+            responses = model.generate_batch(messages=structs, dataset=dataset_name)
+            torch.cuda.empty_cache()
+
+            for idx, response in zip(batch_indices, responses):
+                if verbose:
+                    print(response, flush=True)
+                res[idx] = response
+                journal.write(idx, response)
+            # Save a checkpoint after each batch
+            journal.sync()
+    else:
+        for i in tqdm(range(lt)):
+            idx = data.iloc[i]['index']
+            if idx in res:
+                continue
 
-        if hasattr(model, 'use_custom_prompt') and model.use_custom_prompt(dataset_name):
-            struct = model.build_prompt(data.iloc[i], dataset=dataset_name)
-        else:
-            struct = dataset.build_prompt(data.iloc[i])
+            if hasattr(model, 'use_custom_prompt') and model.use_custom_prompt(dataset_name):
+                struct = model.build_prompt(data.iloc[i], dataset=dataset_name)
+            else:
+                struct = dataset.build_prompt(data.iloc[i])
 
-        response = model.generate(message=struct, dataset=dataset_name)
-        torch.cuda.empty_cache()
+            response = model.generate(message=struct, dataset=dataset_name)
+            torch.cuda.empty_cache()
 
-        if verbose:
-            print(response, flush=True)
+            if verbose:
+                print(response, flush=True)
 
-        res[idx] = response
-        if (i + 1) % 10 == 0:
-            dump(res, out_file)
+            res[idx] = response
+            journal.write(idx, response)
 
+    journal.close()
     res = {k: res[k] for k in data_indices}
-    dump(res, out_file)
+    commit_checkpoint(res, out_file)
     return model
 
 
 # A wrapper for infer_data, do the pre & post processing
-def infer_data_job(model, work_dir, model_name, dataset, verbose=False, api_nproc=4, ignore_failed=False):
+def infer_data_job(
+    model, work_dir, model_name, dataset, verbose=False, api_nproc=4, ignore_failed=False, batch_size=1
+):
     rank, world_size = get_rank_and_world_size()
     dataset_name = dataset.dataset_name
     result_file = osp.join(work_dir, f'{model_name}_{dataset_name}.xlsx')
@@ -164,7 +198,7 @@ def infer_data_job(model, work_dir, model_name, dataset, verbose=False, api_npro
 
     model = infer_data(
         model=model, work_dir=work_dir, model_name=model_name, dataset=dataset,
-        out_file=out_file, verbose=verbose, api_nproc=api_nproc)
+        out_file=out_file, verbose=verbose, api_nproc=api_nproc, batch_size=batch_size)
     if world_size > 1:
         dist.barrier()
 
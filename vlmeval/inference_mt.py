@@ -53,11 +53,9 @@ def infer_data_api(model, work_dir, model_name, dataset, index_set=None, api_npr
     structs = [dataset.build_prompt(data.iloc[i]) for i in range(lt)]
 
     out_file = f'{work_dir}/{model_name}_{dataset_name}_supp.pkl'
-    res = {}
-    if osp.exists(out_file):
-        res = load(out_file)
-        if ignore_failed:
-            res = {k: v for k, v in res.items() if FAIL_MSG not in v}
+    res = load_checkpoint(out_file)
+    if ignore_failed:
+        res = {k: v for k, v in res.items() if FAIL_MSG not in v}
 
     structs = [s for i, s in zip(indices, structs) if i not in res]
     indices = [i for i in indices if i not in res]
@@ -67,7 +65,7 @@ def infer_data_api(model, work_dir, model_name, dataset, index_set=None, api_npr
     if len(structs):
         track_progress_rich(chat_mt, structs, nproc=api_nproc, chunksize=api_nproc, save=out_file, keys=indices)
 
-    res = load(out_file)
+    res = load_checkpoint(out_file)
     if index_set is not None:
         res = {k: v for k, v in res.items() if k in index_set}
     os.remove(out_file)
@@ -76,9 +74,7 @@ def infer_data_api(model, work_dir, model_name, dataset, index_set=None, api_npr
 
 def infer_data(model, model_name, work_dir, dataset, out_file, verbose=False, api_nproc=4):
     dataset_name = dataset.dataset_name
-    res = {}
-    if osp.exists(out_file):
-        res.update(load(out_file))
+    res = load_checkpoint(out_file)
 
     rank, world_size = get_rank_and_world_size()
     sheet_indices = list(range(rank, len(dataset), world_size))
@@ -94,7 +90,7 @@ def infer_data(model, model_name, work_dir, dataset, out_file, verbose=False, ap
             all_finished = False
     if all_finished:
         res = {k: res[k] for k in data_indices}
-        dump(res, out_file)
+        commit_checkpoint(res, out_file)
         return
 
     # Data need to be inferred
@@ -118,11 +114,13 @@ def infer_data(model, model_name, work_dir, dataset, out_file, verbose=False, ap
             assert idx in supp
         res.update(supp)
         res = {k: res[k] for k in data_indices}
-        dump(res, out_file)
+        commit_checkpoint(res, out_file)
         return model
     else:
         model.set_dump_image(dataset.dump_image)
 
+    journal = JournalWriter(journal_path(out_file))
+
     for i in tqdm(range(lt)):
         idx = data.iloc[i]['index']
         if idx in res:
@@ -140,11 +138,11 @@ def infer_data(model, model_name, work_dir, dataset, out_file, verbose=False, ap
             print(response, flush=True)
 
         res[idx] = response
-        if (i + 1) % 20 == 0:
-            dump(res, out_file)
+        journal.write(idx, response)
 
+    journal.close()
     res = {k: res[k] for k in data_indices}
-    dump(res, out_file)
+    commit_checkpoint(res, out_file)
     return model
 
 
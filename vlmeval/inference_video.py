@@ -1,8 +1,9 @@
 import torch
 import torch.distributed as dist
 from vlmeval.config import supported_VLM
-from vlmeval.utils import track_progress_rich
+from vlmeval.utils import track_progress_rich, track_progress_async
 from vlmeval.smp import *
+from vlmeval.dataset.video_base import FramePrefetcher
 
 FAIL_MSG = 'Failed to obtain answer via API.'
 
@@ -18,7 +19,7 @@ def parse_args():
 
 
 # Only API model is accepted
-def infer_data_api(model, work_dir, model_name, dataset, samples_dict={}, api_nproc=4):
+def infer_data_api(model, work_dir, model_name, dataset, samples_dict={}, api_nproc=4, prefetch_nproc=0):
     rank, world_size = get_rank_and_world_size()
     assert rank == 0 and world_size == 1
     dataset_name = dataset.dataset_name
@@ -26,6 +27,10 @@ def infer_data_api(model, work_dir, model_name, dataset, samples_dict={}, api_np
     assert getattr(model, 'is_api', False)
 
     indices = list(samples_dict.keys())
+    if prefetch_nproc > 0 and not getattr(model, 'VIDEO_LLM', False):
+        prefetcher = FramePrefetcher(dataset, [samples_dict[idx] for idx in indices], nproc=prefetch_nproc)
+        prefetcher.run()
+        prefetcher.close()
     structs = [dataset.build_prompt(samples_dict[idx], video_llm=getattr(model, 'VIDEO_LLM', False)) for idx in indices]
 
     packstr = 'pack' if getattr(dataset, 'pack', False) else 'nopack'
@@ -33,23 +38,37 @@ def infer_data_api(model, work_dir, model_name, dataset, samples_dict={}, api_np
         out_file = f'{work_dir}/{model_name}_{dataset_name}_{dataset.nframe}frame_{packstr}_supp.pkl'
     else:
         out_file = f'{work_dir}/{model_name}_{dataset_name}_{dataset.fps}fps_{packstr}_supp.pkl'
-    res = load(out_file) if osp.exists(out_file) else {}
+    res = load_checkpoint(out_file)
 
     structs = [s for i, s in zip(indices, structs) if i not in res or res[i] == FAIL_MSG]
     indices = [i for i in indices if i not in res or res[i] == FAIL_MSG]
 
-    gen_func = model.generate
     structs = [dict(message=struct, dataset=dataset_name) for struct in structs]
 
     if len(structs):
-        track_progress_rich(gen_func, structs, nproc=api_nproc, chunksize=api_nproc, save=out_file, keys=indices)
+        if getattr(model, 'ASYNC', False):
+            track_progress_async(
+                model.agenerate, structs, nproc=api_nproc, save=out_file, keys=indices, cleanup=model.aclose)
+        else:
+            track_progress_rich(
+                model.generate, structs, nproc=api_nproc, chunksize=api_nproc, save=out_file, keys=indices)
 
-    res = load(out_file)
+    res = load_checkpoint(out_file)
     return res
 
 
-def infer_data(model, model_name, work_dir, dataset, out_file, verbose=False, api_nproc=4):
-    res = load(out_file) if osp.exists(out_file) else {}
+def group_video_samples(dataset, sample_map, indices):
+    # Group the samples by (sub-dataset, video), in the order of the first sample of each group
+    groups = defaultdict(list)
+    for idx in indices:
+        line = dataset.data.iloc[sample_map[idx]]
+        groups[(line.get('SUB_DATASET', None), line['video'])].append(idx)
+    return list(groups.values())
+
+
+def infer_data(model, model_name, work_dir, dataset, out_file, verbose=False, api_nproc=4, prefetch_nproc=0,
+               group_questions=False):
+    res = load_checkpoint(out_file)
     rank, world_size = get_rank_and_world_size()
     dataset_name = dataset.dataset_name
 
@@ -59,6 +78,7 @@ def infer_data(model, model_name, work_dir, dataset, out_file, verbose=False, ap
 
     sample_indices_sub = sample_indices[rank::world_size]
     if np.all([idx in res for idx in sample_indices_sub]):
+        commit_checkpoint(res, out_file)
         return model
     sample_indices_subrem = [x for x in sample_indices_sub if x not in res]
 
@@ -73,17 +93,31 @@ def infer_data(model, model_name, work_dir, dataset, out_file, verbose=False, ap
             model_name=model_name,
             dataset=dataset,
             samples_dict={k: sample_map[k] for k in sample_indices_subrem},
-            api_nproc=api_nproc)
+            api_nproc=api_nproc,
+            prefetch_nproc=prefetch_nproc)
         for k in sample_indices_subrem:
             assert k in supp
         res.update(supp)
-        dump(res, out_file)
+        commit_checkpoint(res, out_file)
         return model
 
     assert not getattr(dataset, 'pack', False), 'Current model not supported pack mode!'
-    for i, idx in tqdm(enumerate(sample_indices_subrem)):
-        if idx in res:
-            continue
+    journal = JournalWriter(journal_path(out_file))
+    # Run the questions on the same video as a group, so that models implementing `generate_group_inner` can
+    # encode the video once and reuse it across the questions
+    groups = [[idx] for idx in sample_indices_subrem]
+    if group_questions:
+        groups = group_video_samples(dataset, sample_map, sample_indices_subrem)
+    order = [idx for group in groups for idx in group]
+    # Extract the frames of the upcoming samples in the background while the model is running
+    prefetcher = None
+    # Models with `ARRAY_INPUT` take the decoded frames in memory, prefetching is only useful with the frame cache
+    array_input = getattr(model, 'ARRAY_INPUT', False) and not getattr(model, 'VIDEO_LLM', False)
+    if prefetch_nproc > 0 and not getattr(model, 'VIDEO_LLM', False) and (not array_input or get_frame_cache()):
+        prefetcher = FramePrefetcher(dataset, [sample_map[idx] for idx in order], nproc=prefetch_nproc)
+
+    def build_struct(idx):
+        dataset_name = dataset.dataset_name
         if getattr(model, 'nframe', None) is not None and getattr(model, 'nframe', 0) > 0:
             if dataset.nframe > 0:
                 if getattr(model, 'nframe', 0) != dataset.nframe:
@@ -104,7 +138,10 @@ def infer_data(model, model_name, work_dir, dataset, out_file, verbose=False, ap
                 setattr(model, 'fps', None)
         if 'SUB_DATASET' in dataset.data.iloc[sample_map[idx]]:
             dataset_name = dataset.data.iloc[sample_map[idx]]['SUB_DATASET']
-        if hasattr(model, 'use_custom_prompt') and model.use_custom_prompt(dataset_name):
+        use_custom_prompt = hasattr(model, 'use_custom_prompt') and model.use_custom_prompt(dataset_name)
+        # Custom prompts of the model expect the paths of the frames
+        dataset.array_frames = array_input and not use_custom_prompt
+        if use_custom_prompt:
             if dataset.nframe == 0:
                 raise ValueError(f'nframe must be set for custom prompt, fps is not suitable for {model_name}')
             struct = model.build_prompt(
@@ -114,18 +151,36 @@ def infer_data(model, model_name, work_dir, dataset, out_file, verbose=False, ap
             struct = dataset.build_prompt(
                 sample_map[idx], video_llm=getattr(model, 'VIDEO_LLM', False)
             )
-        response = model.generate(message=struct, dataset=dataset_name)
+        return struct, dataset_name
+
+    i = 0
+    for group in tqdm(groups):
+        structs = []
+        for idx in group:
+            if prefetcher is not None:
+                prefetcher.wait(i)
+            i += 1
+            struct, dataset_name = build_struct(idx)
+            structs.append(struct)
+        if len(structs) > 1 and hasattr(model, 'generate_group'):
+            responses = model.generate_group(structs, dataset=dataset_name)
+        else:
+            responses = [model.generate(message=struct, dataset=dataset_name) for struct in structs]
         torch.cuda.empty_cache()
 
-        if verbose:
-            print(response, flush=True)
+        for idx, response in zip(group, responses):
+            if verbose:
+                print(response, flush=True)
 
-        res[idx] = response
-        if (i + 1) % 20 == 0:
-            dump(res, out_file)
+            res[idx] = response
+            journal.write(idx, response)
 
+    if prefetcher is not None:
+        prefetcher.close()
+    dataset.array_frames = False
+    journal.close()
     res = {k: res[k] for k in sample_indices_sub}
-    dump(res, out_file)
+    commit_checkpoint(res, out_file)
     return model
 
 
@@ -137,7 +192,9 @@ def infer_data_job_video(
         dataset,
         result_file_name,
         verbose=False,
-        api_nproc=4):
+        api_nproc=4,
+        prefetch_nproc=0,
+        group_questions=False):
 
     dataset_name = dataset.dataset_name
     rank, world_size = get_rank_and_world_size()
@@ -156,7 +213,9 @@ def infer_data_job_video(
         dataset=dataset,
         out_file=out_file,
         verbose=verbose,
-        api_nproc=api_nproc)
+        api_nproc=api_nproc,
+        prefetch_nproc=prefetch_nproc,
+        group_questions=group_questions)
 
     if world_size > 1:
         dist.barrier()
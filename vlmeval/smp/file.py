@@ -1,37 +1,271 @@
 import json
 import pickle
+import base64
 import pandas as pd
 import os
 import csv
 import hashlib
+import logging
+import struct
+import zlib
 import os.path as osp
 import time
 import numpy as np
 import validators
 import mimetypes
+import portalocker
 import multiprocessing as mp
 from .misc import toliststr
-from .vlm import decode_base64_to_image_file
+from .vlm import decode_base64_to_image_file, decode_bytes_to_image_file, read_ok
 
 
-def decode_img_omni(tup):
-    root, im, p = tup
+# The leading bytes of the image formats that can be written to the target file without re-encoding
+IMAGE_MAGIC = {
+    '.jpg': b'\xff\xd8\xff', '.jpeg': b'\xff\xd8\xff',
+    '.png': b'\x89PNG\r\n\x1a\n',
+}
+
+
+def write_image_bytes(image_data, image_path):
+    """Write the decoded image bytes to `image_path` atomically.
+
+    The bytes are written as is if the format already matches the suffix of `image_path` (JPEG / PNG), otherwise
+    the image is re-encoded with PIL.
+    """
+    root, ext = osp.splitext(image_path)
+    tmp_path = f'{root}.{os.getpid()}.tmp{ext}'
+    magic = IMAGE_MAGIC.get(ext.lower(), None)
+    raw = magic is not None and image_data.startswith(magic)
+    if raw:
+        with open(tmp_path, 'wb') as fout:
+            fout.write(image_data)
+    else:
+        decode_bytes_to_image_file(image_data, tmp_path)
+    os.replace(tmp_path, image_path)
+    return raw
+
+
+def image_store_root():
+    return osp.join(LMUDataRoot(), 'images', '.store')
+
+
+def use_image_store():
+    return os.environ.get('SHARED_IMAGE_STORE', '0') not in ['0', '', 'False']
+
+
+def link_file(src, dst):
+    # Hardlink `dst` to `src` (atomically), fall back to a symlink across file systems, and to a copy at last
+    tmp_path = f'{dst}.{os.getpid()}.link'
+    try:
+        os.link(src, tmp_path)
+    except OSError:
+        try:
+            os.symlink(osp.abspath(src), tmp_path)
+        except OSError:
+            import shutil
+            shutil.copyfile(src, tmp_path)
+    os.replace(tmp_path, dst)
+
+
+def save_image_bytes(image_data, image_path):
+    """Save the decoded image bytes to `image_path`.
+
+    If the shared image store is enabled (environment variable `SHARED_IMAGE_STORE`), the image is written once to
+    the content-addressed store `$LMUData/images/.store` (keyed by the md5 of the bytes) and `image_path` is linked
+    to it, so the same image used by different datasets is decoded and stored only once.
+
+    Returns:
+        str: The md5 of the saved file content if known (i.e., the bytes are saved as is), otherwise None.
+    """
+    if not use_image_store():
+        raw = write_image_bytes(image_data, image_path)
+        return hashlib.md5(image_data).hexdigest() if raw else None
+
+    key = hashlib.md5(image_data).hexdigest()
+    ext = osp.splitext(image_path)[1].lower()
+    blob = osp.join(image_store_root(), key[:2], key + ext)
+    raw = IMAGE_MAGIC.get(ext, None) is not None and image_data.startswith(IMAGE_MAGIC[ext])
+    if not osp.exists(blob):
+        os.makedirs(osp.dirname(blob), exist_ok=True)
+        write_image_bytes(image_data, blob)
+    link_file(blob, image_path)
+    return key if raw else None
+
+
+def image_store_report(root=None):
+    """Report the disk usage of the shared image store and the savings of deduplication.
+
+    Args:
+        root (str, optional): The image root containing the dataset image directories and `.store`.
+            Default to `$LMUData/images`.
+
+    Returns:
+        dict: The statistics.
+    """
+    root = osp.join(LMUDataRoot(), 'images') if root is None else root
+    store = osp.join(root, '.store')
+    blobs = {}
+    for dirpath, _, files in os.walk(store):
+        for f in files:
+            pth = osp.join(dirpath, f)
+            st = os.stat(pth)
+            blobs[(st.st_dev, st.st_ino)] = dict(path=osp.abspath(pth), size=st.st_size, refs=0)
+    by_path = {v['path']: v for v in blobs.values()}
+
+    datasets = {}
+    for dname in sorted(os.listdir(root)) if osp.exists(root) else []:
+        droot = osp.join(root, dname)
+        if dname == '.store' or not osp.isdir(droot):
+            continue
+        for dirpath, _, files in os.walk(droot):
+            for f in files:
+                pth = osp.join(dirpath, f)
+                if osp.islink(pth):
+                    blob = by_path.get(osp.realpath(pth), None)
+                else:
+                    st = os.stat(pth)
+                    blob = blobs.get((st.st_dev, st.st_ino), None)
+                if blob is not None:
+                    blob['refs'] += 1
+                    datasets[dname] = datasets.get(dname, 0) + 1
+
+    store_size = sum(v['size'] for v in blobs.values())
+    logical_size = sum(v['size'] * v['refs'] for v in blobs.values())
+    num_refs = sum(v['refs'] for v in blobs.values())
+    return dict(
+        blobs=len(blobs), references=num_refs, store_size=store_size, logical_size=logical_size,
+        saved_size=max(logical_size - store_size, 0), saved_decodes=max(num_refs - len(blobs), 0),
+        datasets=datasets)
+
+
+def image_target_paths(root, im, p):
     images = toliststr(im)
     paths = toliststr(p)
     if len(images) > 1 and len(paths) == 1:
         paths = [osp.splitext(p)[0] + f'_{i}' + osp.splitext(p)[1] for i in range(len(images))]
-
     assert len(images) == len(paths)
-    paths = [osp.join(root, p) for p in paths]
+    return [osp.join(root, p) for p in paths]
+
+
+def image_manifest_path(root):
+    return osp.join(root, '.manifest.journal')
+
+
+def load_image_manifest(root):
+    """Load the manifest of an image root: {relative path: (size, mtime, md5)}."""
+    pth = image_manifest_path(root)
+    return scan_journal(pth)[0] if osp.exists(pth) else {}
+
+
+def image_record(pth, content_md5=None):
+    st = os.stat(pth)
+    return (st.st_size, st.st_mtime, md5(pth) if content_md5 is None else content_md5)
+
+
+def manifest_ok(manifest, root, pth):
+    # The file is in the manifest and has not changed since recorded (checked by size and mtime)
+    rec = manifest.get(osp.relpath(pth, root), None)
+    if rec is None:
+        return False
+    try:
+        st = os.stat(pth)
+    except OSError:
+        return False
+    return (st.st_size, st.st_mtime) == tuple(rec[:2])
+
+
+class ImageManifest:
+    """The manifest of the image files under `root`, which makes the existence checks of images O(1).
+
+    The manifest records (size, mtime, md5) of each image file in a journal under `root`. It is validated against
+    the file system once when loaded (entries of changed or removed files are dropped), after that `check` does not
+    touch the file system for recorded images. Unrecorded images are validated with PIL and recorded on success.
+
+    Args:
+        root (str): The image root.
+    """
+
+    def __init__(self, root):
+        import threading
+        self.root = root
+        self.lock = threading.Lock()
+        self.journal = None
+        records = load_image_manifest(root)
+        self.records = {}
+        for name, rec in records.items():
+            if manifest_ok(records, root, osp.join(root, name)):
+                self.records[name] = rec
+
+    def check(self, pth):
+        """Return True if `pth` is a valid image file."""
+        name = osp.relpath(pth, self.root)
+        if name in self.records:
+            return True
+        if not read_ok(pth):
+            return False
+        self.add(pth)
+        return True
+
+    def add(self, pth):
+        """Record a (newly written) image file."""
+        name = osp.relpath(pth, self.root)
+        rec = image_record(pth)
+        with self.lock:
+            if self.journal is None:
+                self.journal = JournalWriter(image_manifest_path(self.root), sync_every=64)
+            self.records[name] = rec
+            self.journal.write(name, rec)
+
+    def close(self):
+        with self.lock:
+            if self.journal is not None:
+                self.journal.close()
+                self.journal = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['lock'], state['journal'] = None, None
+        return state
+
+    def __setstate__(self, state):
+        import threading
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def __del__(self):
+        if getattr(self, 'lock', None) is not None:
+            self.close()
+
+
+def decode_img_omni(tup):
+    """Decode the base64 images of a record to files under `root`.
+
+    Returns:
+        tuple(list[str], list[tuple]): The image paths, and the manifest records (relative path, (size, mtime,
+            md5)) of the image files.
+    """
+    root, im, p = tup
+    images = toliststr(im)
+    paths = image_target_paths(root, im, p)
+    records = []
     for p, im in zip(paths, images):
         if osp.exists(p):
+            records.append((osp.relpath(p, root), image_record(p)))
             continue
         if isinstance(im, str) and len(im) > 64:
-            decode_base64_to_image_file(im, p)
-    return paths
+            content_md5 = save_image_bytes(base64.b64decode(im), p)
+            records.append((osp.relpath(p, root), image_record(p, content_md5)))
+    return paths, records
 
 
 def localize_df(data, dname, nproc=32):
+    """Decode the base64 images of a dataset to `$LMUData/images/{dname}`, replace the `image` column with the
+    `image_path` column.
+
+    The decoding runs in `nproc` worker processes. Localized images are recorded in the manifest of the image root,
+    so that an interrupted localization resumes from where it stopped, and re-running it is a no-op.
+    """
+    from tqdm import tqdm
     assert 'image' in data
     indices = list(data['index'])
     indices_str = [str(x) for x in indices]
@@ -55,10 +289,24 @@ def localize_df(data, dname, nproc=32):
                 img_paths.append(f'{i}.jpg')
 
     tups = [(root, im, p) for p, im in zip(img_paths, images)]
+    ret = [image_target_paths(*tup) for tup in tups]
+    manifest = load_image_manifest(root)
+    todo = [tup for tup, paths in zip(tups, ret) if not all(manifest_ok(manifest, root, x) for x in paths)]
+
+    st, num, nbytes = time.time(), 0, 0
+    if len(todo):
+        with JournalWriter(image_manifest_path(root), sync_every=256) as journal, mp.Pool(nproc) as pool:
+            for _, records in tqdm(pool.imap_unordered(decode_img_omni, todo, chunksize=16), total=len(todo)):
+                for name, rec in records:
+                    journal.write(name, rec)
+                    nbytes += rec[0]
+                num += len(records)
+    cost = max(time.time() - st, 1e-6)
+    print(
+        f'Localized {num} images ({nbytes / 2 ** 20:.1f} MB) to {root} in {cost:.1f}s, '
+        f'{num / cost:.1f} images/s, {nbytes / 2 ** 20 / cost:.1f} MB/s. '
+        f'{len(tups) - len(todo)} records were already localized. ')
 
-    pool = mp.Pool(32)
-    ret = pool.map(decode_img_omni, tups)
-    pool.close()
     data.pop('image')
     if 'image_path' not in data:
         data['image_path'] = [x[0] if len(x) == 1 else x for x in ret]
@@ -132,10 +380,140 @@ class NumpyEncoder(json.JSONEncoder):
         return json.JSONEncoder.default(self, obj)
 
 
+# Append-only journal of (key, value) records. Each record is stored as a header of (payload length, crc32)
+# followed by the pickled payload, so that a torn record at the tail (e.g. the process was killed during
+# writing) can be detected and dropped on replay. The cost of appending a record does not depend on the
+# number of records already saved.
+JOURNAL_HEADER = struct.Struct('<II')
+
+
+def scan_journal(pth):
+    """Replay a journal file.
+
+    Args:
+        pth (str): The path of the journal file.
+
+    Returns:
+        tuple(dict, int): The replayed records (later records override earlier ones with the same key),
+            and the byte offset where the last valid record ends.
+    """
+    res, offset = {}, 0
+    with open(pth, 'rb') as fin:
+        while True:
+            header = fin.read(JOURNAL_HEADER.size)
+            if len(header) < JOURNAL_HEADER.size:
+                break
+            length, crc = JOURNAL_HEADER.unpack(header)
+            payload = fin.read(length)
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                break
+            k, v = pickle.loads(payload)
+            res[k] = v
+            offset += JOURNAL_HEADER.size + length
+    if offset < osp.getsize(pth):
+        logging.warning(f'Dropped a torn record at the tail of journal {pth} (offset {offset}). ')
+    return res, offset
+
+
+class JournalWriter:
+    """Append (key, value) records to a journal file, fsync-ed every `sync_every` records.
+
+    A journal can be shared by multiple processes (e.g., the manifest of an image root written by all ranks). Each
+    record is appended with a single unbuffered write to the file opened in append mode, under an exclusive
+    `portalocker` lock of the file, so records of different processes never interleave, and a torn tail seen under
+    the lock is left by a killed process rather than a record still being written.
+
+    Args:
+        pth (str): The path of the journal file. Will be created if not exists.
+        sync_every (int): Call fsync after every `sync_every` appended records. Default to 16.
+    """
+
+    def __init__(self, pth, sync_every=16):
+        import threading
+        self.pth = pth
+        self.sync_every = sync_every
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.fout = open(pth, 'ab', buffering=0)
+        portalocker.lock(self.fout, portalocker.LOCK_EX)
+        try:
+            # Drop the torn tail (if any) before appending new records
+            offset = scan_journal(pth)[1]
+            if os.fstat(self.fout.fileno()).st_size > offset:
+                os.ftruncate(self.fout.fileno(), offset)
+        finally:
+            portalocker.unlock(self.fout)
+
+    def write(self, key, value):
+        payload = pickle.dumps((key, value))
+        record = memoryview(JOURNAL_HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+        with self.lock:
+            portalocker.lock(self.fout, portalocker.LOCK_EX)
+            try:
+                while len(record):
+                    record = record[self.fout.write(record):]
+            finally:
+                portalocker.unlock(self.fout)
+            self.pending += 1
+            if self.pending >= self.sync_every:
+                self.sync()
+
+    def update(self, data):
+        for k, v in data.items():
+            self.write(k, v)
+
+    def sync(self):
+        os.fsync(self.fout.fileno())
+        self.pending = 0
+
+    def close(self):
+        if not self.fout.closed:
+            self.sync()
+            self.fout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def journal_path(f):
+    return f'{f}.journal'
+
+
+def load_checkpoint(f):
+    """Load the result dict checkpointed at `f`: the full dump (if exists) updated with its journal records."""
+    res = load(f) if osp.exists(f) else {}
+    if osp.exists(journal_path(f)):
+        res.update(load(journal_path(f)))
+    return res
+
+
+def commit_checkpoint(data, f):
+    """Dump the full result dict to `f` and remove the journal of `f`, which has been merged into the dump."""
+    dump(data, f)
+    if osp.exists(journal_path(f)):
+        os.remove(journal_path(f))
+
+
 # LOAD & DUMP
 def dump(data, f, **kwargs):
     def dump_pkl(data, pth, **kwargs):
-        pickle.dump(data, open(pth, 'wb'))
+        # Write to a temporary file first, so an interrupted dump never corrupts the existing file
+        tmp = f'{pth}.tmp{os.getpid()}'
+        with open(tmp, 'wb') as fout:
+            pickle.dump(data, fout)
+        os.replace(tmp, pth)
+
+    def dump_journal(data, pth, **kwargs):
+        # Rewrite (compact) the whole journal atomically
+        tmp = f'{pth}.tmp{os.getpid()}'
+        if osp.exists(tmp):
+            os.remove(tmp)
+        with JournalWriter(tmp) as writer:
+            writer.update(data)
+        os.replace(tmp, pth)
 
     def dump_json(data, pth, **kwargs):
         json.dump(data, open(pth, 'w'), indent=4, ensure_ascii=False, cls=NumpyEncoder)
@@ -154,7 +532,9 @@ def dump(data, f, **kwargs):
     def dump_tsv(data, f, quoting=csv.QUOTE_ALL):
         data.to_csv(f, sep='\t', index=False, encoding='utf-8', quoting=quoting)
 
-    handlers = dict(pkl=dump_pkl, json=dump_json, jsonl=dump_jsonl, xlsx=dump_xlsx, csv=dump_csv, tsv=dump_tsv)
+    handlers = dict(
+        pkl=dump_pkl, json=dump_json, jsonl=dump_jsonl, xlsx=dump_xlsx, csv=dump_csv, tsv=dump_tsv,
+        journal=dump_journal)
     suffix = f.split('.')[-1]
     return handlers[suffix](data, f, **kwargs)
 
@@ -183,7 +563,12 @@ def load(f, fmt=None):
     def load_tsv(f):
         return pd.read_csv(f, sep='\t')
 
-    handlers = dict(pkl=load_pkl, json=load_json, jsonl=load_jsonl, xlsx=load_xlsx, csv=load_csv, tsv=load_tsv)
+    def load_journal(f):
+        return scan_journal(f)[0]
+
+    handlers = dict(
+        pkl=load_pkl, json=load_json, jsonl=load_jsonl, xlsx=load_xlsx, csv=load_csv, tsv=load_tsv,
+        journal=load_journal)
     if fmt is not None:
         return handlers[fmt](f)
 
@@ -344,6 +729,243 @@ def parquet_to_tsv(file_path):
     data.to_csv(osp.join(pth, f'{data_name}.tsv'), sep='\t', index=False)
 
 
+COPY_BUFSIZE = 2 ** 22
+
+
+def copy_stream(src, dst_path):
+    # Copy the file object `src` to `dst_path` (atomically) with a bounded buffer
+    import shutil
+    tmp_path = f'{dst_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as fout:
+        shutil.copyfileobj(src, fout, COPY_BUFSIZE)
+    os.replace(tmp_path, dst_path)
+
+
+def concat_files(parts, dst_path):
+    # Concatenate the files in `parts` to `dst_path` (atomically) with a bounded buffer
+    import shutil
+    tmp_path = f'{dst_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as fout:
+        for part in parts:
+            with open(part, 'rb') as fin:
+                shutil.copyfileobj(fin, fout, COPY_BUFSIZE)
+    os.replace(tmp_path, dst_path)
+
+
+def extract_zip(zip_file, target_dir, flatten=False):
+    """Extract a zip archive member by member, streaming each one to disk with a bounded buffer.
+
+    Members already extracted (with the same size) are skipped, so an interrupted extraction can be resumed.
+
+    Args:
+        zip_file (str): The zip archive.
+        target_dir (str): The directory to extract to.
+        flatten (bool): Extract the members to `target_dir` by their base names. Default to False.
+
+    Returns:
+        int: The number of extracted members.
+    """
+    import zipfile
+    cnt = 0
+    with zipfile.ZipFile(zip_file, 'r') as zip_ref:
+        for info in zip_ref.infolist():
+            if info.is_dir():
+                continue
+            name = osp.basename(info.filename) if flatten else info.filename
+            # Like `ZipFile.extract`, do not write outside `target_dir`
+            parts = [x for x in name.replace('\\', '/').split('/') if x not in ['', '.', '..']]
+            if not parts:
+                continue
+            tgt = osp.join(target_dir, *parts)
+            if osp.exists(tgt) and osp.getsize(tgt) == info.file_size:
+                continue
+            os.makedirs(osp.dirname(tgt), exist_ok=True)
+            with zip_ref.open(info) as src:
+                copy_stream(src, tgt)
+            cnt += 1
+    return cnt
+
+
+def extract_zips(zip_files, target_dir, flatten=False, nproc=4):
+    """Extract multiple zip archives to `target_dir` in parallel (one archive per worker), see `extract_zip`."""
+    from concurrent.futures import ThreadPoolExecutor
+    from functools import partial
+    from tqdm import tqdm
+    if len(zip_files) == 0:
+        return 0
+    os.makedirs(target_dir, exist_ok=True)
+    func = partial(extract_zip, target_dir=target_dir, flatten=flatten)
+    # Decompression and file I/O release the GIL, threads are enough
+    with ThreadPoolExecutor(max_workers=max(min(nproc, len(zip_files)), 1)) as executor:
+        return sum(tqdm(executor.map(func, zip_files), total=len(zip_files), desc='Extracting'))
+
+
+def missing_files(paths, nproc=16):
+    """Return the paths that do not exist, checked in a thread pool (as stat calls are I/O bound)."""
+    from concurrent.futures import ThreadPoolExecutor
+    paths = list(paths)
+    if len(paths) < 64:
+        return [p for p in paths if not osp.exists(p)]
+    with ThreadPoolExecutor(max_workers=nproc) as executor:
+        flags = list(executor.map(osp.exists, paths))
+    return [p for p, flag in zip(paths, flags) if not flag]
+
+
+def dataset_state(pth, name):
+    # The size and mtime of the dataset TSV, and the mtimes of the (non-hidden) directories up to two levels
+    # under `pth`. Adding or removing a file changes the mtime of the directory containing it
+    def stat(x):
+        st = os.stat(x)
+        return [st.st_size, st.st_mtime_ns]
+
+    state = {f'{name}.tsv': stat(osp.join(pth, f'{name}.tsv'))}
+    for d1 in os.scandir(pth):
+        if d1.name.startswith('.') or not d1.is_dir():
+            continue
+        state[d1.name] = d1.stat().st_mtime_ns
+        for d2 in os.scandir(d1.path):
+            if not d2.name.startswith('.') and d2.is_dir():
+                state[f'{d1.name}/{d2.name}'] = d2.stat().st_mtime_ns
+    return state
+
+
+def verify_once(pth, name, check, key=None):
+    """Run the integrity check of a dataset, skipping it if the dataset is unchanged since its last success.
+
+    On success, a verified stamp with the dataset state (see `dataset_state`) is saved to `pth/.{name}.verified`,
+    the check is skipped in later calls as long as the state and `key` (e.g., the expected MD5 of the TSV) match.
+
+    Args:
+        pth (str): The dataset directory, containing `{name}.tsv`.
+        name (str): The dataset name.
+        check (callable): The integrity check, called as `check(pth)` and returns a bool.
+        key (str, optional): Extra key of the stamp, the check is rerun if it changes.
+
+    Returns:
+        bool: Whether the dataset passes the integrity check.
+    """
+    stamp = osp.join(pth, f'.{name}.verified')
+    if not osp.exists(osp.join(pth, f'{name}.tsv')):
+        return check(pth)
+    try:
+        with open(stamp) as f:
+            record = json.load(f)
+        if record['key'] == key and record['state'] == dataset_state(pth, name):
+            return True
+    except Exception:
+        pass
+    if not check(pth):
+        return False
+    try:
+        tmp_path = f'{stamp}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(dict(key=key, state=dataset_state(pth, name)), f)
+        os.replace(tmp_path, stamp)
+    except OSError as e:
+        logging.warning(f'Failed to save the verified stamp {stamp}: {e}')
+    return True
+
+
+def tsv_to_arrow(tsv_file, arrow_file=None):
+    """Convert a dataset TSV (with base64 images) to the columnar Arrow format.
+
+    Meta columns are stored as is, the `image` column is stored as list<binary> of the decoded image bytes. A row
+    whose image refers to another row (the question index stored in the `image` field) stores null in `image` and
+    the referred index in `image_ref`. The file is an uncompressed Arrow IPC file, so it can be memory-mapped and
+    all ranks share the page cache instead of holding private copies of the images.
+
+    Args:
+        tsv_file (str): The dataset TSV.
+        arrow_file (str, optional): The output file. Default to the TSV path with the suffix `.arrow`.
+
+    Returns:
+        str: The path of the Arrow file.
+    """
+    import pyarrow as pa
+    if arrow_file is None:
+        arrow_file = osp.splitext(tsv_file)[0] + '.arrow'
+    data = load(tsv_file)
+    assert 'image' in data, f'{tsv_file} does not have the `image` column'
+    indices = [str(x) for x in data['index']]
+
+    images, refs = [], []
+    for img in data['image']:
+        if not isinstance(img, str) and pd.isna(img):
+            images.append(None)
+            refs.append(None)
+        elif isinstance(img, str) and len(img) <= 64:
+            images.append(None)
+            refs.append(img)
+        else:
+            images.append([base64.b64decode(x) for x in toliststr(img)])
+            refs.append(None)
+
+    meta = data.drop(columns=['image'])
+    # Columns with mixed types (e.g., numbers and strings) can not be converted to arrow arrays directly
+    for col in meta.columns:
+        if meta[col].dtype == object:
+            meta[col] = [x if x is None or (isinstance(x, float) and np.isnan(x)) else str(x) for x in meta[col]]
+    meta['index'] = indices
+    table = pa.Table.from_pandas(meta, preserve_index=False)
+    table = table.append_column('image', pa.array(images, type=pa.list_(pa.binary())))
+    table = table.append_column('image_ref', pa.array(refs, type=pa.string()))
+
+    tmp_file = arrow_file + '.tmp'
+    with pa.OSFile(tmp_file, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_file, arrow_file)
+    return arrow_file
+
+
+class ArrowImageStore:
+    """Read-only access to the images of a dataset Arrow file (created by `tsv_to_arrow`).
+
+    The file is memory-mapped, so reading the images of a row only touches the pages of that row.
+
+    Args:
+        pth (str): The path of the Arrow file.
+    """
+
+    def __init__(self, pth):
+        self.pth = pth
+        self._table = None
+        table = self.table
+        indices = table.column('index').to_pylist()
+        refs = table.column('image_ref').to_pylist()
+        rows = {x: i for i, x in enumerate(indices)}
+        # index -> the row holding the images of the question
+        self.rows = {x: rows[r] if r is not None else i for i, (x, r) in enumerate(zip(indices, refs))}
+
+    @property
+    def table(self):
+        if self._table is None:
+            import pyarrow as pa
+            self._table = pa.ipc.open_file(pa.memory_map(self.pth, 'r')).read_all()
+        return self._table
+
+    def __getstate__(self):
+        # Re-open the memory map after unpickling (e.g., in another process)
+        state = self.__dict__.copy()
+        state['_table'] = None
+        return state
+
+    def meta(self):
+        """Return the meta columns (all columns except the images) as a DataFrame."""
+        return self.table.drop(['image', 'image_ref']).to_pandas()
+
+    def has_image(self):
+        """Return a boolean mask of the rows with images (own or referred)."""
+        import pyarrow.compute as pc
+        table = self.table
+        mask = pc.or_(pc.is_valid(table.column('image')), pc.is_valid(table.column('image_ref')))
+        return np.array(mask.to_pylist(), dtype=bool)
+
+    def get(self, index):
+        """Return the list of image bytes of the question `index`."""
+        return self.table.column('image')[self.rows[str(index)]].as_py()
+
+
 def fetch_aux_files(eval_file): 
     file_root = osp.dirname(eval_file)
     file_name = osp.basename(eval_file)
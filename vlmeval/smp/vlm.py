@@ -8,6 +8,8 @@ import os.path as osp
 import base64
 from PIL import Image
 import sys
+import threading
+from collections import OrderedDict
 
 Image.MAX_IMAGE_PIXELS = 1e9
 
@@ -99,7 +101,10 @@ def encode_image_file_to_base64(image_path, target_size=-1):
 
 
 def decode_base64_to_image(base64_string, target_size=-1):
-    image_data = base64.b64decode(base64_string)
+    return decode_bytes_to_image(base64.b64decode(base64_string), target_size=target_size)
+
+
+def decode_bytes_to_image(image_data, target_size=-1):
     image = Image.open(io.BytesIO(image_data))
     if image.mode in ('RGBA', 'P'):
         image = image.convert('RGB')
@@ -113,6 +118,24 @@ def decode_base64_to_image_file(base64_string, image_path, target_size=-1):
     image.save(image_path)
 
 
+def decode_bytes_to_image_file(image_data, image_path, target_size=-1):
+    image = decode_bytes_to_image(image_data, target_size=target_size)
+    image.save(image_path)
+
+
+def dump_image_array(arr, root=None):
+    """Save an in-memory image (np.ndarray, HWC, RGB) as a JPEG file named by its content hash, return the path."""
+    import hashlib
+    import tempfile
+    root = osp.join(tempfile.gettempdir(), 'vlmeval_arrays') if root is None else root
+    os.makedirs(root, exist_ok=True)
+    arr = np.ascontiguousarray(arr)
+    pth = osp.join(root, hashlib.md5(arr.tobytes()).hexdigest() + '.jpg')
+    if not osp.exists(pth):
+        Image.fromarray(arr).save(pth)
+    return pth
+
+
 def build_option_str(option_dict):
     s = 'There are several options: \n'
     for c, content in option_dict.items():
@@ -137,6 +160,9 @@ def read_ok(img_path):
 
 
 def gpt_key_set():
+    # A local judge (`LOCAL_JUDGE`) needs no API key
+    if os.environ.get('LOCAL_JUDGE', None):
+        return True
     openai_key = os.environ.get('OPENAI_API_KEY', None)
     return isinstance(openai_key, str) and openai_key.startswith('sk-')
 
@@ -144,3 +170,178 @@ def gpt_key_set():
 def apiok(wrapper):
     s = wrapper.generate('Hello!')
     return wrapper.fail_msg not in s
+
+
+# The LRU cache of open decord video readers, questions on the same video reuse the reader
+VIDEO_READER_CACHE_SIZE = 4
+VIDEO_READERS = OrderedDict()
+VIDEO_READERS_LOCK = threading.Lock()
+
+
+def get_video_reader(vid_path, width=-1, height=-1, num_threads=0):
+    """Get a decord VideoReader of `vid_path` from the LRU cache of open readers.
+
+    Args:
+        vid_path (str): The path of the video.
+        width (int): Decode the frames to this width, -1 to keep the original width. Default to -1.
+        height (int): Decode the frames to this height, -1 to keep the original height. Default to -1.
+        num_threads (int): The number of decoding threads, 0 for auto. Default to 0.
+
+    Returns:
+        decord.VideoReader: The video reader.
+    """
+    import decord
+    key = (vid_path, width, height, num_threads)
+    with VIDEO_READERS_LOCK:
+        if key in VIDEO_READERS:
+            VIDEO_READERS.move_to_end(key)
+            return VIDEO_READERS[key]
+        vid = decord.VideoReader(vid_path, width=width, height=height, num_threads=num_threads)
+        VIDEO_READERS[key] = vid
+        while len(VIDEO_READERS) > VIDEO_READER_CACHE_SIZE:
+            VIDEO_READERS.popitem(last=False)
+        return vid
+
+
+def read_video_frames(vid, indices, chunk_size=32):
+    """Read the frames at `indices` with batched decoding (`get_batch`) in the sorted order, which avoids repeated
+    seeking compared with reading the frames one by one.
+
+    Args:
+        vid (decord.VideoReader): The video reader.
+        indices (list[int]): The frame indices, can be unsorted or duplicated.
+        chunk_size (int): The max number of frames decoded in one batch. Default to 32.
+
+    Returns:
+        list[np.ndarray]: The frames (HWC, RGB), in the order of `indices`.
+    """
+    indices = [int(i) for i in indices]
+    uniq = sorted(set(indices))
+    frames = {}
+    for i in range(0, len(uniq), chunk_size):
+        chunk = uniq[i: i + chunk_size]
+        frames.update(zip(chunk, vid.get_batch(chunk).asnumpy()))
+    return [frames[i] for i in indices]
+
+
+def video_fingerprint(vid_path, chunk=2 ** 20):
+    """A fast fingerprint of the video content: sha1 of the size, the first and the last `chunk` bytes."""
+    import hashlib
+    size = osp.getsize(vid_path)
+    sha = hashlib.sha1(str(size).encode())
+    with open(vid_path, 'rb') as fin:
+        sha.update(fin.read(chunk))
+        if size > chunk:
+            fin.seek(max(size - chunk, chunk))
+            sha.update(fin.read(chunk))
+    return sha.hexdigest()
+
+
+class FrameCache:
+    """A cache of sampled video frames, which packs the frames of one (video, sampling) combination into a single
+    uncompressed zip file instead of one file per frame.
+
+    The pack is keyed by the content fingerprint of the video, the sampled frame indices and the decode size, so it
+    is shared by all datasets sampling the same frames from the same video (no matter where the video file is).
+    Packs are written atomically (temp file + rename). Frames can be read zero-copy from the memory-mapped pack
+    (`read`), or extracted to a temporary directory for models that take image paths (`extract`).
+
+    Args:
+        root (str): The directory of the packs.
+        tmp_root (str, optional): The directory of the extracted frames. Default to `{tempdir}/vlmeval_frames`.
+        max_extracted (int): Keep at most `max_extracted` extracted packs in `tmp_root`. Default to 512.
+    """
+
+    def __init__(self, root, tmp_root=None, max_extracted=512):
+        import tempfile
+        self.root = root
+        self.tmp_root = osp.join(tempfile.gettempdir(), 'vlmeval_frames') if tmp_root is None else tmp_root
+        self.max_extracted = max_extracted
+        self.fingerprints = {}
+        os.makedirs(self.root, exist_ok=True)
+        os.makedirs(self.tmp_root, exist_ok=True)
+
+    def key(self, vid_path, indices, frame_size=(-1, -1)):
+        import hashlib
+        st = os.stat(vid_path)
+        stamp = (vid_path, st.st_size, st.st_mtime)
+        if stamp not in self.fingerprints:
+            self.fingerprints[stamp] = video_fingerprint(vid_path)
+        policy = '{}x{}:'.format(*frame_size) + ','.join(str(int(i)) for i in indices)
+        return hashlib.sha1(f'{self.fingerprints[stamp]}|{policy}'.encode()).hexdigest()
+
+    def pack_path(self, key):
+        return osp.join(self.root, key[:2], f'{key}.zip')
+
+    def exists(self, key):
+        return osp.exists(self.pack_path(key))
+
+    def put(self, key, frames):
+        """Encode the frames (np.ndarray or PIL.Image) as JPEG and write them to the pack of `key`."""
+        import zipfile
+        pth = self.pack_path(key)
+        os.makedirs(osp.dirname(pth), exist_ok=True)
+        tmp_path = f'{pth}.{os.getpid()}.tmp'
+        with zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_STORED) as zout:
+            for i, frame in enumerate(frames):
+                im = Image.fromarray(frame) if isinstance(frame, np.ndarray) else frame
+                buf = io.BytesIO()
+                im.save(buf, format='JPEG')
+                zout.writestr(f'{i}.jpg', buf.getvalue())
+        os.replace(tmp_path, pth)
+
+    def read(self, key):
+        """Return the JPEG bytes of the frames in the pack of `key`, as memoryviews of the memory-mapped file."""
+        import mmap
+        import struct
+        import zipfile
+        pth = self.pack_path(key)
+        with zipfile.ZipFile(pth) as zin:
+            infos = sorted(zin.infolist(), key=lambda x: int(x.filename.split('.')[0]))
+        with open(pth, 'rb') as fin:
+            buf = memoryview(mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ))
+        frames = []
+        for info in infos:
+            # The local file header is 30 bytes, followed by the file name and the extra field
+            name_len, extra_len = struct.unpack('<HH', buf[info.header_offset + 26: info.header_offset + 30])
+            start = info.header_offset + 30 + name_len + extra_len
+            frames.append(buf[start: start + info.file_size])
+        return frames
+
+    def extract(self, key, names):
+        """Extract the frames of `key` to a temporary directory with the file names `names`, return the paths."""
+        import shutil
+        tgt_dir = osp.join(self.tmp_root, key)
+        paths = [osp.join(tgt_dir, x) for x in names]
+        if not all(osp.exists(p) for p in paths):
+            os.makedirs(tgt_dir, exist_ok=True)
+            for data, pth in zip(self.read(key), paths):
+                tmp_path = f'{pth}.{os.getpid()}.tmp'
+                with open(tmp_path, 'wb') as fout:
+                    fout.write(data)
+                os.replace(tmp_path, pth)
+            # Remove the least recently extracted packs
+            dirs = [osp.join(self.tmp_root, x) for x in os.listdir(self.tmp_root)]
+            if len(dirs) > self.max_extracted:
+                dirs.sort(key=lambda x: osp.getmtime(x))
+                for x in dirs[:len(dirs) - self.max_extracted]:
+                    if x != tgt_dir:
+                        shutil.rmtree(x, ignore_errors=True)
+        return paths
+
+
+FRAME_CACHES = {}
+
+
+def get_frame_cache():
+    """Get the frame cache set by the environment variable `FRAME_CACHE` ('1' for `$LMUData/frame_cache`, or a
+    directory), None if not set. The directory of the extracted frames can be set by `FRAME_CACHE_TMP`."""
+    root = os.environ.get('FRAME_CACHE', None)
+    if root in [None, '', '0', 'False']:
+        return None
+    if root in ['1', 'True']:
+        from .file import LMUDataRoot
+        root = osp.join(LMUDataRoot(), 'frame_cache')
+    if root not in FRAME_CACHES:
+        FRAME_CACHES[root] = FrameCache(root, tmp_root=os.environ.get('FRAME_CACHE_TMP', None))
+    return FRAME_CACHES[root]
@@ -5,7 +5,9 @@ from vlmeval.config import *
 from vlmeval.smp import *
 
 # Define valid modes
-MODES = ('dlist', 'mlist', 'missing', 'circular', 'localize', 'check', 'run', 'eval', 'merge_pkl', 'scan')
+MODES = (
+    'dlist', 'mlist', 'missing', 'circular', 'localize', 'check', 'run', 'eval', 'merge_pkl', 'scan', 'to_arrow',
+    'image_store', 'prefetch_frames')
 
 CLI_HELP_MSG = \
     f"""
@@ -38,6 +40,12 @@ CLI_HELP_MSG = \
             vlmutil merge_pkl [pkl_dir] [world_size]
         10. Scan evaluation results and detect api failure
             vlmutil scan --model [model_list.txt or model_names] --data [dataset_names] --root [root_dir]
+        11. Convert the dataset tsv to the columnar arrow format (used when ARROW_DATASET=1):
+            vlmutil to_arrow input.tsv
+        12. Report the savings of the shared image store (used when SHARED_IMAGE_STORE=1):
+            vlmutil image_store [image_root]
+        13. Extract the frames of video datasets ahead of inference (sharded by rank if launched with torchrun):
+            vlmutil prefetch_frames [dataset_names] --nproc 8
     GitHub: https://github.com/open-compass/VLMEvalKit
     """  # noqa: E501
 
@@ -422,6 +430,27 @@ def parse_args_scan():
     return args, unknownargs
 
 
+def parse_args_prefetch():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('cmd', type=str)
+    parser.add_argument('data', type=str, nargs='+')
+    parser.add_argument('--nproc', type=int, default=8)
+    args = parser.parse_args()
+    return args
+
+
+def PREFETCH_FRAMES(dataset_name, nproc=8):
+    from vlmeval.dataset import build_dataset
+    from vlmeval.dataset.video_base import FramePrefetcher
+    dataset = build_dataset(dataset_name)
+    assert dataset is not None and dataset.MODALITY == 'VIDEO', f'{dataset_name} is not a video dataset'
+    rank, world_size = get_rank_and_world_size()
+    samples = list(dataset.videos) if getattr(dataset, 'pack', False) else list(range(len(dataset.data)))
+    prefetcher = FramePrefetcher(dataset, samples[rank::world_size], nproc=nproc)
+    prefetcher.run()
+    prefetcher.close()
+
+
 def MERGE_PKL(pkl_dir, world_size=1):
     prefs = []
     for ws in list(range(1, 9)):
@@ -526,6 +555,22 @@ def cli():
     elif args[0].lower() == 'localize':
         assert len(args) >= 2
         LOCALIZE(args[1])
+    elif args[0].lower() == 'to_arrow':
+        assert len(args) >= 2
+        for fname in args[1:]:
+            print(f'The arrow version of data file is {tsv_to_arrow(fname)}')
+    elif args[0].lower() == 'image_store':
+        stats = image_store_report(args[1] if len(args) > 1 else None)
+        GB = 2 ** 30
+        print(f"Shared image store: {stats['blobs']} images ({stats['store_size'] / GB:.2f} GB) referenced by "
+              f"{stats['references']} dataset images ({stats['logical_size'] / GB:.2f} GB). ")
+        print(f"Saved {stats['saved_size'] / GB:.2f} GB of disk and {stats['saved_decodes']} image decodes. ")
+        for dname, num in stats['datasets'].items():
+            print(f'    {dname}: {num} images')
+    elif args[0].lower() in ['prefetch_frames', 'prefetch-frames']:
+        args = parse_args_prefetch()
+        for dataset_name in args.data:
+            PREFETCH_FRAMES(dataset_name, nproc=args.nproc)
     elif args[0].lower() == 'check':
         assert len(args) >= 2
         model_list = args[1:]
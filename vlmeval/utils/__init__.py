@@ -1,7 +1,7 @@
-from .matching_util import can_infer, can_infer_option, can_infer_text
-from .mp_util import track_progress_rich
+from .matching_util import can_infer, can_infer_option, can_infer_text, can_infer_batch
+from .mp_util import track_progress_rich, track_progress_async
 
 
 __all__ = [
-    'can_infer', 'can_infer_option', 'can_infer_text', 'track_progress_rich',
+    'can_infer', 'can_infer_option', 'can_infer_text', 'can_infer_batch', 'track_progress_rich', 'track_progress_async',
 ]
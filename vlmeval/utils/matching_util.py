@@ -1,21 +1,27 @@
+import re
 import string
 import copy as cp
 import os
 from ..smp import *
 
+FAIL_MSG = 'Failed to obtain answer via API'
+REJECT_TO_ANSWER = [
+    "Sorry, I can't help with images of people yet.",
+    "I can't process this file.",
+    "I'm sorry, but without the image provided",
+    'Cannot determine the answer'
+]
+# The punctuations replaced by spaces before splitting the answer into tokens
+OPTION_PUNCTS = '.()[],:;!*#{}'
+
 
 def can_infer_option(answer, choices):
     verbose = os.environ.get('VERBOSE', 0)
     # Choices is a dictionary
-    if 'Failed to obtain answer via API' in answer:
+    if FAIL_MSG in answer:
         return False
 
-    reject_to_answer = [
-        "Sorry, I can't help with images of people yet.",
-        "I can't process this file.",
-        "I'm sorry, but without the image provided",
-        'Cannot determine the answer'
-    ]
+    reject_to_answer = REJECT_TO_ANSWER
     for err in reject_to_answer:
         if err in answer:
             return 'Z'
@@ -28,7 +34,7 @@ def can_infer_option(answer, choices):
         return cnt
 
     answer_mod = cp.copy(answer)
-    chars = '.()[],:;!*#{}'
+    chars = OPTION_PUNCTS
     for c in chars:
         answer_mod = answer_mod.replace(c, ' ')
 
@@ -67,3 +73,73 @@ def can_infer(answer, choices):
     answer = str(answer)
     copt = can_infer_option(answer, choices)
     return copt if copt else can_infer_text(answer, choices)
+
+
+def can_infer_batch(answers, options):
+    """The vectorized `can_infer` of many answers, with the same outputs as
+    `[can_infer(answer, choices) for answer, choices in ...]` (but the options are not lowercased in place).
+
+    The option letters are matched with one regex pass over the whole column per letter, and the option texts are
+    only matched for the answers without a matched letter.
+
+    Args:
+        answers (list | pd.Series): The answers (predictions).
+        options (pd.DataFrame): The options of the answers (aligned by position), in the columns named by the option
+            letters ('A', 'B', ...), NaN if the option does not exist. Other columns are ignored.
+
+    Returns:
+        list: The inferred option letter, 'Z', or False for each answer.
+    """
+    answers = pd.Series([str(x) for x in answers], dtype=object)
+    assert len(answers) == len(options)
+    if len(answers) == 0:
+        return []
+    letters = [ch for ch in string.ascii_uppercase if ch in options]
+    exists = {ch: options[ch].notna().to_numpy() for ch in letters}
+    verbose = os.environ.get('VERBOSE', 0)
+
+    failed = answers.str.contains(FAIL_MSG, regex=False).to_numpy()
+    rejected = answers.str.contains('|'.join(re.escape(x) for x in REJECT_TO_ANSWER), regex=True).to_numpy()
+    rejected &= ~failed
+    answers_mod = answers.str.replace('[' + re.escape(OPTION_PUNCTS) + ']', ' ', regex=True)
+
+    def has_token(ch):
+        # `ch in answer_mod.split()`
+        return answers_mod.str.contains(rf'(?:^|\s){ch}(?:\s|$)', regex=True).to_numpy()
+
+    tokens = {ch: has_token(ch) for ch in set(letters) | {'Z'}}
+    count = np.zeros(len(answers), dtype=np.int64)
+    for ch in letters:
+        count += tokens[ch] & exists[ch]
+
+    ret = [False] * len(answers)
+    for i in np.nonzero(rejected)[0]:
+        ret[i] = 'Z'
+    matched = (count == 1) & ~failed & ~rejected
+    for ch in letters:
+        for i in np.nonzero(matched & tokens[ch] & exists[ch])[0]:
+            ret[i] = ch
+    for i in np.nonzero((count == 0) & tokens['Z'] & ~failed & ~rejected)[0]:
+        ret[i] = 'Z'
+    if verbose:
+        # 'A' might be a quantifier, these answers are matched one by one to keep the log of `can_infer_option`
+        ambiguous = matched & has_token('A') & (answers_mod.str.split().str.len().to_numpy() > 3)
+        for i in np.nonzero(ambiguous)[0]:
+            ret[i] = can_infer_option(answers[i], {ch: None for ch in letters if exists[ch][i]})
+
+    # Match the option texts for the remaining answers, the same as `can_infer_text`
+    remain = [i for i, x in enumerate(ret) if not x]
+    if len(remain):
+        lowered = answers.iloc[remain].str.lower().tolist()
+        hits = np.zeros(len(remain), dtype=np.int64)
+        first = [False] * len(remain)
+        for ch in letters:
+            col, exist = options[ch].iloc[remain].tolist(), exists[ch][remain]
+            for j, (x, e, answer) in enumerate(zip(col, exist, lowered)):
+                if e and str(x).lower() in answer:
+                    hits[j] += 1
+                    first[j] = first[j] or ch
+        for j, i in enumerate(remain):
+            if hits[j] == 1:
+                ret[i] = first[j]
+    return ret
@@ -8,7 +8,13 @@ from rich.text import Text
 import os.path as osp
 import time
 import portalocker
-from ..smp import load, dump
+from ..smp import load, dump, JournalWriter, journal_path, load_checkpoint, commit_checkpoint
+from .matching_util import FAIL_MSG
+
+
+def finished_result(value):
+    """The default `skip` predicate of the checkpointed results: all results except the failed API responses."""
+    return not (isinstance(value, str) and FAIL_MSG in value)
 
 
 def track_progress_rich(
@@ -17,9 +23,34 @@ def track_progress_rich(
         nproc: int = 1,
         save=None,
         keys=None,
+        max_pending: int = None,
+        checkpoint_every: int = 16,
+        checkpoint_interval: float = None,
+        skip: Callable = finished_result,
         **kwargs) -> list:
+    """Run `func` over `tasks` with a thread pool and track the progress.
 
-    from concurrent.futures import ThreadPoolExecutor
+    Args:
+        func (Callable): The function to call, each task is passed as positional args (tuple / list)
+            or keyword args (dict).
+        tasks (Iterable): The tasks. Should be sized.
+        nproc (int): The number of worker threads.
+        save (str, optional): The checkpoint file of the result dict. Finished results are journaled and the
+            checkpoint is resumed from on the next call: the tasks whose checkpointed results (including those in
+            the journal) satisfy `skip` are not run again, their checkpointed results are returned.
+        keys (list, optional): The keys of tasks in the result dict. Required for checkpointing.
+        max_pending (int, optional): The maximum number of submitted but unfinished tasks, tasks are submitted
+            lazily to keep the memory bounded. Default to 4 * nproc.
+        checkpoint_every (int): Sync the journal to disk every `checkpoint_every` finished records. Default to 16.
+        checkpoint_interval (float, optional): Also sync the journal if `checkpoint_interval` seconds have passed
+            since the last sync.
+        skip (Callable, optional): Whether a checkpointed result is final. The failed API responses are run again
+            by default. None to run all tasks.
+
+    Returns:
+        list: The results of the tasks, in the same order as `tasks`.
+    """
+    from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
     from tqdm import tqdm
     if save is not None:
         assert osp.exists(osp.dirname(save)) or osp.dirname(save) == ''
@@ -33,40 +64,149 @@ def track_progress_rich(
         raise TypeError(
             f'tasks must be an iterable object, but got {type(tasks)}')
     assert nproc > 0, 'nproc must be a positive number'
-    res = load(save) if save is not None else {}
+    max_pending = nproc * 4 if max_pending is None else max_pending
+    assert max_pending >= nproc, 'max_pending should not be less than nproc'
+    res = load_checkpoint(save) if save is not None else {}
+    # Finished results are appended to the journal of `save`, and merged into `save` at the end
+    journal = JournalWriter(journal_path(save), sync_every=checkpoint_every) if save is not None else None
+    last_sync = time.time()
     results = [None for _ in range(len(tasks))]
+    # Resume: the tasks finished before (e.g., by a crashed run) are not run again
+    finished = []
+    if save is not None and keys is not None and skip is not None:
+        finished = [i for i, k in enumerate(keys) if k in res and skip(res[k])]
+    for i in finished:
+        results[i] = res[keys[i]]
+    finished = set(finished)
+
+    def submit(executor, inputs):
+        if not isinstance(inputs, (tuple, list, dict)):
+            inputs = (inputs, )
+        if isinstance(inputs, dict):
+            return executor.submit(func, **inputs)
+        return executor.submit(func, *inputs)
 
+    pbar = tqdm(total=len(tasks), initial=len(finished))
     with ThreadPoolExecutor(max_workers=nproc) as executor:
-        futures = []
+        task_iter = ((i, x) for i, x in enumerate(tasks) if i not in finished)
+        pending = {}
+        exhausted = False
+        while True:
+            # Keep at most `max_pending` tasks in flight
+            while not exhausted and len(pending) < max_pending:
+                try:
+                    idx, inputs = next(task_iter)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending[submit(executor, inputs)] = idx
+            if len(pending) == 0:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                idx = pending.pop(future)
+                results[idx] = future.result()
+                if keys is not None:
+                    res[keys[idx]] = results[idx]
+                    if journal is not None:
+                        journal.write(keys[idx], results[idx])
+            pbar.update(len(done))
+            if journal is not None and checkpoint_interval is not None and \
+                    time.time() - last_sync >= checkpoint_interval:
+                journal.sync()
+                last_sync = time.time()
+    pbar.close()
+
+    if save is not None:
+        journal.close()
+        commit_checkpoint(res, save)
+    return results
+
+
+def track_progress_async(
+        func: Callable,
+        tasks: Iterable = tuple(),
+        nproc: int = 1,
+        save=None,
+        keys=None,
+        cleanup: Callable = None,
+        checkpoint_every: int = 16,
+        skip: Callable = finished_result,
+        **kwargs) -> list:
+    """The asyncio counterpart of `track_progress_rich`, `func` should be a coroutine function.
 
-        for inputs in tasks:
+    All tasks are driven by a single event loop, at most `nproc` of them are in flight at the same time. Since an
+    in-flight task only costs a coroutine (rather than a thread), `nproc` can be set to hundreds or thousands for
+    HTTP-bound workloads.
+
+    Args:
+        func (Callable): The coroutine function to call, each task is passed as positional args (tuple / list)
+            or keyword args (dict).
+        tasks (Iterable): The tasks. Should be sized.
+        nproc (int): The maximum number of concurrent tasks.
+        save (str, optional): The checkpoint file of the result dict, see `track_progress_rich`.
+        keys (list, optional): The keys of tasks in the result dict. Required for checkpointing.
+        cleanup (Callable, optional): A coroutine function called (with no args) before the event loop is closed,
+            e.g., to close the HTTP client bound to the loop.
+        checkpoint_every (int): Sync the journal to disk every `checkpoint_every` finished records. Default to 16.
+        skip (Callable, optional): Whether a checkpointed result is final, see `track_progress_rich`.
+
+    Returns:
+        list: The results of the tasks, in the same order as `tasks`.
+    """
+    import asyncio
+    from tqdm import tqdm
+    if save is not None:
+        assert osp.exists(osp.dirname(save)) or osp.dirname(save) == ''
+        if not osp.exists(save):
+            dump({}, save)
+    if keys is not None:
+        assert len(keys) == len(tasks)
+    if not callable(func):
+        raise TypeError('func must be a callable object')
+    assert nproc > 0, 'nproc must be a positive number'
+    res = load_checkpoint(save) if save is not None else {}
+    journal = JournalWriter(journal_path(save), sync_every=checkpoint_every) if save is not None else None
+    results = [None for _ in range(len(tasks))]
+    finished = []
+    if save is not None and keys is not None and skip is not None:
+        finished = [i for i, k in enumerate(keys) if k in res and skip(res[k])]
+    for i in finished:
+        results[i] = res[keys[i]]
+    finished = set(finished)
+    pbar = tqdm(total=len(tasks), initial=len(finished))
+
+    async def worker(task_iter):
+        # Each worker pulls the next task once the previous one is finished, which bounds the concurrency
+        for idx, inputs in task_iter:
             if not isinstance(inputs, (tuple, list, dict)):
                 inputs = (inputs, )
             if isinstance(inputs, dict):
-                future = executor.submit(func, **inputs)
+                results[idx] = await func(**inputs)
             else:
-                future = executor.submit(func, *inputs)
-            futures.append(future)
-
-        unfinished = set(range(len(tasks)))
-        pbar = tqdm(total=len(unfinished))
-        while len(unfinished):
-            new_finished = set()
-            for idx in unfinished:
-                if futures[idx].done():
-                    results[idx] = futures[idx].result()
-                    new_finished.add(idx)
-                    if keys is not None:
-                        res[keys[idx]] = results[idx]
-            if len(new_finished):
-                if save is not None:
-                    dump(res, save)
-                pbar.update(len(new_finished))
-                for k in new_finished:
-                    unfinished.remove(k)
-            time.sleep(0.1)
+                results[idx] = await func(*inputs)
+            if keys is not None:
+                res[keys[idx]] = results[idx]
+                if journal is not None:
+                    journal.write(keys[idx], results[idx])
+            pbar.update(1)
+
+    async def main():
+        task_iter = ((i, x) for i, x in enumerate(tasks) if i not in finished)
+        try:
+            await asyncio.gather(*[worker(task_iter) for _ in range(min(nproc, max(len(tasks) - len(finished), 1)))])
+        finally:
+            if cleanup is not None:
+                await cleanup()
+
+    try:
+        asyncio.run(main())
+    finally:
         pbar.close()
+        if journal is not None:
+            journal.close()
 
     if save is not None:
-        dump(res, save)
+        commit_checkpoint(res, save)
     return results
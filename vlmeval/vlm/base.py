@@ -6,6 +6,8 @@ from abc import abstractmethod
 class BaseModel:
 
     INTERLEAVE = False
+    # Whether the model can take in-memory images (np.ndarray) as the value of image items
+    ARRAY_INPUT = False
     allowed_types = ['text', 'image', 'video']
 
     def __init__(self):
@@ -87,6 +89,9 @@ class BaseModel:
         elif self.check_content(inputs) == 'listdict':
             for item in inputs:
                 assert 'type' in item and 'value' in item
+                if item['type'] == 'image_array':
+                    self.preproc_image_array(item)
+                    continue
                 mime, s = parse_file(item['value'])
                 if mime is None:
                     assert item['type'] == 'text'
@@ -97,6 +102,14 @@ class BaseModel:
         else:
             return None
 
+    def preproc_image_array(self, item):
+        """Convert an in-memory image item (`type='image_array'`, the value is an np.ndarray) to an image item in place.
+        Models with `ARRAY_INPUT` take the array as the value directly, otherwise it is saved to a JPEG file.
+        """
+        if not self.ARRAY_INPUT:
+            item['value'] = dump_image_array(item['value'])
+        item['type'] = 'image'
+
     def generate(self, message, dataset=None):
         """Generate the output message.
 
@@ -114,6 +127,119 @@ class BaseModel:
             assert item['type'] in self.allowed_types, f'Invalid input type: {item["type"]}'
         return self.generate_inner(message, dataset)
 
+    def generate_batch_inner(self, messages, dataset=None):
+        """Generate the outputs for a batch of preprocessed messages. Models that support batched inference should
+        override this method. The default implementation falls back to calling `generate_inner` one by one.
+        """
+        return [self.generate_inner(message, dataset) for message in messages]
+
+    def generate_batch(self, messages, dataset=None):
+        """Generate the output messages for a batch of inputs.
+
+        Args:
+            messages (list[list[dict]]): The input messages, each one is a valid input of `generate`.
+            dataset (str, optional): The name of the dataset. Defaults to None.
+
+        Returns:
+            list[str]: The generated messages, in the same order as the inputs.
+        """
+        processed = [self.preproc_message(message) for message in messages]
+        if len(processed) == 1:
+            return [self.generate_inner(processed[0], dataset)]
+        responses = self.generate_batch_inner(processed, dataset)
+        assert len(responses) == len(processed)
+        return responses
+
+    def preproc_message(self, message):
+        assert self.check_content(message) in ['str', 'dict', 'liststr', 'listdict'], f'Invalid input type: {message}'
+        message = self.preproc_content(message)
+        assert message is not None and self.check_content(message) == 'listdict'
+        for item in message:
+            assert item['type'] in self.allowed_types, f'Invalid input type: {item["type"]}'
+        return message
+
+    def generate_group_inner(self, messages, dataset=None):
+        """Generate the outputs for a group of preprocessed messages sharing the same visual inputs (e.g., the
+        questions on the same video). Models that can encode the shared prefix once and reuse its KV cache should
+        override this method. The default implementation falls back to calling `generate_inner` one by one.
+        """
+        return [self.generate_inner(message, dataset) for message in messages]
+
+    @staticmethod
+    def shared_visual_prefix(messages):
+        """Whether the messages are identical up to their last non-text item, i.e., only differ in the trailing text.
+        """
+        def visual_end(message):
+            return max([i + 1 for i, x in enumerate(message) if x['type'] != 'text'], default=0)
+
+        def same(x, y):
+            if x['type'] != y['type']:
+                return False
+            if isinstance(x['value'], np.ndarray) or isinstance(y['value'], np.ndarray):
+                return x['value'] is y['value'] or np.array_equal(x['value'], y['value'])
+            return x['value'] == y['value']
+
+        end = visual_end(messages[0])
+        if end == 0:
+            return False
+        for message in messages[1:]:
+            if visual_end(message) != end or not all(same(x, y) for x, y in zip(messages[0][:end], message[:end])):
+                return False
+        return True
+
+    @staticmethod
+    def generate_on_prefix_cache(lm, cache, prefix_ids, suffixes, before_generate=None, **kwargs):
+        """Generate the answers of several suffixes on top of the KV cache of their shared prefix.
+
+        The cache is cropped back to the prefix after each suffix. Caches that can not be cropped (e.g., the legacy
+        tuple caches) are rejected before generating anything, otherwise later suffixes would be generated on top of
+        the KV of the earlier ones.
+
+        Args:
+            lm: The language model with the HuggingFace `generate` interface.
+            cache: The KV cache of the prefix, e.g., `past_key_values` of a prefill `generate` call.
+            prefix_ids (torch.Tensor): The token ids of the prefix, of shape (1, prefix_len).
+            suffixes (list[torch.Tensor]): The token ids of the suffixes, each of shape (1, suffix_len).
+            before_generate (Callable, optional): Called before generating each suffix, e.g., to restore the state
+                of the model kept from the prefill.
+            **kwargs: The generation kwargs.
+
+        Returns:
+            list[torch.Tensor] | None: The generated token ids (without the inputs) of each suffix, None if the cache
+                can not be cropped, the caller should then generate the inputs one by one.
+        """
+        import torch
+        if not callable(getattr(cache, 'crop', None)):
+            return None
+        prefix_len = prefix_ids.shape[1]
+        outputs = []
+        for suffix_ids in suffixes:
+            input_ids = torch.cat([prefix_ids, suffix_ids.to(prefix_ids.device)], dim=1)
+            if before_generate is not None:
+                before_generate()
+            generated_ids = lm.generate(
+                input_ids=input_ids, attention_mask=torch.ones_like(input_ids), past_key_values=cache, **kwargs)
+            cache.crop(prefix_len)
+            outputs.append(generated_ids[0, input_ids.shape[1]:])
+        return outputs
+
+    def generate_group(self, messages, dataset=None):
+        """Generate the output messages for a group of inputs sharing the same visual inputs.
+
+        Args:
+            messages (list[list[dict]]): The input messages, each one is a valid input of `generate`.
+            dataset (str, optional): The name of the dataset. Defaults to None.
+
+        Returns:
+            list[str]: The generated messages, in the same order as the inputs.
+        """
+        processed = [self.preproc_message(message) for message in messages]
+        if len(processed) == 1:
+            return [self.generate_inner(processed[0], dataset)]
+        responses = self.generate_group_inner(processed, dataset)
+        assert len(responses) == len(processed)
+        return responses
+
     def chat(self, messages, dataset=None):
         """The main function for multi-turn chatting. Will call `chat_inner` with the preprocessed input messages."""
         assert hasattr(self, 'chat_inner'), 'The API model should has the `chat_inner` method. '
@@ -80,6 +80,8 @@ class InternVLChat(BaseModel):
 
         self.image_size = self.model.config.vision_config.image_size
         self.version = version
+        # V1.1 / V1.2 open the image files directly, other versions load images with `load_image`
+        self.ARRAY_INPUT = version not in ['V1.1', 'V1.2']
         kwargs_default = dict(do_sample=False, max_new_tokens=4096, top_p=None)
         kwargs_default.update(kwargs)
         self.kwargs = kwargs_default
@@ -262,6 +264,132 @@ class InternVLChat(BaseModel):
         else:
             raise ValueError(f'Unsupported version: {self.version}')
 
+    def generate_batch_v2(self, messages, dataset=None):
+        use_mpo_prompt = self.use_mpo_prompt and (self.use_cot or dataset in ['MMStar', 'HallusionBench', 'OCRBench'])
+        upscale_flag = dataset is not None and listinstr(['MMMU'], dataset)
+
+        questions, num_patches_list, pixel_values_list = [], [], []
+        for message in messages:
+            prompt = reorganize_prompt(message, 1, dataset=dataset)
+            if dataset is not None and DATASET_MODALITY(dataset) == 'VIDEO':
+                prompt = build_video_prompt(prompt, dataset)
+            image_path = [x['value'] for x in message if x['type'] == 'image'][0]
+            curr_pixel_values = load_image(
+                image_path, max_num=self.max_num, upscale=upscale_flag).to(self.device).to(torch.bfloat16)
+            questions.append(prompt)
+            num_patches_list.append(curr_pixel_values.size(0))
+            pixel_values_list.append(curr_pixel_values)
+        pixel_values = torch.cat(pixel_values_list, dim=0)
+
+        with torch.no_grad():
+            responses = self.model.batch_chat(
+                self.tokenizer,
+                pixel_values=pixel_values,
+                num_patches_list=num_patches_list,
+                questions=questions,
+                generation_config=self.kwargs
+            )
+
+        if use_mpo_prompt:
+            responses = [mpo_post_processing(response, dataset) for response in responses]
+        return responses
+
+    def generate_batch_inner(self, messages, dataset=None):
+        self.set_max_num(dataset)
+        # `batch_chat` of InternVL2 only accepts exactly one image per question,
+        # other inputs fall back to the sequential path
+        single_image = all(len([x for x in message if x['type'] == 'image']) == 1 for message in messages)
+        if self.version == 'V2.0' and single_image:
+            return self.generate_batch_v2(messages, dataset)
+        return [self.generate_inner(message, dataset) for message in messages]
+
+    def generate_group_v2(self, messages, dataset=None):
+        # Questions on the same video: run the vision encoder and prefill the frames once, and answer each question on
+        # top of the KV cache of the prefix (cropped back to the prefix after each question)
+        use_mpo_prompt = self.use_mpo_prompt and (self.use_cot or dataset in ['MMStar', 'HallusionBench', 'OCRBench'])
+        model = self.model
+        image_path = [x['value'] for x in messages[0] if x['type'] == 'image']
+        image_num = len(image_path)
+        max_num = max(1, min(self.max_num, self.total_max_num // image_num))
+
+        # Build the queries as `InternVLChatModel.chat` does
+        get_conv_template = sys.modules[type(model).__module__].get_conv_template
+        img_context_token = '<IMG_CONTEXT>'
+        model.img_context_token_id = self.tokenizer.convert_tokens_to_ids(img_context_token)
+        num_patches_list, pixel_values_list = [], []
+        for image_idx, file_name in enumerate(image_path):
+            upscale_flag = image_idx == 0 and dataset is not None and listinstr(['MMMU'], dataset)
+            curr_pixel_values = load_image(
+                file_name, max_num=max_num, upscale=upscale_flag).to(self.device).to(torch.bfloat16)
+            num_patches_list.append(curr_pixel_values.size(0))
+            pixel_values_list.append(curr_pixel_values)
+        pixel_values = torch.cat(pixel_values_list, dim=0)
+
+        queries = []
+        for message in messages:
+            prompt = reorganize_prompt(message, image_num, dataset=dataset)
+            if dataset is not None and DATASET_MODALITY(dataset) == 'VIDEO':
+                prompt = build_video_prompt(prompt, dataset)
+            if '<image>' not in prompt:
+                prompt = '<image>\n' + prompt
+            template = get_conv_template(model.template)
+            template.system_message = model.system_message
+            template.append_message(template.roles[0], prompt)
+            template.append_message(template.roles[1], None)
+            query = template.get_prompt()
+            for num_patches in num_patches_list:
+                image_tokens = '<img>' + img_context_token * model.num_image_token * num_patches + '</img>'
+                query = query.replace('<image>', image_tokens, 1)
+            queries.append(query)
+        sep = template.sep.strip()
+
+        # Split the queries after the last image end token (a special token, so the tokenization is unchanged)
+        split = queries[0].rfind('</img>') + len('</img>')
+        if split < len('</img>') or any(query[:split] != queries[0][:split] for query in queries):
+            return [self.generate_inner(message, dataset) for message in messages]
+
+        with torch.no_grad():
+            prefix_ids = self.tokenizer(queries[0][:split], return_tensors='pt').input_ids.to(self.device)
+            vit_embeds = model.extract_feature(pixel_values)
+            input_embeds = model.language_model.get_input_embeddings()(prefix_ids)
+            B, N, C = input_embeds.shape
+            input_embeds = input_embeds.reshape(B * N, C)
+            selected = prefix_ids.reshape(B * N) == model.img_context_token_id
+            input_embeds[selected] = vit_embeds.reshape(-1, C).to(input_embeds.device)
+            input_embeds = input_embeds.reshape(B, N, C)
+            # Prefill the prefix by generating a single token, which keeps the KV cache of the prefix only
+            out = model.language_model.generate(
+                inputs_embeds=input_embeds,
+                attention_mask=torch.ones_like(prefix_ids),
+                max_new_tokens=1,
+                return_dict_in_generate=True,
+                use_cache=True)
+            suffixes = [
+                self.tokenizer(query[split:], add_special_tokens=False, return_tensors='pt').input_ids
+                for query in queries
+            ]
+            generation_config = dict(self.kwargs, eos_token_id=self.tokenizer.convert_tokens_to_ids(sep))
+            outputs = self.generate_on_prefix_cache(
+                model.language_model, out.past_key_values, prefix_ids, suffixes, use_cache=True, **generation_config)
+        if outputs is None:
+            warnings.warn('The KV cache can not be cropped, generate the questions on the same video one by one. ')
+            return [self.generate_inner(message, dataset) for message in messages]
+
+        responses = []
+        for generated_ids in outputs:
+            response = self.tokenizer.decode(generated_ids, skip_special_tokens=True)
+            response = response.split(sep)[0].strip()
+            if use_mpo_prompt:
+                response = mpo_post_processing(response, dataset)
+            responses.append(response)
+        return responses
+
+    def generate_group_inner(self, messages, dataset=None):
+        self.set_max_num(dataset)
+        if self.version == 'V2.0' and self.shared_visual_prefix(messages):
+            return self.generate_group_v2(messages, dataset)
+        return [self.generate_inner(message, dataset) for message in messages]
+
     def build_history(self, message):
         # Global Variables
         image_path = []
@@ -87,7 +87,11 @@ def dynamic_preprocess(image, min_num=1, max_num=6, image_size=448, use_thumbnai
 
 
 def load_image(image_file, input_size=448, max_num=6, upscale=False):
-    image = Image.open(image_file).convert('RGB')
+    # `image_file` can also be an in-memory image (np.ndarray)
+    if isinstance(image_file, np.ndarray):
+        image = Image.fromarray(image_file).convert('RGB')
+    else:
+        image = Image.open(image_file).convert('RGB')
     if upscale:
         image = image.resize((image.width * 2, image.height * 2), Image.BILINEAR)
     transform = build_transform(input_size=input_size)
@@ -173,36 +173,16 @@ class Qwen2VLChat(Qwen2VLPromptMixin, BaseModel):
             content.append(item)
         return content
 
-    def generate_inner(self, message, dataset=None):
-        try:
-            from qwen_vl_utils import process_vision_info
-        except Exception as err:
-            logging.critical("qwen_vl_utils not found, please install it via 'pip install qwen-vl-utils'")
-            raise err
-
+    def _build_messages(self, message, dataset=None):
         messages = []
         if self.system_prompt is not None:
             messages.append({'role': 'system', 'content': self.system_prompt})
         messages.append({'role': 'user', 'content': self._prepare_content(message, dataset=dataset)})
         if self.verbose:
             print(f'\033[31m{messages}\033[0m')
+        return messages
 
-        text = self.processor.apply_chat_template([messages], tokenize=False, add_generation_prompt=True)
-        images, videos = process_vision_info([messages])
-        inputs = self.processor(text=text, images=images, videos=videos, padding=True, return_tensors='pt')
-        inputs = inputs.to('cuda')
-
-        generated_ids = self.model.generate(
-            **inputs,
-            **self.generate_kwargs,
-        )
-        generated_ids = [
-            output_ids[len(input_ids):] for input_ids, output_ids in zip(inputs.input_ids, generated_ids)
-        ]
-        out = self.processor.tokenizer.batch_decode(
-            generated_ids, skip_special_tokens=True, clean_up_tokenization_spaces=False
-        )
-        response = out[0]
+    def _post_process(self, response):
         if self.post_process:
             resp = response.split('\\boxed{')[-1]
             lt = len(resp)
@@ -224,3 +204,98 @@ class Qwen2VLChat(Qwen2VLPromptMixin, BaseModel):
         if self.verbose:
             print(f'\033[32m{response}\033[0m')
         return response
+
+    def _generate(self, conversations):
+        try:
+            from qwen_vl_utils import process_vision_info
+        except Exception as err:
+            logging.critical("qwen_vl_utils not found, please install it via 'pip install qwen-vl-utils'")
+            raise err
+
+        text = self.processor.apply_chat_template(conversations, tokenize=False, add_generation_prompt=True)
+        images, videos = process_vision_info(conversations)
+        # Batched generation requires left padding, so that all prompts end at the same position
+        padding_side = self.processor.tokenizer.padding_side
+        self.processor.tokenizer.padding_side = 'left'
+        try:
+            inputs = self.processor(text=text, images=images, videos=videos, padding=True, return_tensors='pt')
+        finally:
+            self.processor.tokenizer.padding_side = padding_side
+        inputs = inputs.to('cuda')
+
+        generated_ids = self.model.generate(
+            **inputs,
+            **self.generate_kwargs,
+        )
+        generated_ids = [
+            output_ids[len(input_ids):] for input_ids, output_ids in zip(inputs.input_ids, generated_ids)
+        ]
+        out = self.processor.tokenizer.batch_decode(
+            generated_ids, skip_special_tokens=True, clean_up_tokenization_spaces=False
+        )
+        return out
+
+    def generate_inner(self, message, dataset=None):
+        messages = self._build_messages(message, dataset=dataset)
+        response = self._generate([messages])[0]
+        return self._post_process(response)
+
+    def generate_batch_inner(self, messages, dataset=None):
+        conversations = [self._build_messages(message, dataset=dataset) for message in messages]
+        responses = self._generate(conversations)
+        return [self._post_process(response) for response in responses]
+
+    def _rope_holders(self):
+        # The modules keeping the M-RoPE offset of the cached prefix (its location depends on the transformers version)
+        modules = [self.model, getattr(self.model, 'model', None)]
+        return [m for m in modules if m is not None and hasattr(m, 'rope_deltas')]
+
+    def generate_group_inner(self, messages, dataset=None):
+        # Questions on the same video: encode the visual prefix once, and answer each question on top of its KV cache
+        # (the cache is cropped back to the prefix after each question)
+        if not self.shared_visual_prefix(messages):
+            return [self.generate_inner(message, dataset) for message in messages]
+        try:
+            from qwen_vl_utils import process_vision_info
+        except Exception as err:
+            logging.critical("qwen_vl_utils not found, please install it via 'pip install qwen-vl-utils'")
+            raise err
+
+        conversations = [self._build_messages(message, dataset=dataset) for message in messages]
+        texts = [
+            self.processor.apply_chat_template(conv, tokenize=False, add_generation_prompt=True)
+            for conv in conversations
+        ]
+        # Split the prompts after the last vision end token (a special token, so the tokenization is unchanged)
+        split = texts[0].rfind('<|vision_end|>') + len('<|vision_end|>')
+        if split < len('<|vision_end|>') or any(text[:split] != texts[0][:split] for text in texts):
+            return [self.generate_inner(message, dataset) for message in messages]
+
+        images, videos = process_vision_info(conversations[:1])
+        inputs = self.processor(text=[texts[0][:split]], images=images, videos=videos, return_tensors='pt')
+        inputs = inputs.to('cuda')
+        prefix_ids = inputs.input_ids
+        # Prefill the prefix by generating a single token, which keeps the KV cache of the prefix only
+        out = self.model.generate(**inputs, max_new_tokens=1, return_dict_in_generate=True)
+        rope_deltas = [m.rope_deltas for m in self._rope_holders()]
+
+        def restore_rope_deltas():
+            for m, delta in zip(self._rope_holders(), rope_deltas):
+                m.rope_deltas = delta
+
+        suffixes = [
+            self.processor.tokenizer(text[split:], add_special_tokens=False, return_tensors='pt').input_ids
+            for text in texts
+        ]
+        outputs = self.generate_on_prefix_cache(
+            self.model, out.past_key_values, prefix_ids, suffixes, before_generate=restore_rope_deltas,
+            **self.generate_kwargs)
+        if outputs is None:
+            warnings.warn('The KV cache can not be cropped, generate the questions on the same video one by one. ')
+            return [self.generate_inner(message, dataset) for message in messages]
+        responses = []
+        for generated_ids in outputs:
+            response = self.processor.tokenizer.decode(
+                generated_ids, skip_special_tokens=True, clean_up_tokenization_spaces=False)
+            responses.append(self._post_process(response))
+        return responses